@@ -0,0 +1,84 @@
+"""
+Payload size and CPU cost of response and request-body compression.
+
+Encodes a realistic OKR read (JSON rows) and a bulk-update XML body with the
+encoders CompressionMiddleware uses (gzip level 6, brotli quality 4 by default)
+and estimates the transfer time saved on slow links.
+
+    python benchmarks/bench_compression.py [rows]
+"""
+import gzip
+import os
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from compression import BoundedGunzip, _BrotliEncoder, _GzipEncoder, brotli
+from config import settings
+from http_cache import json_body
+
+
+LINKS_KBIT = {"3G (1.6 Mbit/s)": 1600, "branch VPN (10 Mbit/s)": 10_000}
+
+
+def make_rows(count):
+    return [
+        {
+            "okr_detail_id": i,
+            "bu_name": f"Business Unit {i % 40}",
+            "okr_name": f"Revenue growth for product line {i % 17}",
+            "actual": Decimal("12345.67") + i,
+            "target": Decimal("15000.00"),
+            "comment": "On track; pipeline conversion improving month over month.",
+            "updated_at": datetime(2025, 9, 1, 12, 30),
+        }
+        for i in range(count)
+    ]
+
+def make_bulk_xml(count):
+    rows = "".join(
+        f'<row okr_detail_id="{i}" actual="{12345.67 + i:.2f}" comment="On track; pipeline conversion improving."/>'
+        for i in range(count)
+    )
+    return f"<root>{rows}</root>".encode()
+
+def encode(make_encoder, body, repeat=10):
+    start = time.process_time()
+    for _ in range(repeat):
+        encoder = make_encoder()
+        payload = encoder.process(body) + encoder.finish()
+    return payload, (time.process_time() - start) / repeat * 1000
+
+def report(label, body):
+    print(f"{label}: {len(body):,} bytes uncompressed")
+    encoders = {"gzip": lambda: _GzipEncoder(settings.RESPONSE_GZIP_LEVEL)}
+    if brotli is not None:
+        encoders["br"] = lambda: _BrotliEncoder(settings.RESPONSE_BROTLI_QUALITY)
+    for name, make_encoder in encoders.items():
+        payload, cpu = encode(make_encoder, body)
+        saved = ", ".join(
+            f"{link} -{(len(body) - len(payload)) * 8 / kbit:,.0f} ms"
+            for link, kbit in LINKS_KBIT.items()
+        )
+        print(f"  {name:<5} {len(payload):>9,} bytes ({len(payload) / len(body):6.1%})  cpu={cpu:6.2f} ms  transfer: {saved}")
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    report(f"OKR read, {count} rows (JSON)", json_body(make_rows(count)))
+    print()
+    xml = make_bulk_xml(count)
+    report(f"Bulk update, {count} rows (XML)", xml)
+
+    compressed = gzip.compress(xml)
+    start = time.process_time()
+    for _ in range(10):
+        decoder = BoundedGunzip(settings.REQUEST_MAX_BODY_BYTES)
+        decoder.feed(compressed)
+        decoder.finish()
+    print(f"  server-side bounded gunzip: {(time.process_time() - start) / 10 * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    main()
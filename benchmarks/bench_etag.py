@@ -0,0 +1,72 @@
+"""
+Repeated-poll cost of a reporting read with and without conditional GET.
+
+Compares FastAPI's default path (jsonable_encoder + JSONResponse) against
+http_cache.etag_response for a first poll (200 + body) and a repeated poll
+where the client sends back the ETag it already holds (304, no body), both
+for a freshly fetched list and for a response-cache hit (FrozenRows), whose
+encoding is reused between polls.
+
+    python benchmarks/bench_etag.py [rows]
+"""
+import os
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from starlette.requests import Request
+
+from http_cache import FrozenRows, etag_response
+
+
+def make_rows(count):
+    return [
+        {
+            "okr_detail_id": i,
+            "bu_name": f"Business Unit {i % 40}",
+            "okr_name": f"Revenue growth for product line {i % 17}",
+            "actual": Decimal("12345.67") + i,
+            "target": Decimal("15000.00"),
+            "comment": "On track; pipeline conversion improving month over month.",
+            "updated_at": datetime(2025, 9, 1, 12, 30),
+        }
+        for i in range(count)
+    ]
+
+def make_request(etag=None):
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "method": "GET", "path": "/okrs", "headers": headers, "query_string": b""})
+
+def measure(label, fn, repeat):
+    fn()
+    start_cpu, start_wall = time.process_time(), time.perf_counter()
+    for _ in range(repeat):
+        response = fn()
+    cpu = (time.process_time() - start_cpu) / repeat * 1000
+    wall = (time.perf_counter() - start_wall) / repeat * 1000
+    print(f"{label:<34} status={response.status_code}  bytes={len(response.body):>9,}  cpu={cpu:7.2f} ms  wall={wall:7.2f} ms")
+    return response
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rows = make_rows(count)
+    repeat = 20
+    print(f"{count} rows, {repeat} iterations each\n")
+
+    measure("default JSONResponse", lambda: JSONResponse(jsonable_encoder(rows)), repeat)
+    first = measure("etag_response, first poll", lambda: etag_response(make_request(), rows), repeat)
+    etag = first.headers["etag"]
+    measure("etag_response, repeated poll", lambda: etag_response(make_request(etag), rows), repeat)
+
+    cached = FrozenRows(rows)
+    measure("cache hit, first poll", lambda: etag_response(make_request(), cached), repeat)
+    measure("cache hit, repeated poll", lambda: etag_response(make_request(etag), cached), repeat)
+
+
+if __name__ == "__main__":
+    main()
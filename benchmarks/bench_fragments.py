@@ -0,0 +1,53 @@
+"""
+Full deck render vs. incremental assembly from cached slide fragments.
+
+Renders a 40-business-unit report from scratch, then re-renders it after one
+business unit changed, with the fragment cache warm from the first render.
+
+    python benchmarks/bench_fragments.py [units]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from deck_cache import DeckCache
+from helpers import _build_presentation
+from sample_report import report_xml
+
+
+def timed(label, fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<44} {best * 1000:8.0f} ms")
+    return best
+
+def main():
+    units = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    original = report_xml(units)
+    print(f"{units} business units, {len(original):,} bytes of XML (best of 3)\n")
+
+    full = timed("full render, no fragment cache", lambda: _build_presentation(original))
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = DeckCache(directory=directory, max_bytes=512 * 1024 * 1024, name="fragment", suffix=".xml")
+        timed("full render, cold fragment cache (fills it)", lambda: (cache.clear(), _build_presentation(original, fragment_cache=cache)))
+        _build_presentation(original, fragment_cache=cache)
+        timed("unchanged report, warm fragment cache", lambda: _build_presentation(original, fragment_cache=cache))
+
+        revision = [0]
+        def one_changed():
+            # A different unit each time, so every run really re-renders one business unit.
+            revision[0] += 1
+            return _build_presentation(report_xml(units, changed={revision[0] % units}), fragment_cache=cache)
+        incremental = timed("one business unit changed, warm cache", one_changed)
+        print(f"\nspeed-up for a one-BU edit: {full / incremental:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Group-wide deck render time with the report split across 1, 2 and 4 render
+worker processes (RenderPool with split_min_units=4), on a synthetic
+40-business-unit report. Splitting only helps with a CPU per worker; on a
+single CPU expect speedups below 1x. The slide fragment cache is off so every business
+unit is rendered each time.
+
+    python benchmarks/bench_parallel_render.py [units]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Via the environment so the spawned render workers see it too.
+os.environ["SLIDE_FRAGMENT_CACHE_ENABLED"] = "false"
+
+from rendering import RenderPool
+from sample_report import report_xml
+
+SPLIT_MIN_UNITS = 4
+
+
+def main():
+    units = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    xml = report_xml(units)
+    print(f"{units} business units, {len(xml):,} bytes of XML, {os.cpu_count()} CPU(s), best of 3\n")
+
+    baseline = None
+    for workers in (1, 2, 4):
+        pool = RenderPool(workers=workers, max_pending=1, timeout=600, split_min_units=SPLIT_MIN_UNITS)
+        try:
+            pool.render(xml)  # spawn and warm up the workers
+            best = None
+            for _ in range(3):
+                start = time.perf_counter()
+                pool.render(xml)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+        finally:
+            pool.shutdown()
+        baseline = baseline or best
+        print(f"  {workers} worker(s)   {best * 1000:7.0f} ms   speedup {baseline / best:4.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Peak Python heap while rendering a deck: whole-document ElementTree parse vs.
+incremental lxml parse (one <Result> alive at a time).
+
+Measured with tracemalloc around the parse + render of a report with many
+business units. The "chunks" row feeds the XML in 64 KB pieces the way
+iter_proc_xml hands it over from the driver, so the full string never exists.
+
+    python benchmarks/bench_parse_memory.py [units ...]
+"""
+import os
+import sys
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import helpers
+from helpers import XML_FEED_CHUNK_SIZE, _build_presentation
+from sample_report import business_unit
+
+
+def whole_document(xml_source):
+    # What _build_presentation did before: parse everything, then walk the results.
+    return ET.fromstring(xml_source).findall('Result')
+
+def measure(label, make_source, parse=None):
+    original = helpers.iter_report_results
+    if parse is not None:
+        helpers.iter_report_results = parse
+    try:
+        tracemalloc.start()
+        start = time.perf_counter()
+        _build_presentation(make_source())
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        helpers.iter_report_results = original
+    print(f"  {label:<38} peak {peak / 1024 / 1024:7.1f} MB   {elapsed * 1000:7.0f} ms")
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [40, 200]
+    for units in sizes:
+        def chunks():
+            # Built lazily so only the chunk in hand is alive, like rows from the cursor.
+            buffer = "<root>"
+            for index in range(units):
+                buffer += business_unit(index, rows=12)
+                while len(buffer) >= XML_FEED_CHUNK_SIZE:
+                    yield buffer[:XML_FEED_CHUNK_SIZE]
+                    buffer = buffer[XML_FEED_CHUNK_SIZE:]
+            yield buffer + "</root>"
+
+        xml = "".join(chunks())
+        print(f"{units} business units, {len(xml) / 1024 / 1024:.1f} MB of XML")
+        measure("ElementTree, whole document", lambda: xml, parse=whole_document)
+        measure("incremental, string", lambda: xml)
+        measure("incremental, streamed chunks", chunks)
+        print()
+
+if __name__ == "__main__":
+    main()
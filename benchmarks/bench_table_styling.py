@@ -0,0 +1,60 @@
+"""
+Table rows rendered per second: cloned style templates vs. python-pptx property styling.
+
+Times helpers.add_generic_table on a Priorities-sized table. The "property
+layer" run forces every cell through the _style_* functions, which is how
+every cell was styled before the templates were introduced.
+
+    python benchmarks/bench_table_styling.py [rows]
+"""
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pptx import Presentation
+
+import helpers
+from helpers import LEFT_MARGIN, TOP_MARGIN, add_generic_table
+from sample_report import _table
+
+
+def table_xml(rows):
+    return ET.fromstring(_table(
+        "Priorities", ["Priority", "Description", "Status", "Comment"], rows,
+        lambda r, c: [f"P{r}", f"Expand distribution in region {r} with partner onboarding", "Open",
+                      f"Steady progress, awaiting budget approval for phase {r}"][c],
+    ))
+
+def rows_per_second(table, rows, repeat=5):
+    best = None
+    for _ in range(repeat):
+        prs = Presentation()
+        slide = prs.slides.add_slide(prs.slide_layouts[6])
+        start = time.perf_counter()
+        add_generic_table(slide, table, LEFT_MARGIN, TOP_MARGIN, helpers.SLIDE_WIDTH - 2 * LEFT_MARGIN)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return rows / best, best
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    table = table_xml(rows)
+    print(f"{rows} rows x 4 columns, best of 5 (includes measuring row heights with _row_height)\n")
+
+    templated, templated_time = rows_per_second(table, rows)
+    clone = helpers._StyleTemplate.clone
+    helpers._StyleTemplate.clone = lambda self, text: None
+    try:
+        legacy, legacy_time = rows_per_second(table, rows)
+    finally:
+        helpers._StyleTemplate.clone = clone
+
+    print(f"property layer    {legacy:9,.0f} rows/s   ({legacy_time * 1000:6.1f} ms)")
+    print(f"cloned templates  {templated:9,.0f} rows/s   ({templated_time * 1000:6.1f} ms)")
+    print(f"\nspeed-up: {templated / legacy:.1f}x")
+
+if __name__ == "__main__":
+    main()
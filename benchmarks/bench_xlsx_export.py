@@ -0,0 +1,81 @@
+"""
+Peak Python heap and time for an XLSX export of N tracker-like rows.
+
+"list + default mode" is what a naive export does: fetch_data builds the full
+row list and xlsxwriter keeps every cell in memory until close. "streamed +
+constant_memory" is ReportingService.export_xlsx: rows come from a generator
+(as iter_data yields them from the cursor) and each row is flushed as written.
+
+    python benchmarks/bench_xlsx_export.py [rows ...]
+"""
+import datetime
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import xlsxwriter
+
+from xlsx_export import write_xlsx
+
+
+def tracker_rows(count):
+    start = datetime.date(2025, 1, 1)
+    for i in range(count):
+        yield {
+            "okr_id": i,
+            "business_unit": f"Business Unit {i % 40:02d}",
+            "objective": f"Grow recurring revenue in segment {i % 97}",
+            "key_result": f"Sign {i % 13 + 1} new fleet contracts with regional partners",
+            "owner": f"Owner {i % 211}",
+            "target": Decimal(1000 + i % 500),
+            "actual": Decimal(900 + i % 650) / 3,
+            "status": ("On track", "At risk", "Delayed")[i % 3],
+            "due_date": start + datetime.timedelta(days=i % 365),
+            "updated_at": datetime.datetime(2025, 8, 1, 9, 0) + datetime.timedelta(minutes=i),
+        }
+
+def naive_export(out, count):
+    rows = list(tracker_rows(count))
+    workbook = xlsxwriter.Workbook(out)
+    sheet = workbook.add_worksheet("OKR Tracker")
+    date_format = workbook.add_format({"num_format": "yyyy-mm-dd"})
+    columns = list(rows[0])
+    sheet.write_row(0, 0, columns)
+    for r, row in enumerate(rows, start=1):
+        for c, column in enumerate(columns):
+            value = row[column]
+            if isinstance(value, (datetime.date, datetime.datetime)):
+                sheet.write_datetime(r, c, value, date_format)
+            else:
+                sheet.write(r, c, float(value) if isinstance(value, Decimal) else value)
+    workbook.close()
+
+def streamed_export(out, count):
+    write_xlsx(out, [("OKR Tracker", tracker_rows(count))])
+
+def measure(label, export, count):
+    with tempfile.TemporaryFile() as out:
+        tracemalloc.start()
+        start = time.perf_counter()
+        export(out, count)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        size = out.seek(0, 2)
+    print(f"  {label:<30} peak {peak / 1024 / 1024:7.1f} MB   {elapsed:6.1f} s   file {size / 1024 / 1024:5.1f} MB")
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for count in counts:
+        print(f"{count:,} rows x 10 columns")
+        measure("list + default mode", naive_export, count)
+        measure("streamed + constant_memory", streamed_export, count)
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Synthetic usp_generate_monthly_report_xml output for the rendering benchmarks.
+
+Each <Result> carries the sections the renderer draws: performance tables,
+highlights/challenges/opportunities, execution tracker, overdue actions and
+a priorities page.
+"""
+from xml.sax.saxutils import escape
+
+
+def _table(name_rows, columns, rows, text):
+    header = "".join(f"<Column>{escape(c)}</Column>" for c in columns)
+    body = "".join(
+        "<Row>" + "".join(f"<Cell>{escape(text(r, c))}</Cell>" for c in range(len(columns))) + "</Row>"
+        for r in range(rows)
+    )
+    return f"<Table name='{name_rows}'><Header>{header}</Header>{body}</Table>"
+
+def business_unit(index, revision=0, rows=8):
+    name = f"Business Unit {index:02d}"
+    performance = _table(
+        "Performance", ["KPI", "Target", "Actual", "Variance"], rows,
+        lambda r, c: [f"Revenue line {r}", f"{1000 + r * 10}", f"{980 + r * 11 + revision}", f"{r - 3}%"][c],
+    )
+    tracker = _table(
+        "Tracker", ["Initiative", "Owner", "Status"], rows,
+        lambda r, c: [f"Initiative {r} for {name}", f"Owner {r}", "On track" if r % 3 else "Delayed"][c],
+    )
+    overdue = _table(
+        "Overdue", ["Action", "Due", "Owner"], max(2, rows // 2),
+        lambda r, c: [f"Follow up on supplier contract renewal {r}", "2025-08-31", f"Owner {r}"][c],
+    )
+    priorities = _table(
+        "Priorities", ["Priority", "Description", "Status", "Comment"], rows,
+        lambda r, c: [f"P{r}", f"Expand distribution in region {r} with partner onboarding", "Open",
+                      f"Revision {revision}: steady progress, awaiting budget approval for phase {r}"][c],
+    )
+    points = "".join(f"<KeyPoint>Key point {k} for {name}, revision {revision}</KeyPoint>" for k in range(3))
+    return (
+        f"<Result name='{name}'>"
+        f"<Page number='1'><Title>{name} - Monthly Review</Title>"
+        f"<Performance>{performance}</Performance>"
+        f"<Highlights>{points}</Highlights><Challenges>{points}</Challenges><Opportunities>{points}</Opportunities>"
+        f"<ExecutionTracker>{tracker}</ExecutionTracker><OverdueActions>{overdue}</OverdueActions>"
+        f"</Page>"
+        f"<Page number='2'><Priorities>{priorities}</Priorities></Page>"
+        f"</Result>"
+    )
+
+def report_xml(units=40, changed=(), rows=8):
+    """Report XML for `units` business units; units listed in `changed` get a new revision."""
+    return "<root>" + "".join(
+        business_unit(i, revision=1 if i in changed else 0, rows=rows) for i in range(units)
+    ) + "</root>"
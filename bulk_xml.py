@@ -0,0 +1,380 @@
+import re
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from lxml import etree
+
+from config import settings
+from exceptions import BulkXmlError
+
+
+# Field names as usp_bulk_update maps them onto columns: plain SQL identifiers.
+FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]{0,127}$")
+
+
+class BulkUpdateSchema:
+    """
+    What is known about the usp_bulk_update payload for one table.
+
+    By default nothing about the layout is assumed. Every payload must be a well-formed document
+    without a DOCTYPE. Its child elements are the rows, with no text between them, and row count
+    and value lengths stay within the limits. Rows are kept as sent and re-wrapped in the document
+    element when the payload is split into batches.
+
+    Once a table's contract is known it can be declared. `root` and `row` fix the element names.
+    `key_fields` and `fields` (or a BULK_UPDATE_FIELDS entry) switch on the FOR XML RAW column
+    layout:
+
+        <root>
+          <row id="7" status="On track"/>
+          <row><id>8</id><comment>Text only, no nested elements</comment></row>
+        </root>
+
+    Columns may then be attributes of a row or text-only child elements, each at most once per
+    row. Every row must carry the `key_fields`. `fields` (overridden by BULK_UPDATE_FIELDS)
+    restricts the column names; otherwise any identifier is allowed.
+    """
+
+    def __init__(self, table_name: str, item_name: str, key_fields: Tuple[str, ...] = (),
+                 fields: Optional[FrozenSet[str]] = None, root: Optional[str] = None, row: Optional[str] = None):
+        self.table_name = table_name
+        self.item_name = item_name
+        self.key_fields = key_fields
+        self.fields = None if fields is None else frozenset(fields) | frozenset(key_fields)
+        self.root = root
+        self.row = row
+
+    @property
+    def allowed_fields(self) -> Optional[FrozenSet[str]]:
+        configured = settings.BULK_UPDATE_FIELDS.get(self.table_name)
+        return frozenset(configured) | frozenset(self.key_fields) if configured else self.fields
+
+    @property
+    def checks_columns(self) -> bool:
+        """Whether rows are held to the column layout (key fields or a column allowlist declared)."""
+        return bool(self.key_fields) or self.allowed_fields is not None
+
+    def validator(self) -> "BulkXmlValidator":
+        return BulkXmlValidator(self)
+
+    def parse(self, xml: str) -> "BulkPayload":
+        """Validate a complete payload held in memory (see BulkXmlValidator) and return its rows."""
+        validator = self.validator()
+        validator.feed(xml.encode("utf-8"))
+        validator.close()
+        return validator.payload()
+
+
+class BulkRow:
+    """
+    One validated row element, re-serialised on its own. Only the XML is kept; `fields` parses it
+    again on each access, for the few callers (delta snapshots, write coalescing) that need values.
+    """
+    __slots__ = ("xml",)
+
+    def __init__(self, xml: str):
+        self.xml = xml
+
+    @property
+    def fields(self) -> Dict[str, Optional[str]]:
+        """Column name -> value (None for an empty field element; the XML of one with children)."""
+        element = etree.fromstring(self.xml)
+        values = dict(element.attrib)
+        for field in element.iterchildren(tag=etree.Element):
+            values[field.tag] = field.text if len(field) == 0 else etree.tostring(field, encoding="unicode", with_tail=False)
+        return values
+
+
+def _wrapper(element) -> Tuple[str, str]:
+    """Start and end tags of `element` with its attributes and namespace declarations, but no content."""
+    empty = etree.tostring(etree.Element(element.tag, dict(element.attrib), nsmap=element.nsmap), encoding="unicode")
+    start = empty[:-2]
+    return start + ">", f"</{start[1:].split()[0]}>"
+
+
+class BulkPayload:
+    """The validated rows of a bulk-update payload, in document order, and the element they came in."""
+
+    def __init__(self, schema: BulkUpdateSchema, rows: List[BulkRow], wrapper: Optional[Tuple[str, str]] = None):
+        self.schema = schema
+        self.rows = rows
+        root = schema.root or "root"
+        self.wrapper = wrapper or (f"<{root}>", f"</{root}>")
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def with_rows(self, rows: List[BulkRow]) -> "BulkPayload":
+        return BulkPayload(self.schema, rows, self.wrapper)
+
+    def to_xml(self, rows: Optional[List[BulkRow]] = None) -> str:
+        rows = self.rows if rows is None else rows
+        start, end = self.wrapper
+        if not rows:
+            return start[:-1] + "/>"
+        return f"{start}{''.join(row.xml for row in rows)}{end}"
+
+    def batches(self, size: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        The payload as (xml, row_count) documents of at most `size` rows each; a single document
+        when `size` is None or the payload is no larger than that.
+        """
+        if not size or len(self.rows) <= size:
+            return [(self.to_xml(), len(self.rows))]
+        return [
+            (self.to_xml(self.rows[start:start + size]), len(self.rows[start:start + size]))
+            for start in range(0, len(self.rows), size)
+        ]
+
+
+# The element names, key and columns usp_bulk_update expects aren't recorded here yet; declare
+# them per table (root=, row=, key_fields=, fields=) once known.
+OKR_DETAILS = BulkUpdateSchema("okr_details", "OKRs")
+COMMENTARY_DETAILS = BulkUpdateSchema("commentary_details", "KJ OPS")
+PRIORITIES = BulkUpdateSchema("priorities", "Priorities")
+OPS_TRACKER_STATUSES = BulkUpdateSchema("ops_tracker_statuses", "Tracker Statuses")
+OPS_OVERDUES = BulkUpdateSchema("ops_overdues", "Overdues")
+
+
+# Sections of a combined submission, in the order they are applied.
+SUBMISSION_SECTIONS = OrderedDict((
+    ("okrs", OKR_DETAILS),
+    ("commentaries", COMMENTARY_DETAILS),
+    ("priorities", PRIORITIES),
+    ("tracker_statuses", OPS_TRACKER_STATUSES),
+    ("overdues", OPS_OVERDUES),
+))
+
+
+def _pull_parser() -> etree.XMLPullParser:
+    return etree.XMLPullParser(
+        events=("start", "end"), resolve_entities=False, no_network=True, load_dtd=False, huge_tree=False
+    )
+
+def _feed(parser: etree.XMLPullParser, data: bytes):
+    try:
+        parser.feed(data)
+    except etree.XMLSyntaxError as ex:
+        raise BulkXmlError(400, f"Malformed XML: {ex}")
+
+def _close(parser: etree.XMLPullParser):
+    try:
+        parser.close()
+    except etree.XMLSyntaxError as ex:
+        raise BulkXmlError(400, f"Malformed XML: {ex}")
+
+
+class BulkXmlValidator:
+    """
+    Checks a bulk-update payload against its schema as the bytes arrive (feed, then close).
+
+    Raises BulkXmlError with status 400 for XML that isn't well-formed, 422 for a document that
+    doesn't match what the schema declares and 413 once the row or value limits are passed. Each
+    row's element is dropped once checked, keeping only its serialised XML for payload(). Given a
+    `root`, the document element is a submission section of that name instead of the payload's own.
+    """
+
+    def __init__(self, schema: BulkUpdateSchema, root: Optional[str] = None):
+        self.schema = schema
+        self.section = root is not None
+        self.root = root or schema.root
+        self.fields = schema.allowed_fields
+        self.columns = schema.checks_columns
+        self.max_rows = settings.BULK_UPDATE_MAX_ROWS
+        self.max_value_length = settings.BULK_UPDATE_MAX_VALUE_LENGTH
+        self.rows = 0
+        self._depth = 0
+        self._wrapper = None
+        self._row_fields = set()
+        self._collected = []
+        self._parser = _pull_parser()
+
+    def feed(self, data: bytes):
+        _feed(self._parser, data)
+        self._check_events()
+
+    def close(self) -> int:
+        """Finish the document and return the number of rows."""
+        _close(self._parser)
+        self._check_events()
+        return self.rows
+
+    def payload(self) -> BulkPayload:
+        """The rows checked so far; call after close()."""
+        return BulkPayload(self.schema, self._collected, self._wrapper)
+
+    def _fail(self, element, message: str, status_code: int = 422):
+        raise BulkXmlError(status_code, f"Line {element.sourceline}: {message}")
+
+    def _check_text(self, element, text: Optional[str], where: str):
+        if text and text.strip():
+            self._fail(element, f"Unexpected text {where}.")
+
+    def _check_length(self, element, name: str, value: Optional[str]):
+        if value is not None and len(value) > self.max_value_length:
+            self._fail(element, f"{name} is longer than {self.max_value_length} characters.", 413)
+
+    def _check_field(self, row, name: str, value: Optional[str]):
+        if not isinstance(name, str) or not FIELD_NAME.match(name):
+            self._fail(row, f"'{name}' is not a valid field name.")
+        if self.fields is not None and name not in self.fields:
+            self._fail(row, f"Unknown field '{name}' for {self.schema.item_name}.")
+        if name in self._row_fields:
+            self._fail(row, f"Field '{name}' appears more than once in a <{row.tag}>.")
+        self._row_fields.add(name)
+        self._check_length(row, f"Field '{name}'", value)
+
+    def _check_row_values(self, row):
+        """Value limits for a row whose layout isn't declared: every attribute and text node in it."""
+        for node in row.iter(tag=etree.Element):
+            for name, value in node.attrib.items():
+                self._check_length(node, f"Attribute '{name}'", value)
+            self._check_length(node, f"Text of <{node.tag}>", node.text)
+            if node is not row:
+                self._check_length(node, f"Text after <{node.tag}>", node.tail)
+
+    def _check_events(self):
+        for event, element in self._parser.read_events():
+            self.handle(event, element)
+
+    def handle(self, event: str, element):
+        """Check one start/end event; depth 1 is the document element (or the enclosing section element)."""
+        schema = self.schema
+        if event == "start":
+            self._depth += 1
+            if self._depth == 1:
+                if element.getroottree().docinfo.doctype:
+                    self._fail(element, "DOCTYPE declarations are not allowed.", 400)
+                if self.root is not None and element.tag != self.root:
+                    self._fail(element, f"Root element must be <{self.root}>, not <{element.tag}>.")
+                if self.root is not None and len(element.attrib):
+                    self._fail(element, f"<{self.root}> takes no attributes.")
+                if not self.section:
+                    self._wrapper = _wrapper(element)
+            elif self._depth == 2:
+                if schema.row is not None and element.tag != schema.row:
+                    self._fail(element, f"Unexpected element <{element.tag}>; expected <{schema.row}>.")
+                self.rows += 1
+                if self.rows > self.max_rows:
+                    self._fail(element, f"More than {self.max_rows} rows in one request.", 413)
+                previous = element.getprevious()
+                self._check_text(element, element.getparent().text if previous is None else previous.tail, f"in <{element.getparent().tag}>")
+                if self.columns:
+                    self._row_fields = set()
+                    for name, value in element.attrib.items():
+                        self._check_field(element, name, value)
+            elif not self.columns:
+                pass
+            elif self._depth == 3:
+                if len(element.attrib):
+                    self._fail(element, f"Field element <{element.tag}> takes no attributes.")
+            else:
+                self._fail(element, f"Field <{element.getparent().tag}> must contain text only.")
+        else:
+            if self._depth == 3 and self.columns:
+                self._check_field(element.getparent(), element.tag, element.text)
+            elif self._depth == 2:
+                if self.columns:
+                    self._check_text(element, element.text, f"in <{element.tag}>")
+                    for field in element:
+                        self._check_text(field, field.tail, f"in <{element.tag}>")
+                    if not self._row_fields:
+                        self._fail(element, f"Empty <{element.tag}>.")
+                    for name in schema.key_fields:
+                        if name not in self._row_fields:
+                            self._fail(element, f"<{element.tag}> is missing its key field '{name}'.")
+                else:
+                    self._check_row_values(element)
+                self._collected.append(BulkRow(etree.tostring(element, encoding="unicode", with_tail=False)))
+                # Rows are checked: drop them and anything before them.
+                parent = element.getparent()
+                while element.getprevious() is not None:
+                    del parent[0]
+                element.clear(keep_tail=True)
+            elif self._depth == 1:
+                last = element[-1] if len(element) else None
+                self._check_text(element, element.text if last is None else last.tail, f"in <{element.tag}>")
+            self._depth -= 1
+
+
+class SubmissionValidator:
+    """
+    Streaming check of a combined submission: a <submission> element holding any of the
+    SUBMISSION_SECTIONS, each at most once and laid out like a single table's <root>:
+
+        <submission>
+          <okrs><row id="7" status="On track"/></okrs>
+          <priorities><row id="3" status="Done"/></priorities>
+        </submission>
+
+    Each section is checked by its own BulkXmlValidator, with the same errors and limits.
+    """
+
+    root = "submission"
+
+    def __init__(self):
+        self._depth = 0
+        self._section = None
+        self._validators = OrderedDict()
+        self._parser = _pull_parser()
+
+    def feed(self, data: bytes):
+        _feed(self._parser, data)
+        self._check_events()
+
+    def close(self) -> int:
+        """Finish the document and return the number of sections."""
+        _close(self._parser)
+        self._check_events()
+        if not self._validators:
+            raise BulkXmlError(422, f"A <{self.root}> needs at least one of: {', '.join(SUBMISSION_SECTIONS)}.")
+        return len(self._validators)
+
+    def payloads(self) -> Dict[str, BulkPayload]:
+        """Each section's rows, in SUBMISSION_SECTIONS order; call after close()."""
+        return OrderedDict(
+            (name, self._validators[name].payload()) for name in SUBMISSION_SECTIONS if name in self._validators
+        )
+
+    def _fail(self, element, message: str, status_code: int = 422):
+        raise BulkXmlError(status_code, f"Line {element.sourceline}: {message}")
+
+    def _check_text(self, element, text: Optional[str]):
+        if text and text.strip():
+            self._fail(element, f"Unexpected text in <{self.root}>.")
+
+    def _check_events(self):
+        for event, element in self._parser.read_events():
+            if event == "start":
+                self._depth += 1
+                if self._depth == 1:
+                    if element.getroottree().docinfo.doctype:
+                        self._fail(element, "DOCTYPE declarations are not allowed.", 400)
+                    if element.tag != self.root:
+                        self._fail(element, f"Root element must be <{self.root}>, not <{element.tag}>.")
+                    if len(element.attrib):
+                        self._fail(element, f"<{self.root}> takes no attributes.")
+                    continue
+                if self._depth == 2:
+                    if element.tag not in SUBMISSION_SECTIONS:
+                        self._fail(element, f"Unknown section <{element.tag}>; expected one of: {', '.join(SUBMISSION_SECTIONS)}.")
+                    if element.tag in self._validators:
+                        self._fail(element, f"Section <{element.tag}> appears more than once.")
+                    previous = element.getprevious()
+                    self._check_text(element, element.getparent().text if previous is None else previous.tail)
+                    self._section = self._validators[element.tag] = BulkXmlValidator(SUBMISSION_SECTIONS[element.tag], root=element.tag)
+                self._section.handle(event, element)
+            else:
+                if self._depth >= 2:
+                    self._section.handle(event, element)
+                if self._depth == 2:
+                    # The section's rows are collected: drop it and anything before it.
+                    parent = element.getparent()
+                    while element.getprevious() is not None:
+                        del parent[0]
+                    element.clear(keep_tail=True)
+                    self._section = None
+                elif self._depth == 1:
+                    last = element[-1] if len(element) else None
+                    self._check_text(element, element.text if last is None else last.tail)
+                self._depth -= 1
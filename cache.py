@@ -0,0 +1,124 @@
+import threading
+from typing import Callable, Iterable
+
+from cachetools import TLRUCache
+
+from config import settings, logger
+from helpers import fetch_data
+from http_cache import FrozenRows
+from metrics import CallbackMetric, Counter
+
+
+CACHE_REQUESTS = Counter("bu_cache_requests_total", "Response cache lookups by procedure and result.", ("proc_name", "result"))
+CACHE_INVALIDATIONS = Counter("bu_cache_invalidations_total", "Response cache entries dropped by bulk updates.", ("proc_name",))
+
+# Read procedures whose results depend on each table written by usp_bulk_update.
+TABLE_READERS = {
+    "okr_details": ("usp_get_okr_details", "usp_get_okr_tracker_by_user", "usp_get_kjops_by_user"),
+    "commentary_details": ("usp_get_commentary_details",),
+    "priorities": ("usp_get_priorities",),
+    "ops_tracker_statuses": ("usp_get_ops_tracker_statuses",),
+    "ops_overdues": ("usp_get_ops_overdues",),
+}
+
+
+class ResponseCache:
+    """
+    Per-process TTL + LRU cache of stored procedure results, keyed by (proc_name, user_id, params).
+
+    Each procedure has its own TTL. The cache is bounded by the total number of cached rows, so a
+    few very large result sets can't push memory past the limit. A load that overlaps an
+    invalidation of its procedure (or a clear) isn't stored, since it may predate the write.
+    """
+
+    def __init__(self, max_rows: int, ttls: dict, default_ttl: float):
+        self.ttls = dict(ttls)
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._generations = {}   # proc_name -> invalidations so far
+        self._clears = 0
+        self._cache = TLRUCache(maxsize=max_rows, ttu=self._expires_at, getsizeof=lambda rows: max(1, len(rows)))
+
+    def _expires_at(self, key, value, now):
+        return now + self.ttls.get(key[0], self.default_ttl)
+
+    def get_or_load(self, proc_name: str, user_id, params: tuple, load: Callable[[], list]) -> list:
+        key = (proc_name, user_id, params)
+        with self._lock:
+            rows = self._cache.get(key)
+            if rows is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                generation = (self._clears, self._generations.get(proc_name, 0))
+        if rows is not None:
+            CACHE_REQUESTS.inc(proc_name=proc_name, result="hit")
+            return rows
+
+        CACHE_REQUESTS.inc(proc_name=proc_name, result="miss")
+        rows = FrozenRows(load())
+        if self.ttls.get(proc_name, self.default_ttl) > 0:
+            try:
+                with self._lock:
+                    if (self._clears, self._generations.get(proc_name, 0)) == generation:
+                        self._cache[key] = rows
+            except ValueError:
+                # Larger than the whole cache; serve it uncached.
+                pass
+        return rows
+
+    def invalidate(self, proc_names: Iterable[str]) -> int:
+        proc_names = set(proc_names)
+        with self._lock:
+            for proc_name in proc_names:
+                self._generations[proc_name] = self._generations.get(proc_name, 0) + 1
+            stale = [key for key in list(self._cache.keys()) if key[0] in proc_names]
+            for key in stale:
+                self._cache.pop(key, None)
+        for key in stale:
+            CACHE_INVALIDATIONS.inc(proc_name=key[0])
+        return len(stale)
+
+    def invalidate_table(self, table_name: str) -> int:
+        removed = self.invalidate(TABLE_READERS.get(table_name, ()))
+        if removed:
+            logger.info(f"Invalidated {removed} cached result(s) after update of '{table_name}'")
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._clears += 1
+            self._cache.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            self._cache.expire()
+            return {
+                "entries": len(self._cache),
+                "rows": self._cache.currsize,
+                "max_rows": self._cache.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+response_cache = ResponseCache(
+    max_rows=settings.CACHE_MAX_ROWS,
+    ttls=settings.CACHE_TTLS,
+    default_ttl=settings.CACHE_DEFAULT_TTL,
+)
+
+CallbackMetric("bu_cache_entries", "Result sets held in the response cache.", lambda: response_cache.get_stats()["entries"])
+CallbackMetric("bu_cache_rows", "Rows held in the response cache.", lambda: response_cache.get_stats()["rows"])
+
+
+def fetch_cached(db, proc_name: str, params: tuple = (), user_id=None) -> list:
+    """fetch_data through the response cache."""
+    def load():
+        return fetch_data(db=db, proc_name=proc_name, params=params)
+
+    if not settings.CACHE_ENABLED:
+        return load()
+    return response_cache.get_or_load(proc_name, user_id, params, load)
@@ -0,0 +1,213 @@
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional; gzip is always available
+    brotli = None
+
+
+# Already-compressed formats (PPTX/XLSX are zip containers) gain nothing from another pass.
+INCOMPRESSIBLE_TYPES = (
+    "application/vnd.openxmlformats-officedocument",
+    "application/zip",
+    "application/gzip",
+    "image/",
+)
+
+
+class _GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def process(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        # Sync flush pushes what we have to the client so streamed responses keep flowing.
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliEncoder:
+    name = "br"
+
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def process(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def _accepted_encodings(header: str) -> dict:
+    accepted = {}
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if token:
+            accepted[token.strip().lower()] = quality
+    return accepted
+
+
+class CompressionMiddleware:
+    """
+    Compress responses with brotli or gzip, whichever the client prefers and we support.
+
+    Bodies smaller than `minimum_size` are sent as-is. Streamed responses are compressed chunk by
+    chunk with a flush after each one, so they keep streaming instead of being buffered.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _choose_encoder(self, scope: Scope):
+        accepted = _accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and accepted.get("br", 0) > 0:
+            return lambda: _BrotliEncoder(self.brotli_quality)
+        if accepted.get("gzip", 0) > 0:
+            return lambda: _GzipEncoder(self.gzip_level)
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        make_encoder = self._choose_encoder(scope)
+        if make_encoder is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressedResponder(self.app, make_encoder, self.minimum_size)(scope, receive, send)
+
+
+class _CompressedResponder:
+    def __init__(self, app: ASGIApp, make_encoder, minimum_size: int):
+        self.app = app
+        self.make_encoder = make_encoder
+        self.minimum_size = minimum_size
+        self.send = None
+        self.start_message: Optional[Message] = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.send = send
+        await self.app(scope, receive, self.send_wrapper)
+
+    def _is_compressible(self, headers: Headers) -> bool:
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return not content_type.startswith(INCOMPRESSIBLE_TYPES)
+
+    async def send_wrapper(self, message: Message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # Hold the start message until we've seen enough body to decide.
+            self.start_message = message
+            self.passthrough = not self._is_compressible(Headers(raw=message["headers"]))
+            return
+
+        if message_type != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            if self.passthrough or (not more_body and len(body) < self.minimum_size):
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+
+            self.encoder = self.make_encoder()
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = self.encoder.name
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # The compressed bytes are a different representation; keep revalidation working
+                # (If-None-Match compares weakly) without claiming byte equality.
+                headers["ETag"] = "W/" + etag
+            if more_body:
+                del headers["Content-Length"]
+                payload = self.encoder.process(body) + self.encoder.flush()
+            else:
+                payload = self.encoder.process(body) + self.encoder.finish()
+                headers["Content-Length"] = str(len(payload))
+            await self.send(start)
+            await self.send({"type": "http.response.body", "body": payload, "more_body": more_body})
+            return
+
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        if more_body:
+            payload = self.encoder.process(body) + self.encoder.flush()
+        else:
+            payload = self.encoder.process(body) + self.encoder.finish()
+        await self.send({"type": "http.response.body", "body": payload, "more_body": more_body})
+
+
+class BoundedGunzip:
+    """
+    Incremental gzip decoder that refuses to produce more than `max_size` bytes.
+
+    Raises ValueError for a corrupt or truncated stream and OverflowError as soon as the output
+    would exceed the limit, so an oversized (or zip-bomb) body is never held in memory.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.produced = 0
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def _count(self, out: bytes) -> bytes:
+        self.produced += len(out)
+        if self.produced > self.max_size:
+            raise OverflowError(f"Decompressed body exceeds {self.max_size} bytes.")
+        return out
+
+    def feed(self, data: bytes) -> bytes:
+        parts = []
+        try:
+            while data:
+                parts.append(self._count(self._decompressor.decompress(data, self.max_size - self.produced + 1)))
+                data = self._decompressor.unconsumed_tail
+        except zlib.error as ex:
+            raise ValueError(f"Invalid gzip body: {ex}")
+        return b"".join(parts)
+
+    def finish(self) -> bytes:
+        try:
+            tail = self._count(self._decompressor.flush())
+        except zlib.error as ex:
+            raise ValueError(f"Invalid gzip body: {ex}")
+        if not self._decompressor.eof:
+            raise ValueError("Truncated gzip body.")
+        return tail
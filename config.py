@@ -1,6 +1,7 @@
 import os
 import logging
-from typing import List, Optional
+import tempfile
+from typing import Dict, List, Optional
 from pydantic import EmailStr
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
@@ -48,6 +49,14 @@ def get_secret(secret_name: str) -> str:
     response = client.access_secret_version(name=secret_path)
     return response.payload.data.decode("UTF-8").strip()
 
+def get_optional_secret(secret_name: str) -> Optional[str]:
+    """Like get_secret, but returns None when the secret is not configured."""
+    try:
+        return get_secret(secret_name)
+    except Exception as ex:
+        logger.warning(f"Optional secret '{secret_name}' not loaded: {ex}")
+        return None
+
 def load_all_secrets() -> dict:
     """Fetch all required secrets once."""
     return {
@@ -57,6 +66,7 @@ def load_all_secrets() -> dict:
         "DB_PASSWORD": get_secret("DB_PASSWORD"),
         "SENDER_EMAIL": get_secret("SENDER_EMAIL"),
         "SENDER_PASSWORD": get_secret("SENDER_PASSWORD"),
+        "SESSION_TOKEN_SECRET": get_optional_secret("SESSION_TOKEN_SECRET"),
     }
 
 
@@ -67,7 +77,96 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "Business Unit Reporting API"
     API_V1_PREFIX: str = "/bu-rpt/v1"
     ALLOWED_ORIGINS: List[str] = ["https://devproject212.oa.r.appspot.com"]
-    DB_POOL_SIZE: int = 5
+    DB_POOL_MIN_SIZE: int = 2              # connections kept open even when idle
+    DB_POOL_SIZE: int = 5                  # steady-state maximum
+    DB_POOL_MAX_OVERFLOW: int = 5          # temporary connections allowed above DB_POOL_SIZE during bursts
+    DB_POOL_TIMEOUT: float = 10.0          # seconds a request waits in the queue for a connection
+    DB_POOL_IDLE_TIMEOUT: float = 300.0    # seconds before an idle connection above the minimum is closed
+    DB_VALIDATION_INTERVAL: float = 30.0   # seconds a connection may sit unused before a checkout probes it
+    DB_MAX_LIFETIME: float = 1800.0        # seconds before a connection is closed and reopened
+    DB_REAPER_INTERVAL: float = 15.0       # seconds between background validations of idle connections
+
+    # Response cache for ReportingService reads (per process; TTLs in seconds, 0 disables a procedure)
+    CACHE_ENABLED: bool = True
+    CACHE_MAX_ROWS: int = 200_000
+    CACHE_DEFAULT_TTL: float = 30.0
+    CACHE_TTLS: Dict[str, float] = {
+        "usp_get_okr_details": 30.0,
+        "usp_get_commentary_details": 30.0,
+        "usp_get_priorities": 60.0,
+        "usp_get_ops_tracker_statuses": 30.0,
+        "usp_get_ops_overdues": 60.0,
+    }
+    REFERENCE_DATA_REFRESH_INTERVAL: float = 900.0   # seconds before admin lookups / priority statuses are reloaded
+
+    # HTTP compression
+    RESPONSE_COMPRESSION_MIN_SIZE: int = 1024      # bytes; smaller responses are sent uncompressed
+    RESPONSE_GZIP_LEVEL: int = 6
+    RESPONSE_BROTLI_QUALITY: int = 4
+    REQUEST_MAX_BODY_BYTES: int = 25 * 1024 * 1024 # limit on (decompressed) request bodies
+
+    # Bulk-update payloads (checked while they stream in, before a connection is taken)
+    BULK_UPDATE_MAX_BYTES: int = 10 * 1024 * 1024
+    BULK_UPDATE_MAX_ROWS: int = 10000
+    BULK_UPDATE_MAX_VALUE_LENGTH: int = 32000
+    BULK_UPDATE_FIELDS: Dict[str, List[str]] = {}  # column allowlist per table, e.g. {"priorities": ["id", "status"]}; overrides bulk_xml's declared columns and turns on the column layout check
+    BULK_UPDATE_BATCH_SIZE: int = 500              # rows per usp_bulk_update call; callers may override per request
+
+    # Delta bulk updates: OKR / commentary rows unchanged since the user's last save are not resent.
+    # Snapshots are per process and can't see writes made through other instances or workers, so a
+    # row changed elsewhere and then saved back to its old value here would be skipped. Only enable
+    # with a single process serving all bulk updates.
+    BULK_DELTA_ENABLED: bool = False
+    BULK_DELTA_MAX_ROWS: int = 200_000             # row fingerprints held across all snapshots
+    BULK_DELTA_TTL: float = 600.0                  # seconds a snapshot is trusted
+
+    # Coalesced autosaves (?coalesce=true on priority / tracker-status bulk updates)
+    BULK_COALESCE_ENABLED: bool = True
+    BULK_COALESCE_WINDOW: float = 0.5              # seconds without another write before a burst is written
+    BULK_COALESCE_MAX_DELAY: float = 2.0           # seconds from a burst's first write until it is written regardless
+    BULK_COALESCE_KEY_FIELDS: Dict[str, List[str]] = {  # columns identifying a row when merging a burst
+        "priorities": ["id"],
+        "ops_tracker_statuses": ["id"],
+    }
+
+    # /bootstrap: login datasets fetched concurrently, one pooled connection per parallel fetch.
+    # Extra connections are only taken when free, and never more than half of those free.
+    BOOTSTRAP_MAX_PARALLEL: int = 3
+
+    # File downloads (generated decks)
+    SPOOL_MAX_BYTES: int = 4 * 1024 * 1024         # generated files above this are spooled to disk instead of RAM
+    FILE_RESPONSE_CHUNK_SIZE: int = 256 * 1024
+
+    # PowerPoint rendering (worker processes; 0 renders in the request thread)
+    RENDER_WORKERS: int = 2
+    RENDER_MAX_PENDING: int = 4            # decks allowed to wait for a busy worker before new requests get 503
+    RENDER_TIMEOUT: float = 120.0          # seconds a request waits for its deck before giving up with 504
+    # Business units per worker before a group-wide deck is split across workers (0 = never). Only pays off
+    # with a spare CPU per worker: on a single vCPU the split and merge made decks 10-20% slower.
+    RENDER_SPLIT_MIN_UNITS: int = 0
+    TEXT_METRICS_FONT_PATH: Optional[str] = None       # TTF used to measure table text; default: Calibri/Carlito if installed
+    TEXT_METRICS_BOLD_FONT_PATH: Optional[str] = None
+
+    # Rendered deck cache (content-addressed by report XML; shared by processes on the instance)
+    DECK_CACHE_ENABLED: bool = True
+    DECK_CACHE_DIR: str = os.path.join(tempfile.gettempdir(), "bu-deck-cache")
+    DECK_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    SLIDE_FRAGMENT_CACHE_ENABLED: bool = True      # reuse unchanged business units' slides when a deck is re-rendered
+    SLIDE_FRAGMENT_CACHE_MAX_BYTES: int = 8 * 1024 * 1024
+    # The temp directory is RAM-backed on App Engine. Cached decks, spooled downloads that moved to disk
+    # and finished report job files share this budget; the deck cache shrinks to make room for the others.
+    TEMP_FILES_MAX_BYTES: int = 48 * 1024 * 1024
+
+    # Background report jobs (finished decks are kept on local disk). Job state is per instance, so polls
+    # and downloads need session affinity once more than one instance serves traffic.
+    REPORT_JOB_DIR: str = os.path.join(tempfile.gettempdir(), "bu-report-jobs")
+    REPORT_JOB_TTL: float = 3600.0         # seconds a finished job and its file are kept
+    REPORT_JOB_WORKERS: int = 2            # jobs prepared at once (rendering itself goes through the render pool)
+    REPORT_JOB_TIMEOUT: float = 600.0      # seconds a job waits for a free render slot before failing
+
+    # Signed session tokens
+    SESSION_TOKEN_TTL: float = 12 * 3600.0          # seconds a token issued at login stays valid
+    ALLOW_LEGACY_USER_HEADER: bool = True           # accept a bare X-User-ID header from clients without a token
 
     # Secrets (optional at declaration → filled later)
     DB_SERVER: Optional[str] = None
@@ -76,6 +175,7 @@ class Settings(BaseSettings):
     DB_PASSWORD: Optional[str] = None
     SENDER_EMAIL: Optional[str] = None
     SENDER_PASSWORD: Optional[str] = None
+    SESSION_TOKEN_SECRET: Optional[str] = None
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -86,6 +186,7 @@ class Settings(BaseSettings):
         self.DB_PASSWORD = secrets["DB_PASSWORD"]
         self.SENDER_EMAIL = secrets["SENDER_EMAIL"]
         self.SENDER_PASSWORD = secrets["SENDER_PASSWORD"]
+        self.SESSION_TOKEN_SECRET = secrets["SESSION_TOKEN_SECRET"]
 
         logger.info("[Config] ✅ All secrets fetched and loaded.")
     
@@ -1,10 +1,334 @@
+import threading
+import time
 import pymssql
-from queue import Queue, Empty, Full
+from collections import deque
 from contextlib import contextmanager
 from config import settings, logger
+from exceptions import PoolTimeoutError
+from metrics import CallbackMetric, Histogram
 
+POOL_WAIT = Histogram("bu_db_pool_wait_seconds", "Time spent obtaining a healthy connection from the pool.")
+
+
+class _PooledConnection:
+    """A pooled pymssql connection plus the timestamps used to decide when it needs checking."""
+    __slots__ = ("conn", "created_at", "last_used", "last_validated")
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+        self.last_validated = now
+
+    def age(self, now: float) -> float:
+        return now - self.created_at
+
+    def idle_for(self, now: float) -> float:
+        """Time since the connection was last checked out; the reaper shrinks the pool on this."""
+        return now - self.last_used
+
+    def unverified_for(self, now: float) -> float:
+        """Time since the connection was last known to work, by use or by a probe."""
+        return now - max(self.last_used, self.last_validated)
+
+
+class _Waiter:
+    """A thread queued for a connection. Released connections are handed to waiters in arrival order."""
+    __slots__ = ("event", "pooled", "may_create")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.pooled = None
+        self.may_create = False
+
+
+class ConnectionPool:
+    """
+    Elastic pool of pymssql connections.
+
+    Keeps at least `min_size` connections open, grows on demand up to `max_size`, and allows
+    `max_overflow` extra connections during bursts that are closed as soon as they are returned.
+    When every connection is busy, callers queue first-in, first-out until `timeout` expires.
+    Idle connections above `min_size` are closed by the reaper after `idle_timeout` seconds.
+    """
+
+    def __init__(self, min_size: int, max_size: int, max_overflow: int, timeout: float, idle_timeout: float):
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+
+        self._lock = threading.Lock()
+        self._idle = deque()
+        self._waiters = deque()
+        self._size = 0
+        self._in_use = 0
+        self._closed = True
+        self.stats = {
+            "probes_run": 0,
+            "probes_skipped": 0,
+            "stale_replaced": 0,
+            "recycled": 0,
+            "reaper_runs": 0,
+            "created": 0,
+            "shrunk": 0,
+            "overflow_closed": 0,
+            "waits": 0,
+            "timeouts": 0,
+        }
+
+    @property
+    def capacity(self) -> int:
+        return self.max_size + self.max_overflow
+
+    def available(self) -> int:
+        """Checkouts that could be served right now without queueing."""
+        with self._lock:
+            if self._closed or self._waiters:
+                return 0
+            return len(self._idle) + max(self.capacity - self._size, 0)
+
+    def _incr(self, counter: str, amount: int = 1):
+        with self._lock:
+            self.stats[counter] += amount
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update(
+                size=self._size,
+                idle=len(self._idle),
+                in_use=self._in_use,
+                waiting=len(self._waiters),
+                min_size=self.min_size,
+                max_size=self.max_size,
+                max_overflow=self.max_overflow,
+            )
+        return stats
+
+    # ---------------------------------------------------------------
+    # Connection lifecycle
+    # ---------------------------------------------------------------
+    def _open(self) -> _PooledConnection:
+        pooled = _PooledConnection(_create_connection())
+        self._incr("created")
+        return pooled
+
+    def _is_alive(self, conn) -> bool:
+        self._incr("probes_run")
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            return True
+        except pymssql.Error:
+            return False
+
+    def _ensure_healthy(self, pooled: _PooledConnection) -> _PooledConnection:
+        """
+        Recycle connections past their maximum lifetime and probe those idle longer than the
+        validation interval. Recently used connections are handed out without a round trip.
+        """
+        now = time.monotonic()
+        if pooled.age(now) > settings.DB_MAX_LIFETIME:
+            logger.info("Connection exceeded its maximum lifetime. Recycling.")
+            _close_quietly(pooled.conn)
+            self._incr("recycled")
+            return self._open()
+
+        if pooled.unverified_for(now) <= settings.DB_VALIDATION_INTERVAL:
+            self._incr("probes_skipped")
+            return pooled
+
+        if self._is_alive(pooled.conn):
+            pooled.last_validated = time.monotonic()
+            return pooled
+
+        logger.warning("Stale connection detected. Closing and replacing.")
+        _close_quietly(pooled.conn)
+        self._incr("stale_replaced")
+        return self._open()
+
+    @property
+    def is_open(self) -> bool:
+        return not self._closed
+
+    def open(self):
+        with self._lock:
+            self._closed = False
+        self._fill_to_min()
+
+    def _fill_to_min(self):
+        while True:
+            # One slot at a time, so a failed open only ever gives back the slot it reserved.
+            with self._lock:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                pooled = self._open()
+            except pymssql.Error:
+                with self._lock:
+                    self._size -= 1
+                raise
+            with self._lock:
+                self._idle.append(pooled)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            waiters, self._waiters = list(self._waiters), deque()
+        for waiter in waiters:
+            waiter.event.set()
+        for pooled in idle:
+            _close_quietly(pooled.conn)
+
+    # ---------------------------------------------------------------
+    # Checkout / return
+    # ---------------------------------------------------------------
+    def acquire(self, timeout: float = None) -> _PooledConnection:
+        start = time.perf_counter()
+        try:
+            return self._acquire(self.timeout if timeout is None else timeout)
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - start)
+
+    def _acquire(self, timeout: float) -> _PooledConnection:
+        waiter = None
+        with self._lock:
+            if self._idle and not self._waiters:
+                # Most recently returned first: keeps hot connections inside the no-probe window
+                # and lets the surplus at the other end of the deque age out.
+                pooled = self._idle.pop()
+                self._in_use += 1
+            elif self._size < self.capacity and not self._waiters:
+                pooled = None
+                self._size += 1
+                self._in_use += 1
+            else:
+                waiter = _Waiter()
+                self._waiters.append(waiter)
+                self.stats["waits"] += 1
+
+        if waiter is not None:
+            waiter.event.wait(timeout)
+            with self._lock:
+                if waiter.pooled is None and not waiter.may_create:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                    self.stats["timeouts"] += 1
+                    raise PoolTimeoutError(
+                        f"No database connection became available within {timeout:.1f}s "
+                        f"({self._in_use} in use, {len(self._waiters)} waiting)."
+                    )
+            pooled = waiter.pooled
+
+        try:
+            return self._open() if pooled is None else self._ensure_healthy(pooled)
+        except Exception:
+            self._discard()
+            raise
+
+    def release(self, pooled: _PooledConnection):
+        close_it = False
+        with self._lock:
+            if self._waiters and not self._closed:
+                waiter = self._waiters.popleft()
+                waiter.pooled = pooled
+                waiter.event.set()
+                return
+            self._in_use -= 1
+            if self._closed or self._size > self.max_size:
+                self._size -= 1
+                close_it = True
+                if not self._closed:
+                    self.stats["overflow_closed"] += 1
+            else:
+                self._idle.append(pooled)
+        if close_it:
+            _close_quietly(pooled.conn)
+
+    def _discard(self, pooled: _PooledConnection = None):
+        """Forget a checked-out connection that could not be opened or validated."""
+        with self._lock:
+            if self._waiters and not self._closed:
+                # The slot is free again; let the longest waiter open a replacement.
+                waiter = self._waiters.popleft()
+                waiter.may_create = True
+                waiter.event.set()
+            else:
+                self._size -= 1
+                self._in_use -= 1
+        if pooled is not None:
+            _close_quietly(pooled.conn)
+
+    # ---------------------------------------------------------------
+    # Background maintenance
+    # ---------------------------------------------------------------
+    def reap(self):
+        """Shrink idle connections above min_size, then validate or recycle the remaining idle ones."""
+        now = time.monotonic()
+        to_close = []
+        to_check = []
+        with self._lock:
+            self.stats["reaper_runs"] += 1
+            surplus = self._size - self.min_size
+            if surplus > 0:
+                # Probes don't count as use: a connection nobody has checked out for idle_timeout goes.
+                expired = [pooled for pooled in self._idle if pooled.idle_for(now) > self.idle_timeout]
+                to_close = sorted(expired, key=lambda pooled: pooled.last_used)[:surplus]
+                for pooled in to_close:
+                    self._idle.remove(pooled)
+                self._size -= len(to_close)
+                self.stats["shrunk"] += len(to_close)
+            keep = deque()
+            for pooled in self._idle:
+                if (pooled.age(now) > settings.DB_MAX_LIFETIME
+                        or pooled.unverified_for(now) > settings.DB_VALIDATION_INTERVAL):
+                    to_check.append(pooled)
+                else:
+                    keep.append(pooled)
+            self._idle = keep
+            self._in_use += len(to_check)
+
+        for pooled in to_close:
+            _close_quietly(pooled.conn)
+
+        # Oldest first back onto the cold end, so checked connections don't jump ahead of used ones.
+        for pooled in reversed(to_check):
+            try:
+                pooled = self._ensure_healthy(pooled)
+            except pymssql.Error:
+                # The replacement could not be opened; a later checkout will try again.
+                self._discard()
+                continue
+            self._requeue(pooled)
+
+        if not self._closed:
+            try:
+                self._fill_to_min()
+            except pymssql.Error:
+                pass
+
+    def _requeue(self, pooled: _PooledConnection):
+        """Return a connection the reaper checked: to the longest waiter, else to the cold end of the idle deque."""
+        with self._lock:
+            if self._waiters and not self._closed:
+                waiter = self._waiters.popleft()
+                waiter.pooled = pooled
+                waiter.event.set()
+                return
+            self._in_use -= 1
+            if not self._closed:
+                self._idle.appendleft(pooled)
+                return
+            self._size -= 1
+        _close_quietly(pooled.conn)
 
-db_pool = Queue(maxsize=settings.DB_POOL_SIZE)
 
 def _create_connection():
     try:
@@ -18,58 +342,175 @@ def _create_connection():
         logger.error(f"Failed to create a new database connection: {ex}")
         raise
 
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except pymssql.Error:
+        pass
+
+
+db_pool = ConnectionPool(
+    min_size=settings.DB_POOL_MIN_SIZE,
+    max_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_POOL_MAX_OVERFLOW,
+    timeout=settings.DB_POOL_TIMEOUT,
+    idle_timeout=settings.DB_POOL_IDLE_TIMEOUT,
+)
+
+_reaper_stop = threading.Event()
+_reaper_thread = None
+
+
+def get_pool_stats() -> dict:
+    return db_pool.get_stats()
+
+def available_connections() -> int:
+    return db_pool.available()
+
+def _pool_stat(name: str):
+    return lambda: db_pool.get_stats()[name]
+
+for _name, _doc in (("size", "Open pooled connections, idle or in use."),
+                    ("in_use", "Pooled connections currently checked out."),
+                    ("idle", "Pooled connections waiting to be checked out."),
+                    ("waiting", "Requests queued for a connection.")):
+    CallbackMetric(f"bu_db_pool_{_name}", _doc, _pool_stat(_name))
+
+for _name, _doc in (("stale_replaced", "Connections that failed validation and were replaced."),
+                    ("timeouts", "Checkouts that gave up waiting for a connection."),
+                    ("probes_run", "SELECT 1 validation probes executed."),
+                    ("probes_skipped", "Checkouts that skipped validation because the connection was recently used."),
+                    ("recycled", "Connections closed for exceeding their maximum lifetime."),
+                    ("created", "Connections opened."),
+                    ("shrunk", "Idle connections above the minimum closed by the reaper."),
+                    ("overflow_closed", "Overflow connections closed on return.")):
+    CallbackMetric(f"bu_db_pool_{_name}_total", _doc, _pool_stat(_name), kind="counter")
+
+def _reaper_loop():
+    while not _reaper_stop.wait(settings.DB_REAPER_INTERVAL):
+        try:
+            db_pool.reap()
+        except Exception as ex:
+            logger.error(f"Connection pool reaper failed: {ex}", exc_info=True)
+
+def _start_reaper():
+    global _reaper_thread
+    if _reaper_thread is not None and _reaper_thread.is_alive():
+        return
+    _reaper_stop.clear()
+    _reaper_thread = threading.Thread(target=_reaper_loop, name="db-pool-reaper", daemon=True)
+    _reaper_thread.start()
+
+def _stop_reaper():
+    global _reaper_thread
+    _reaper_stop.set()
+    if _reaper_thread is not None:
+        _reaper_thread.join(timeout=5)
+        _reaper_thread = None
+
 def initialize_pool():
-    if not db_pool.empty():
+    if db_pool.is_open:
         logger.info("Pool is already initialized.")
         return
-    for _ in range(settings.DB_POOL_SIZE):
-        try:
-            db_pool.put_nowait(_create_connection())
-        except Full:
-            break
-    logger.info(f"Database connection pool initialized with {db_pool.qsize()} connections.")
+    db_pool.open()
+    _start_reaper()
+    logger.info(f"Database connection pool initialized with {db_pool.get_stats()['size']} connections.")
 
 def close_pool():
-    while not db_pool.empty():
-        try:
-            conn = db_pool.get_nowait()
-            conn.close()
-        except Empty:
-            break
-    logger.info("Database connection pool gracefully closed.")
+    _stop_reaper()
+    db_pool.close()
+    logger.info(f"Database connection pool gracefully closed. Stats: {get_pool_stats()}")
+
+class _Lease:
+    """One checkout of a pooled connection through get_db_connection; it ends exactly once."""
+    __slots__ = ("pooled", "ended", "held")
+
+    def __init__(self, pooled: _PooledConnection):
+        self.pooled = pooled
+        self.ended = False
+        self.held = False   # taken over by hold_connection; the checkout's own context leaves it alone
+
+# The lease of each connection currently checked out through get_db_connection, so
+# release_connection can end it before its context exits. A connection handed back early may be
+# checked out again at once; its new lease replaces the old one here, and the old context's exit
+# only ever ends its own lease.
+_leases = {}
+_leases_lock = threading.Lock()
+
+def _return_to_pool(pooled: _PooledConnection, suspect: bool):
+    if suspect:
+        # Force a probe on the next checkout instead of trusting the recent-use window.
+        pooled.last_used = pooled.last_validated = float("-inf")
+    else:
+        pooled.last_used = time.monotonic()
+    db_pool.release(pooled)
+
+def _end_lease(lease: _Lease, suspect: bool) -> bool:
+    with _leases_lock:
+        if lease.ended:
+            return False
+        lease.ended = True
+        if _leases.get(lease.pooled.conn) is lease:
+            del _leases[lease.pooled.conn]
+    _return_to_pool(lease.pooled, suspect)
+    return True
 
 @contextmanager
-def get_db_connection():
-    conn_to_yield = None
+def get_db_connection(timeout: float = None):
     try:
-        conn_from_pool = db_pool.get(timeout=2)
+        pooled = db_pool.acquire(timeout)
+    except PoolTimeoutError as ex:
+        logger.error(f"Could not get a database connection from the pool: {ex}")
+        raise
 
-        try:
-            with conn_from_pool.cursor() as cursor:
-                cursor.execute("SELECT 1")
-            conn_to_yield = conn_from_pool
-        except pymssql.Error:
-            logger.warning("Stale connection detected. Closing and replacing.")
-            try:
-                conn_from_pool.close()
-            except pymssql.Error:
-                pass
-            
-            conn_to_yield = _create_connection()
-        
-        yield conn_to_yield
+    lease = _Lease(pooled)
+    with _leases_lock:
+        _leases[pooled.conn] = lease
+    suspect = False
+    try:
+        yield pooled.conn
+    except pymssql.Error:
+        suspect = True
+        raise
+    finally:
+        if not lease.held:
+            _end_lease(lease, suspect)
 
-    except Empty:
-        logger.error("Could not get a database connection from the pool. Pool is empty and timeout exceeded.")
+@contextmanager
+def hold_connection(conn):
+    """
+    Keep a connection checked out through get_db / get_db_connection past the end of that context,
+    for work that outlives the request's dependencies such as a streamed body. The connection goes
+    back to the pool when this context exits instead. A connection that isn't pooled is used as is.
+    """
+    with _leases_lock:
+        lease = _leases.get(conn)
+        if lease is not None and not lease.ended:
+            lease.held = True
+        else:
+            lease = None
+    suspect = False
+    try:
+        yield conn
+    except pymssql.Error:
+        suspect = True
         raise
     finally:
-        if conn_to_yield:
-            try:
-                db_pool.put_nowait(conn_to_yield)
-            except Full:
-                logger.warning("Connection pool is full. Closing surplus connection.")
-                conn_to_yield.close()
+        if lease is not None:
+            _end_lease(lease, suspect)
+
+def release_connection(conn) -> bool:
+    """
+    Give a connection obtained from get_db / get_db_connection back to the pool now, instead of
+    when the request finishes. The caller must not use `conn` afterwards. Returns False for a
+    connection that isn't checked out from the pool (already released, or not pooled at all).
+    """
+    with _leases_lock:
+        lease = _leases.get(conn)
+    if lease is None:
+        return False
+    return _end_lease(lease, suspect=False)
 
 def get_db():
     with get_db_connection() as conn:
-        yield conn
\ No newline at end of file
+        yield conn
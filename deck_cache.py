@@ -0,0 +1,223 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Optional
+
+from config import settings, logger
+from helpers import RENDERER_VERSION
+from metrics import CallbackMetric, Counter
+from rendering import render_pool
+from temp_files import TempFileBudget, temp_files
+
+
+DECK_CACHE_REQUESTS = Counter("bu_deck_cache_requests_total", "Rendered deck / slide fragment cache lookups by result.", ("cache", "result"))
+DECK_CACHE_EVICTIONS = Counter("bu_deck_cache_evictions_total", "Entries evicted from the rendered deck / slide fragment caches.", ("cache",))
+
+
+def deck_key(xml_string: str) -> str:
+    """Content address of the deck rendered from `xml_string` by the current renderer."""
+    digest = hashlib.sha256(RENDERER_VERSION.encode("utf-8") + b"\0")
+    digest.update(xml_string.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class DeckCache:
+    """
+    Rendered PPTX files on local disk, addressed by deck_key(xml). Also used, with a different
+    name and suffix, for the per-business-unit slide fragments the renderer reuses.
+
+    Byte-identical report XML rendered by the same RENDERER_VERSION always gives the same deck, so a
+    hit is served without rendering. Files are written atomically, so several processes can share
+    the directory: a key missing from this process's index is still looked up on disk, and the
+    index is rebuilt from the directory at most every `rescan_interval` seconds when storing, so
+    the `max_bytes` cap covers what every process wrote. The least recently used files (by mtime,
+    refreshed on every hit) are removed first. With a `budget` the cache also shrinks to leave
+    room for the process's other temporary files (see temp_files).
+    """
+
+    def __init__(self, directory: str, max_bytes: int, name: str = "deck", suffix: str = ".pptx",
+                 budget: Optional[TempFileBudget] = None, rescan_interval: float = 5.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.name = name
+        self.suffix = suffix
+        self.rescan_interval = rescan_interval
+        self.hits = 0
+        self.misses = 0
+        self._index = {}   # key -> [size, last_used]
+        self._total = 0
+        self._scanned_at = None
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.budget = budget
+        if budget is not None:
+            budget.on_pressure(self.reclaim)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def _load(self):
+        if self._loaded:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".tmp"):
+                self._remove(entry.path)
+        self._loaded = True
+        self._rescan()
+
+    def _rescan(self):
+        """Rebuild the index from the directory, taking in files other processes wrote or removed."""
+        index, total = {}, 0
+        for entry in os.scandir(self.directory):
+            if not (entry.name.endswith(self.suffix) and entry.is_file()):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            key = entry.name[:-len(self.suffix)]
+            known = self._index.get(key)
+            index[key] = [stat.st_size, max(stat.st_mtime, known[1]) if known else stat.st_mtime]
+            total += stat.st_size
+        self._index, self._total = index, total
+        self._scanned_at = time.monotonic()
+        self._evict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            self._load()
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            # Never stored, or evicted by another process sharing the directory.
+            data = None
+        with self._lock:
+            if data is not None:
+                self.hits += 1
+                entry = self._index.get(key)
+                if entry is not None:
+                    entry[1] = time.time()
+                else:
+                    # Stored by another process since this index was built.
+                    self._index[key] = [len(data), time.time()]
+                    self._total += len(data)
+                    self._evict()
+            else:
+                self.misses += 1
+                self._forget(key)
+        DECK_CACHE_REQUESTS.inc(cache=self.name, result="hit" if data is not None else "miss")
+        return data
+
+    def put(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            self._load()
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as ex:
+            logger.warning(f"Could not store {self.name} {key}: {ex}")
+            self._remove(tmp_path)
+            return
+        with self._lock:
+            if time.monotonic() - self._scanned_at >= self.rescan_interval:
+                self._rescan()
+                return
+            self._forget(key)
+            self._index[key] = [len(data), time.time()]
+            self._total += len(data)
+            self._evict()
+
+    def _forget(self, key: str):
+        entry = self._index.pop(key, None)
+        if entry is not None:
+            self._total -= entry[0]
+            if self.budget is not None:
+                self.budget.set(self.name, self._total)
+
+    def _evict(self):
+        limit = self.max_bytes
+        if self.budget is not None:
+            limit = min(limit, self.budget.room_for(self.name))
+        if self._total > limit:
+            for key, _ in sorted(self._index.items(), key=lambda item: item[1][1]):
+                if self._total <= limit:
+                    break
+                self._forget(key)
+                self._remove(self._path(key))
+                DECK_CACHE_EVICTIONS.inc(cache=self.name)
+        if self.budget is not None:
+            self.budget.set(self.name, self._total)
+
+    def reclaim(self):
+        """Re-read the directory and evict down to what the budget leaves after other temporary files."""
+        with self._lock:
+            if self._loaded:
+                self._rescan()
+            else:
+                self._load()
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as ex:
+            logger.warning(f"Could not remove cached {self.name} {path}: {ex}")
+
+    def clear(self):
+        with self._lock:
+            self._load()
+            for key in list(self._index):
+                self._forget(key)
+                self._remove(self._path(key))
+            self._evict()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._index),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+deck_cache = DeckCache(directory=settings.DECK_CACHE_DIR, max_bytes=settings.DECK_CACHE_MAX_BYTES, budget=temp_files)
+# Read and written by the render workers (see rendering._render_xml), which share the directory.
+fragment_cache = DeckCache(
+    directory=os.path.join(settings.DECK_CACHE_DIR, "fragments"),
+    max_bytes=settings.SLIDE_FRAGMENT_CACHE_MAX_BYTES,
+    name="fragment",
+    suffix=".xml",
+    budget=temp_files,
+)
+
+CallbackMetric("bu_deck_cache_bytes", "Bytes of rendered decks held in the deck cache.", lambda: deck_cache.get_stats()["bytes"])
+CallbackMetric("bu_deck_cache_hit_ratio", "Share of deck cache lookups served without rendering.", lambda: deck_cache.get_stats()["hit_rate"])
+
+
+def render_presentation(xml_string: str) -> bytes:
+    """PPTX bytes for the report XML, from the deck cache when possible, otherwise via the render pool."""
+    if not settings.DECK_CACHE_ENABLED:
+        return render_pool.render(xml_string)
+    key = deck_key(xml_string)
+    deck = deck_cache.get(key)
+    if deck is None:
+        deck = render_pool.render(xml_string)
+        if settings.SLIDE_FRAGMENT_CACHE_ENABLED:
+            # Count the fragments the workers just wrote against this process's temp file budget.
+            fragment_cache.reclaim()
+        deck_cache.put(key, deck)
+    return deck
@@ -1,8 +1,77 @@
-from fastapi import Request
+from typing import AsyncIterator, Dict
+
+from fastapi import HTTPException, Request
+
+from bulk_xml import BulkPayload, BulkUpdateSchema, SubmissionValidator
+from compression import BoundedGunzip
+from config import settings
+from exceptions import BulkXmlError
 
 
 def get_client_ip(request: Request) -> str:
     x_forwarded_for = request.headers.get('X-Forwarded-For')
     if x_forwarded_for:
         return x_forwarded_for.split(',')[0].strip()
-    return request.client.host if request.client else 'unknown'
\ No newline at end of file
+    return request.client.host if request.client else 'unknown'
+
+async def iter_request_body(request: Request) -> AsyncIterator[bytes]:
+    """
+    Yield the request body as it arrives, transparently gunzipping `Content-Encoding: gzip`
+    bodies. Anything larger than REQUEST_MAX_BODY_BYTES once decoded is rejected with 413.
+    """
+    encoding = request.headers.get('Content-Encoding', 'identity').strip().lower()
+    if encoding not in ('identity', 'gzip'):
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding '{encoding}'. Use gzip or identity.")
+
+    max_size = settings.REQUEST_MAX_BODY_BYTES
+    decoder = BoundedGunzip(max_size) if encoding == 'gzip' else None
+    received = 0
+    try:
+        async for chunk in request.stream():
+            if decoder is not None:
+                chunk = decoder.feed(chunk)
+            received += len(chunk)
+            if received > max_size:
+                raise OverflowError
+            if chunk:
+                yield chunk
+        if decoder is not None:
+            tail = decoder.finish()
+            if tail:
+                yield tail
+    except OverflowError:
+        raise HTTPException(status_code=413, detail=f"Request body exceeds the {max_size} byte limit.")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def _feed_validator(request: Request, validator, item_name: str):
+    max_size = settings.BULK_UPDATE_MAX_BYTES
+    received = 0
+    try:
+        async for chunk in iter_request_body(request):
+            received += len(chunk)
+            if received > max_size:
+                raise BulkXmlError(413, f"Bulk update exceeds the {max_size} byte limit.")
+            validator.feed(chunk)
+        validator.close()
+    except BulkXmlError as e:
+        raise HTTPException(status_code=e.status_code, detail=f"Invalid {item_name} payload: {e}")
+
+def bulk_update_body(schema: BulkUpdateSchema):
+    """
+    Dependency returning the rows of a bulk-update payload for `schema`'s table, parsed and validated
+    chunk by chunk as the body is received (see bulk_xml.BulkXmlValidator); the raw body itself is
+    never held. Being a plain body dependency, it runs before the route's database dependency, so a
+    rejected payload never takes a pooled connection.
+    """
+    async def dependency(request: Request) -> BulkPayload:
+        validator = schema.validator()
+        await _feed_validator(request, validator, schema.item_name)
+        return validator.payload()
+    return dependency
+
+async def submission_body(request: Request) -> Dict[str, BulkPayload]:
+    """Like bulk_update_body, for a combined <submission> of several sections (see bulk_xml.SubmissionValidator)."""
+    validator = SubmissionValidator()
+    await _feed_validator(request, validator, "submission")
+    return validator.payloads()
@@ -8,4 +8,32 @@ class UserNotActiveError(Exception):
     pass
 
 class SubmissionPeriodError(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class PoolTimeoutError(Exception):
+    pass
+
+class InvalidTokenError(Exception):
+    pass
+
+class RenderQueueFullError(Exception):
+    pass
+
+class RenderTimeoutError(Exception):
+    pass
+
+class BulkXmlError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+class BulkUpdateError(Exception):
+    """A batch of a bulk update failed; `committed` lists the batches already committed before it."""
+    def __init__(self, message: str, failed_batch: int, committed: list):
+        super().__init__(message)
+        self.failed_batch = failed_batch
+        self.committed = committed
+
+class CoalesceConflictError(Exception):
+    """A coalesced bulk update was submitted with options that differ from the burst it would join."""
+    pass
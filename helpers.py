@@ -1,4 +1,3 @@
-import math
 import smtplib
 import ssl
 from email.mime.text import MIMEText
@@ -7,23 +6,33 @@ from email.mime.multipart import MIMEMultipart
 import pymssql
 
 from config import settings, logger
+from exceptions import BulkUpdateError
+from metrics import track_proc, PROC_ROWS, PPTX_RENDER_LATENCY
+from text_metrics import count_lines
+import copy
+import hashlib
 import io
-import xml.etree.ElementTree as ET
+import re
+from lxml import etree
 from pptx import Presentation
+from pptx.oxml import parse_xml
+from pptx.oxml.ns import qn
+from pptx.table import _Cell
 from pptx.util import Inches, Pt
 from pptx.enum.text import MSO_AUTO_SIZE
 from pptx.dml.color import RGBColor
 
 
-def update_items_from_xml(db, table_name: str, xml_string: str, user_id: int, item_name: str):
+def update_items_from_xml(db, table_name: str, xml_string: str, user_id: int, item_name: str, commit: bool = True):
     try:
-        with db.cursor() as cursor:
+        with track_proc("usp_bulk_update"), db.cursor() as cursor:
             sql_command = "EXEC usp_bulk_update @tableName=%s, @xmlText=%s, @userID=%d"
             cursor.execute(sql_command, (table_name, xml_string, user_id))
             result = cursor.fetchone()
             affected_rows = result[0] if result else 0
 
-        db.commit()
+        if commit:
+            db.commit()
 
         if affected_rows > 0:
             message = f"Data processed for '{item_name}'. {affected_rows} row(s) were updated."
@@ -42,18 +51,76 @@ def update_items_from_xml(db, table_name: str, xml_string: str, user_id: int, it
         logger.error(f"Generic Service Error in update_items_from_xml: {e}")
         raise
 
+def update_items_in_batches(db, table_name: str, batches, user_id: int, item_name: str, atomic: bool = True):
+    """
+    Run usp_bulk_update once per (xml, row_count) batch, one after another on `db`.
+
+    With `atomic` the batches are committed together after the last one and a failure rolls all
+    of them back; otherwise each batch is committed as it completes and a failure rolls back only
+    the batch in progress. Either way a failure is raised as BulkUpdateError, listing the batches
+    that stay committed.
+    """
+    results = []
+    for number, (xml_string, row_count) in enumerate(batches, start=1):
+        try:
+            result = update_items_from_xml(db, table_name, xml_string, user_id, item_name, commit=not atomic)
+        except Exception as ex:
+            try:
+                db.rollback()
+            except Exception as rollback_error:
+                logger.error(f"Rollback failed after bulk update batch {number} of '{table_name}': {rollback_error}")
+            committed = [] if atomic else results
+            logger.error(f"Bulk update of '{table_name}' failed at batch {number}; {len(committed)} batch(es) committed")
+            raise BulkUpdateError(str(ex), failed_batch=number, committed=committed) from ex
+        results.append({"batch": number, "rows": row_count, "affected_rows": result["affected_rows"]})
+
+    if atomic:
+        db.commit()
+
+    affected_rows = sum(batch["affected_rows"] for batch in results)
+    if affected_rows > 0:
+        message = f"Data processed for '{item_name}'. {affected_rows} row(s) were updated."
+    else:
+        message = "Operation successful, but no changes were made to the data."
+    return {
+        "status": "success",
+        "message": message,
+        "affected_rows": affected_rows,
+        "commit": "all" if atomic else "batch",
+        "batches": results
+    }
+
 def fetch_data(db, proc_name: str, params: tuple = ()):
     rows = []
     try:
-        with db.cursor(as_dict=True) as cursor:
+        with track_proc(proc_name), db.cursor(as_dict=True) as cursor:
             cursor.callproc(proc_name, params)
             rows = cursor.fetchall()
+        PROC_ROWS.inc(len(rows), proc_name=proc_name)
     except Exception as ex:
         logger.error(f"Database Helper Error in fetch_data for '{proc_name}': {ex}")
         raise
 
     return rows
 
+def iter_data(db, proc_name: str, params: tuple = (), batch_size: int = 500):
+    """Yield rows from `proc_name` as the driver fetches them instead of building the full list."""
+    row_count = 0
+    try:
+        with track_proc(proc_name), db.cursor(as_dict=True) as cursor:
+            cursor.callproc(proc_name, params)
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                row_count += len(batch)
+                yield from batch
+    except Exception as ex:
+        logger.error(f"Database Helper Error in iter_data for '{proc_name}': {ex}")
+        raise
+    finally:
+        PROC_ROWS.inc(row_count, proc_name=proc_name)
+
 def send_email(to_email: str, subject: str, html_content: str) -> bool:
     sender_email = settings.SENDER_EMAIL
     sender_password = settings.SENDER_PASSWORD
@@ -88,11 +155,14 @@ def send_email(to_email: str, subject: str, html_content: str) -> bool:
 
 
 # --- Configuration Constants (Powerpoint presentation)---
+# Bump whenever a change here alters the rendered output; cached decks are keyed on it.
+RENDERER_VERSION = "2"
 SLIDE_WIDTH = Inches(13.33)
 SLIDE_HEIGHT = Inches(7.5)
 LEFT_MARGIN = Inches(0.5)
 RIGHT_MARGIN = Inches(0.5)
 TOP_MARGIN = Inches(0.5)
+BOTTOM_MARGIN = Inches(0.5)
 LEFT_COLUMN_WIDTH = Inches(6.0)
 RIGHT_COLUMN_WIDTH = Inches(6.0)
 COLUMN_SPACING = Inches(0.3)
@@ -115,98 +185,248 @@ TABLE_CELL_FONT_SIZE = Pt(12)
 TABLE_CELL_FONT_COLOR = RGBColor(0, 0, 0)
 SECTION_SPACING = Inches(0.2)
 MIN_ROW_HEIGHT = Inches(0.3)
+CELL_MARGIN_X = Inches(0.1)            # python-pptx / PowerPoint default cell insets
+CELL_MARGIN_Y = Inches(0.05)
+LINE_SPACING = 1.2                     # single line spacing as a multiple of the font size
+CONTINUATION_TOP = TOP_MARGIN + Inches(0.8)
+CONTINUATION_SUFFIX = " (cont.)"
 SUBSECTION_SPACING = Inches(0.15)
 BULLET_POINT_SPACING = Inches(0.0)
 
 
-def create_custom_presentation_from_xml(xml_string: str) -> io.BytesIO:
+def create_custom_presentation_from_xml(xml_source) -> io.BytesIO:
+    with PPTX_RENDER_LATENCY.time():
+        return _build_presentation(xml_source)
+
+def _build_presentation(xml_source, fragment_cache=None) -> io.BytesIO:
+    """
+    Render the report XML to a PPTX stream.
+
+    `xml_source` is the XML string or an iterable of string chunks (e.g. iter_proc_xml), parsed
+    incrementally: each <Result> is rendered as soon as it is complete and then freed, so the whole
+    element tree never exists at once.
+
+    With a `fragment_cache` (see deck_cache.fragment_cache) the slides of each <Result> are looked up
+    by a hash of that subtree and copied in when found; only changed business units are rendered.
+    """
     try:
-        root = ET.fromstring(xml_string)
-        prs = Presentation()
-        prs.slide_width = SLIDE_WIDTH
-        prs.slide_height = SLIDE_HEIGHT
-        blank_slide_layout = prs.slide_layouts[6]
-
-        for result in root.findall('Result'):
-            result_name = result.get('name')
-
-            # Process Page 1
-            page1 = result.find(".//Page[@number='1']")
-            if page1 is not None:
-                slide = prs.slides.add_slide(blank_slide_layout)
-                title_text = page1.find('Title').text if page1.find('Title') is not None and page1.find('Title').text else result_name
-                add_slide_title(slide, title_text)
-
-                current_y = TOP_MARGIN + Inches(0.4)
-                left_x = LEFT_MARGIN
-                right_x = left_x + LEFT_COLUMN_WIDTH + COLUMN_SPACING
-
-                # Left Column Processing
-                left_y = current_y
-                performance = page1.find('Performance')
-                if performance is not None:
-                    left_y = add_section_title(slide, left_x, left_y, "Performance")
-                    for table in performance.findall('Table'):
-                        left_y = add_generic_table(slide, table, left_x, left_y, LEFT_COLUMN_WIDTH)
-
-                left_y = add_combined_section(slide, page1, left_x, left_y, LEFT_COLUMN_WIDTH)
-
-                # Right Column Processing
-                right_y = current_y
-                execution_tracker = page1.find('ExecutionTracker/Table')
-                if execution_tracker is not None:
-                    right_y = add_section_title(slide, right_x, right_y, "Execution Tracker Overview")
-                    right_y = add_generic_table(slide, execution_tracker, right_x, right_y, RIGHT_COLUMN_WIDTH)
-
-                overdue_actions = page1.find('OverdueActions/Table')
-                if overdue_actions is not None:
-                    right_y = add_section_title(slide, right_x, right_y, "Overdue Key Actions")
-                    right_y = add_generic_table(slide, overdue_actions, right_x, right_y, RIGHT_COLUMN_WIDTH)
-
-            # Process Page 2
-            page2 = result.find(".//Page[@number='2']")
-            if page2 is not None:
-                slide = prs.slides.add_slide(blank_slide_layout)
-                title_text = page2.find('Title').text if page2.find('Title') is not None and page2.find('Title').text else f"{result_name} - Priorities"
-                add_slide_title(slide, title_text)
-
-                current_y = TOP_MARGIN + Inches(0.8)
-                priorities = page2.find('Priorities/Table')
-                if priorities is not None:
-                    table_width = SLIDE_WIDTH - LEFT_MARGIN - RIGHT_MARGIN
-                    add_generic_table(slide, priorities, LEFT_MARGIN, current_y, table_width)
-
-        ppt_stream = io.BytesIO()
-        prs.save(ppt_stream)
-        ppt_stream.seek(0)
-        return ppt_stream
+        prs, blank_slide_layout = _new_presentation()
+        _add_report_slides(prs, blank_slide_layout, xml_source, fragment_cache)
+        return _save_presentation(prs)
 
     except Exception as e:
         logger.error(f"Failed to build custom PowerPoint from XML: {e}", exc_info=True)
         raise
 
+def render_report_fragment(xml_source, fragment_cache=None) -> bytes:
+    """
+    Render the report XML to a slide fragment (see capture_fragment) instead of a PPTX file.
+    Used for one part of a report split with split_report_xml; assemble_presentation joins them.
+    """
+    try:
+        prs, blank_slide_layout = _new_presentation()
+        _add_report_slides(prs, blank_slide_layout, xml_source, fragment_cache)
+        return capture_fragment(prs.slides)
+
+    except Exception as e:
+        logger.error(f"Failed to render PowerPoint slides from XML: {e}", exc_info=True)
+        raise
+
+def assemble_presentation(fragments) -> io.BytesIO:
+    """A PPTX stream with the slides of each fragment, in the given order."""
+    prs, blank_slide_layout = _new_presentation()
+    for fragment in fragments:
+        add_fragment_slides(prs, blank_slide_layout, fragment)
+    return _save_presentation(prs)
+
+def _new_presentation():
+    prs = Presentation()
+    prs.slide_width = SLIDE_WIDTH
+    prs.slide_height = SLIDE_HEIGHT
+    return prs, prs.slide_layouts[6]
+
+def _save_presentation(prs) -> io.BytesIO:
+    ppt_stream = io.BytesIO()
+    prs.save(ppt_stream)
+    ppt_stream.seek(0)
+    return ppt_stream
+
+def _add_report_slides(prs, blank_slide_layout, xml_source, fragment_cache=None):
+    reused = rendered = 0
+    for result in iter_report_results(xml_source):
+        key = fragment = None
+        if fragment_cache is not None:
+            key = result_fragment_key(result)
+            fragment = fragment_cache.get(key)
+        if fragment is not None:
+            add_fragment_slides(prs, blank_slide_layout, fragment)
+            reused += 1
+            continue
+
+        first_new = len(prs.slides)
+        add_result_slides(prs, blank_slide_layout, result)
+        rendered += 1
+        if fragment_cache is not None:
+            fragment_cache.put(key, capture_fragment(list(prs.slides)[first_new:]))
+
+    if fragment_cache is not None:
+        logger.info(f"Assembled presentation: {rendered} business unit(s) rendered, {reused} reused from fragment cache")
+
+def add_result_slides(prs, blank_slide_layout, result):
+    result_name = result.get('name')
+
+    # Process Page 1
+    page1 = result.find(".//Page[@number='1']")
+    if page1 is not None:
+        slide = prs.slides.add_slide(blank_slide_layout)
+        title_text = page1.find('Title').text if page1.find('Title') is not None and page1.find('Title').text else result_name
+        add_slide_title(slide, title_text)
+
+        current_y = TOP_MARGIN + Inches(0.4)
+        left_x = LEFT_MARGIN
+        right_x = left_x + LEFT_COLUMN_WIDTH + COLUMN_SPACING
+
+        # Left Column Processing (a column that overflows carries on on a continuation slide)
+        left_slide, left_y = slide, current_y
+        performance = page1.find('Performance')
+        if performance is not None:
+            left_slide, left_y = _room_for_table_section(left_slide, left_y)
+            left_y = add_section_title(left_slide, left_x, left_y, "Performance")
+            for table in performance.findall('Table'):
+                left_slide, left_y = add_generic_table(left_slide, table, left_x, left_y, LEFT_COLUMN_WIDTH)
+
+        left_y = add_combined_section(left_slide, page1, left_x, left_y, LEFT_COLUMN_WIDTH)
+
+        # Right Column Processing
+        right_slide, right_y = slide, current_y
+        execution_tracker = page1.find('ExecutionTracker/Table')
+        if execution_tracker is not None:
+            right_slide, right_y = _room_for_table_section(right_slide, right_y)
+            right_y = add_section_title(right_slide, right_x, right_y, "Execution Tracker Overview")
+            right_slide, right_y = add_generic_table(right_slide, execution_tracker, right_x, right_y, RIGHT_COLUMN_WIDTH)
+
+        overdue_actions = page1.find('OverdueActions/Table')
+        if overdue_actions is not None:
+            right_slide, right_y = _room_for_table_section(right_slide, right_y)
+            right_y = add_section_title(right_slide, right_x, right_y, "Overdue Key Actions")
+            right_slide, right_y = add_generic_table(right_slide, overdue_actions, right_x, right_y, RIGHT_COLUMN_WIDTH)
+
+    # Process Page 2
+    page2 = result.find(".//Page[@number='2']")
+    if page2 is not None:
+        slide = prs.slides.add_slide(blank_slide_layout)
+        title_text = page2.find('Title').text if page2.find('Title') is not None and page2.find('Title').text else f"{result_name} - Priorities"
+        add_slide_title(slide, title_text)
+
+        current_y = TOP_MARGIN + Inches(0.8)
+        priorities = page2.find('Priorities/Table')
+        if priorities is not None:
+            table_width = SLIDE_WIDTH - LEFT_MARGIN - RIGHT_MARGIN
+            add_generic_table(slide, priorities, LEFT_MARGIN, current_y, table_width)
+
+# --- Incremental parsing ---
+XML_FEED_CHUNK_SIZE = 64 * 1024
+
+def _xml_chunks(xml_source):
+    if isinstance(xml_source, (str, bytes)):
+        for start in range(0, len(xml_source), XML_FEED_CHUNK_SIZE):
+            yield xml_source[start:start + XML_FEED_CHUNK_SIZE]
+    else:
+        yield from xml_source
+
+def iter_report_results(xml_source):
+    """
+    Yield the top-level <Result> elements of the report XML as soon as each one has been parsed.
+
+    Once the consumer moves on, the element and everything parsed before it is dropped, so memory
+    holds roughly one business unit's subtree at a time rather than the whole document.
+    """
+    parser = etree.XMLPullParser(events=("end",), tag="Result", resolve_entities=False)
+    for chunk in _xml_chunks(xml_source):
+        parser.feed(chunk)
+        yield from _completed_results(parser)
+    parser.close()
+    yield from _completed_results(parser)
+
+def _completed_results(parser):
+    for _, result in parser.read_events():
+        parent = result.getparent()
+        if parent is None or parent.getparent() is not None:
+            # Only children of the document element are report results (nested ones belong to them).
+            continue
+        while result.getprevious() is not None:
+            del parent[0]
+        yield result
+        result.clear()
+
+def split_report_xml(xml_source, parts: int, min_results: int = 1) -> list:
+    """
+    Split the report into at most `parts` smaller report documents of consecutive <Result>
+    elements, balanced by size and with at least `min_results` each. Rendering them separately and
+    concatenating the slides in list order gives the same deck as rendering the whole report.
+    """
+    results = [etree.tostring(result, encoding="unicode") for result in iter_report_results(xml_source)]
+    min_results = max(1, min_results)
+    parts = max(1, min(parts, len(results) // min_results))
+    budget = sum(len(result) for result in results) / parts
+    documents, current, size = [], [], 0
+    for index, result in enumerate(results):
+        current.append(result)
+        size += len(result)
+        remaining = len(results) - index - 1
+        reserved = (parts - len(documents) - 1) * min_results
+        # Close the part once it has its share, but keep enough results for the parts still to come.
+        if (len(documents) < parts - 1 and len(current) >= min_results and remaining >= reserved
+                and (size >= budget or remaining == reserved)):
+            documents.append("<root>" + "".join(current) + "</root>")
+            current, size = [], 0
+    if current or not documents:
+        documents.append("<root>" + "".join(current) + "</root>")
+    return documents
+
+# --- Slide fragments (per-<Result> slide shape trees, reusable across decks) ---
+def result_fragment_key(result) -> str:
+    digest = hashlib.sha256(RENDERER_VERSION.encode("utf-8") + b"\0")
+    digest.update(etree.tostring(result, encoding="utf-8"))
+    return digest.hexdigest()
+
+def capture_fragment(slides) -> bytes:
+    # Slides here hold only text boxes and tables, so the shape tree has no relationships to carry.
+    container = etree.Element("slides")
+    for slide in slides:
+        container.append(copy.deepcopy(slide.shapes._spTree))
+    return etree.tostring(container)
+
+def add_fragment_slides(prs, blank_slide_layout, fragment: bytes):
+    for sp_tree in parse_xml(fragment):
+        slide = prs.slides.add_slide(blank_slide_layout)
+        target = slide.shapes._spTree
+        for child in list(target):
+            target.remove(child)
+        for child in list(sp_tree):
+            target.append(child)
+
 def add_slide_title(slide, text):
     title_box = slide.shapes.add_textbox(LEFT_MARGIN, TOP_MARGIN, SLIDE_WIDTH - LEFT_MARGIN - RIGHT_MARGIN, Inches(0.4))
     tf = title_box.text_frame
-    tf.text = text
+    if not _fill_text_body(tf, _SLIDE_TITLE, text):
+        _style_slide_title(tf, text)
     tf.auto_size = MSO_AUTO_SIZE.SHAPE_TO_FIT_TEXT
     tf.word_wrap = True
-    p = tf.paragraphs[0]
-    p.font.size = TITLE_FONT_SIZE
-    p.font.bold = TITLE_FONT_BOLD
-    p.font.color.rgb = TITLE_FONT_COLOR
 
 def add_section_title(slide, x, y, text):
     title_box = slide.shapes.add_textbox(x, y, LEFT_COLUMN_WIDTH, Inches(0.5))
     tf = title_box.text_frame
-    tf.text = text
-    p = tf.paragraphs[0]
-    p.font.size = SECTION_FONT_SIZE
-    p.font.bold = SECTION_FONT_BOLD
-    p.font.color.rgb = SECTION_FONT_COLOR
+    if not _fill_text_body(tf, _SECTION_TITLE, text):
+        _style_section_title(tf, text)
     return y + Inches(0.2) + SECTION_SPACING
 
 def add_generic_table(slide, table_xml, x, y, width):
+    """
+    Add the table at (x, y) and return (slide, y) below it. Rows that don't fit above the bottom
+    margin continue on continuation slides, each part repeating the header row; the returned slide
+    is the one holding the last part.
+    """
     headers_xml = table_xml.find('Header')
     cols_xml = headers_xml.findall('Column') if headers_xml is not None else table_xml.findall('Column')
     headers = [col.text for col in cols_xml]
@@ -217,31 +437,78 @@ def add_generic_table(slide, table_xml, x, y, width):
         if any(cell_data):
             rows_data.append(cell_data)
 
-    if not rows_data: return y
+    if not rows_data: return slide, y
+
+    col_widths = _column_widths(width, len(headers))
+    header_height = _row_height(headers, col_widths, TABLE_HEADER_FONT_SIZE, bold=True)
+    row_heights = [_row_height(row_data, col_widths, TABLE_CELL_FONT_SIZE) for row_data in rows_data]
+    bottom = SLIDE_HEIGHT - BOTTOM_MARGIN
+
+    start = 0
+    while True:
+        end, height = start, header_height
+        while end < len(rows_data) and y + height + row_heights[end] <= bottom:
+            height += row_heights[end]
+            end += 1
+        if end == start:
+            if y > CONTINUATION_TOP:
+                # Not even one row fits below what's already on the slide: start on a fresh one.
+                slide, y = _continuation_slide(slide), CONTINUATION_TOP
+                continue
+            # A single row taller than a whole slide; place it and let it overflow.
+            end, height = start + 1, header_height + row_heights[start]
+
+        _add_table_part(slide, headers, rows_data[start:end], [header_height] + row_heights[start:end], x, y, width)
+        start = end
+        if start == len(rows_data):
+            return slide, y + height + SECTION_SPACING
+        slide, y = _continuation_slide(slide), CONTINUATION_TOP
 
+def _add_table_part(slide, headers, rows_data, heights, x, y, width):
     table_shape = slide.shapes.add_table(len(rows_data) + 1, len(headers), x, y, width, MIN_ROW_HEIGHT)
     table = table_shape.table
 
-    for i, header in enumerate(headers):
-        cell = table.cell(0, i)
-        cell.text = header
-        cell.fill.solid()
-        cell.fill.fore_color.rgb = TABLE_HEADER_BG_COLOR
-        p = cell.text_frame.paragraphs[0]
-        p.font.color.rgb = TABLE_HEADER_FONT_COLOR
-        p.font.size = TABLE_HEADER_FONT_SIZE
-        p.font.bold = TABLE_HEADER_FONT_BOLD
-
-    for r, row_data in enumerate(rows_data, 1):
-        for c, cell_data in enumerate(row_data):
-            cell = table.cell(r, c)
-            cell.text = cell_data
-            p = cell.text_frame.paragraphs[0]
-            p.font.size = TABLE_CELL_FONT_SIZE
-            p.font.color.rgb = TABLE_CELL_FONT_COLOR
-
-    autofit_table_rows(table)
-    return y + table_shape.height + SECTION_SPACING
+    tr_list = table._tbl.tr_lst
+    _fill_row(table, tr_list[0], headers, _HEADER_CELL, _style_header_cell)
+    for tr, row_data in zip(tr_list[1:], rows_data):
+        _fill_row(table, tr, row_data, _BODY_CELL, _style_body_cell)
+
+    # Set the XML directly: the row.height setter re-sums every row's height on each call.
+    for tr, height in zip(tr_list, heights):
+        tr.h = height
+    table.notify_height_changed()
+    return table_shape
+
+def _room_for_table_section(slide, y):
+    # A section title plus a header and one row; otherwise the title would be stranded at the bottom.
+    if y > CONTINUATION_TOP and y + Inches(0.2) + SECTION_SPACING + 2 * MIN_ROW_HEIGHT > SLIDE_HEIGHT - BOTTOM_MARGIN:
+        return _continuation_slide(slide), CONTINUATION_TOP
+    return slide, y
+
+def _continuation_slide(slide):
+    """
+    The slide that takes content overflowing `slide`. Created right after it on first use, with the
+    title copied and marked as continued; both columns of a page overflow onto the same one.
+    """
+    prs = slide.part.package.presentation_part.presentation
+    marker = f"continuation-of-{slide.slide_id}"
+    for index in range(len(prs.slides) - 1, -1, -1):
+        candidate = prs.slides[index]
+        if candidate.slide_id == slide.slide_id:
+            break
+        if candidate.name == marker:
+            return candidate
+
+    continuation = prs.slides.add_slide(slide.slide_layout)
+    continuation._element.cSld.set("name", marker)
+    if len(slide.shapes) and slide.shapes[0].has_text_frame:
+        # The first shape on a report slide is its title (add_slide_title).
+        title = copy.deepcopy(slide.shapes[0].element)
+        texts = title.xpath(".//a:t")
+        if texts and not (texts[-1].text or "").endswith(CONTINUATION_SUFFIX):
+            texts[-1].text = (texts[-1].text or "") + CONTINUATION_SUFFIX
+        continuation.shapes._spTree.insert_element_before(title, "p:extLst")
+    return continuation
 
 def add_combined_section(slide, page, x, y, width):
     sections = {'Highlights': 'Highlights', 'Challenges': 'Challenges', 'Opportunities': 'Opportunities'}
@@ -258,19 +525,9 @@ def add_combined_section(slide, page, x, y, width):
             key_points = [kp.text for kp in section_xml.findall('KeyPoint') if kp.text and kp.text.strip()]
             if key_points:
                 has_content = True
-                p = tf.add_paragraph()
-                p.text = section_title
-                p.font.size = SUBSECTION_FONT_SIZE
-                p.font.bold = SUBSECTION_FONT_BOLD
-                p.font.color.rgb = SUBSECTION_FONT_COLOR
-                p.space_after = SUBSECTION_SPACING
-
+                _add_paragraph(tf, _SUBSECTION, section_title, _style_subsection)
                 for kp_text in key_points:
-                    p = tf.add_paragraph()
-                    p.text = "• " + kp_text
-                    p.font.size = BULLET_FONT_SIZE
-                    p.font.color.rgb = BULLET_FONT_COLOR
-                    p.space_after = BULLET_POINT_SPACING
+                    _add_paragraph(tf, _BULLET, "• " + kp_text, _style_bullet)
 
     if not has_content:
         slide.shapes.element.remove(textbox.element)
@@ -278,41 +535,165 @@ def add_combined_section(slide, page, x, y, width):
 
     return y + textbox.height + SECTION_SPACING
 
+# --- Styling ---
+# Each text element is styled through python-pptx's property layer by one of the _style_* functions
+# below. That costs several lxml lookups and writes per property, so at import every style is applied
+# once to a scratch element, and rendering deep-copies that template and only sets its text. Text
+# that python-pptx would transform (line breaks, control characters) still goes through _style_*.
+def _style_slide_title(tf, text):
+    tf.text = text
+    p = tf.paragraphs[0]
+    p.font.size = TITLE_FONT_SIZE
+    p.font.bold = TITLE_FONT_BOLD
+    p.font.color.rgb = TITLE_FONT_COLOR
 
-def autofit_table_rows(table):
-    col_widths = [col.width for col in table.columns]
-
-    for row in table.rows:
-        max_cell_height = MIN_ROW_HEIGHT
-
-        for i, cell in enumerate(row.cells):
-            text = cell.text_frame.text
-            if not text:
-                continue
-
-            text_length = len(text)
-            col_width = col_widths[i]
-
-            chars_per_line = max(1, int(col_width / Pt(6)))
-
-            lines_needed = math.ceil(text_length / chars_per_line)
-
-            height_needed = max(MIN_ROW_HEIGHT, Pt(15) * lines_needed)
-            if height_needed > max_cell_height:
-                max_cell_height = height_needed
+def _style_section_title(tf, text):
+    tf.text = text
+    p = tf.paragraphs[0]
+    p.font.size = SECTION_FONT_SIZE
+    p.font.bold = SECTION_FONT_BOLD
+    p.font.color.rgb = SECTION_FONT_COLOR
 
-        row.height = max_cell_height
+def _style_header_cell(cell, text):
+    cell.text = text
+    cell.fill.solid()
+    cell.fill.fore_color.rgb = TABLE_HEADER_BG_COLOR
+    p = cell.text_frame.paragraphs[0]
+    p.font.color.rgb = TABLE_HEADER_FONT_COLOR
+    p.font.size = TABLE_HEADER_FONT_SIZE
+    p.font.bold = TABLE_HEADER_FONT_BOLD
+
+def _style_body_cell(cell, text):
+    cell.text = text
+    p = cell.text_frame.paragraphs[0]
+    p.font.size = TABLE_CELL_FONT_SIZE
+    p.font.color.rgb = TABLE_CELL_FONT_COLOR
+
+def _style_subsection(p, text):
+    p.text = text
+    p.font.size = SUBSECTION_FONT_SIZE
+    p.font.bold = SUBSECTION_FONT_BOLD
+    p.font.color.rgb = SUBSECTION_FONT_COLOR
+    p.space_after = SUBSECTION_SPACING
+
+def _style_bullet(p, text):
+    p.text = text
+    p.font.size = BULLET_FONT_SIZE
+    p.font.color.rgb = BULLET_FONT_COLOR
+    p.space_after = BULLET_POINT_SPACING
+
+
+_NEEDS_STYLING_PATH = re.compile(r"[\x00-\x1f]")
+_A_T = qn("a:t")
+
+class _StyleTemplate:
+    """A styled element captured from python-pptx, in one variant with a text run and one without."""
+    __slots__ = ("filled", "empty")
+
+    def __init__(self, build):
+        self.filled = build("X")
+        self.empty = build("")
+
+    def clone(self, text):
+        """A styled copy holding `text`, or None when the text needs the _style_* path."""
+        if not text:
+            return copy.deepcopy(self.empty)
+        if _NEEDS_STYLING_PATH.search(text):
+            return None
+        element = copy.deepcopy(self.filled)
+        next(element.iter(_A_T)).text = text
+        return element
+
+def _build_style_templates():
+    prs = Presentation()
+    slide = prs.slides.add_slide(prs.slide_layouts[6])
+
+    def text_body(style):
+        def build(text):
+            tf = slide.shapes.add_textbox(0, 0, Inches(1), Inches(1)).text_frame
+            style(tf, text)
+            return copy.deepcopy(tf._txBody.p_lst[0])
+        return _StyleTemplate(build)
+
+    def paragraph(style):
+        def build(text):
+            p = slide.shapes.add_textbox(0, 0, Inches(1), Inches(1)).text_frame.add_paragraph()
+            style(p, text)
+            return copy.deepcopy(p._p)
+        return _StyleTemplate(build)
+
+    def cell(style):
+        def build(text):
+            table_cell = slide.shapes.add_table(1, 1, 0, 0, Inches(1), Inches(1)).table.cell(0, 0)
+            style(table_cell, text)
+            return copy.deepcopy(table_cell._tc)
+        return _StyleTemplate(build)
+
+    return (text_body(_style_slide_title), text_body(_style_section_title), cell(_style_header_cell),
+            cell(_style_body_cell), paragraph(_style_subsection), paragraph(_style_bullet))
+
+_SLIDE_TITLE, _SECTION_TITLE, _HEADER_CELL, _BODY_CELL, _SUBSECTION, _BULLET = _build_style_templates()
+
+
+def _fill_text_body(tf, template, text) -> bool:
+    p = template.clone(text)
+    if p is None:
+        return False
+    txBody = tf._txBody
+    for old in txBody.p_lst:
+        txBody.remove(old)
+    txBody.append(p)
+    return True
+
+def _fill_row(table, tr, texts, template, style):
+    for tc, text in zip(tr.tc_lst, texts):
+        styled = template.clone(text)
+        if styled is None:
+            style(_Cell(tc, table), text)
+        else:
+            tr.replace(tc, styled)
+
+def _add_paragraph(tf, template, text, style):
+    p = template.clone(text)
+    if p is None:
+        style(tf.add_paragraph(), text)
+    else:
+        tf._txBody.append(p)
+
+def _column_widths(width, count):
+    # Same split as python-pptx's add_table: equal columns, the last one absorbing the remainder.
+    col_width = width // count
+    return [col_width] * (count - 1) + [width - (count - 1) * col_width]
+
+def _row_height(texts, col_widths, font_size, bold=False):
+    line_height = int(font_size * LINE_SPACING)
+    lines = max(
+        (count_lines(text, col_width - 2 * CELL_MARGIN_X, font_size, bold) for text, col_width in zip(texts, col_widths) if text),
+        default=1,
+    )
+    return max(MIN_ROW_HEIGHT, lines * line_height + 2 * CELL_MARGIN_Y)
 
 def execute_proc_for_xml(db, proc_name: str, params: tuple = ()):
+    xml_data = "".join(iter_proc_xml(db=db, proc_name=proc_name, params=params))
+    if not xml_data:
+        logger.error(f"No XML data returned from procedure '{proc_name}'")
+    return xml_data
+
+def iter_proc_xml(db, proc_name: str, params: tuple = ()):
+    """
+    Yield the XML returned by `proc_name` chunk by chunk as the driver fetches the rows. A plain
+    FOR XML result arrives split over many rows; a single xml/nvarchar(max) value is one chunk.
+    """
+    row_count = 0
     try:
-        with db.cursor() as cursor:
+        with track_proc(proc_name), db.cursor() as cursor:
             cursor.callproc(proc_name, params)
-            result = cursor.fetchone()
-            if result and len(result) > 0:
-                return result[0]
-            else:
-                logger.error(f"No XML data returned from procedure '{proc_name}'")
-                return ""
+            for row in cursor:
+                row_count += 1
+                if len(row) > 0 and row[0]:
+                    yield row[0]
     except Exception as e:
         logger.error(f"Generic Service Error in execute_proc_for_xml: {e}")
         raise
+    finally:
+        PROC_ROWS.inc(row_count, proc_name=proc_name)
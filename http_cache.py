@@ -0,0 +1,66 @@
+import hashlib
+import json
+from typing import Optional
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import Response
+
+
+class FrozenRows(list):
+    """
+    A result set shared between requests (for example a response cache entry). Callers treat it as
+    read-only, which lets its encoded body and ETag be computed once and reused on every poll.
+    """
+    __slots__ = ("body", "etag")
+
+    def encoded(self):
+        try:
+            return self.body, self.etag
+        except AttributeError:
+            body = json_body(self)
+            self.etag = make_etag(body)
+            self.body = body
+            return self.body, self.etag
+
+
+def json_body(content) -> bytes:
+    """Serialise `content` exactly as FastAPI's JSONResponse would."""
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag derived from the response bytes."""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    # If-None-Match uses weak comparison, so W/"x" matches "x".
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def etag_response(request: Request, content=None, body: Optional[bytes] = None, etag: Optional[str] = None) -> Response:
+    """
+    JSON response carrying an ETag, or an empty 304 when the client already holds that version.
+
+    Pass a pre-serialised `body` and its `etag` to skip serialisation and hashing entirely;
+    FrozenRows content does this automatically after its first response.
+    """
+    if body is None and isinstance(content, FrozenRows):
+        body, etag = content.encoded()
+    if body is None:
+        body = json_body(content)
+    if etag is None:
+        etag = make_etag(body)
+
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
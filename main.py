@@ -7,11 +7,17 @@ from routers.bu_router import router as bu_router
 from routers.auth_router import router as auth_router
 from routers.admin_router import router as admin_router
 from routers.log_router import router as log_router
-from database import initialize_pool, close_pool
-from fastapi.responses import JSONResponse
+from database import initialize_pool, close_pool, get_pool_stats
+from fastapi.responses import JSONResponse, PlainTextResponse
+from metrics import render_metrics
+from compression import CompressionMiddleware
+from rendering import render_pool
+from report_jobs import report_jobs
+from write_coalescer import write_coalescer
 from fastapi.requests import Request
 from fastapi.exception_handlers import RequestValidationError
 from fastapi.exceptions import HTTPException
+from exceptions import PoolTimeoutError
 
 # --- Application Lifecycle Management ---
 @asynccontextmanager
@@ -19,9 +25,15 @@ async def lifespan(app: FastAPI):
     logger.info("Starting up application and initializing database pool.")
     try:
         initialize_pool()
+        render_pool.start()
+        report_jobs.start()
+        write_coalescer.start()
         yield
     finally:
         logger.info("Shutting down application and closing database pool.")
+        write_coalescer.shutdown()
+        report_jobs.shutdown()
+        render_pool.shutdown()
         close_pool()
 
 # --- App Instance ---
@@ -42,11 +54,28 @@ if settings.ALLOWED_ORIGINS and settings.ALLOWED_ORIGINS != ["*"]:
         allow_headers=["Authorization", "Content-Type"],
     )
 
+# --- Compression Middleware ---
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.RESPONSE_COMPRESSION_MIN_SIZE,
+    gzip_level=settings.RESPONSE_GZIP_LEVEL,
+    brotli_quality=settings.RESPONSE_BROTLI_QUALITY,
+)
+
 # --- Exception Handlers ---
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     logger.error(f"HTTPException: {exc.detail}")
-    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail}, headers=exc.headers)
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    logger.error(f"PoolTimeoutError: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "The service is busy. Please retry shortly."},
+        headers={"Retry-After": "1"}
+    )
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -64,6 +93,14 @@ app.include_router(log_router, prefix=settings.API_V1_PREFIX, tags=["Logging"])
 def health_check():
     return {"status": "ok"}
 
+@app.get("/health/pool", tags=["Health"])
+def pool_health():
+    return get_pool_stats()
+
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/", tags=["Root"])
 def read_root():
     return {"message": f"Welcome to the {settings.PROJECT_NAME}."}
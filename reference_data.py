@@ -0,0 +1,77 @@
+import threading
+import time
+from typing import Callable, Optional
+
+from config import settings, logger
+from http_cache import json_body, make_etag
+from metrics import Counter
+
+
+REFERENCE_LOADS = Counter("bu_reference_data_loads_total", "Reference dataset loads from the database.", ("dataset",))
+
+ADMIN_LOOKUP_DATA = "admin_lookup_data"
+PRIORITY_STATUSES = "priority_statuses"
+
+
+class CachedDataset:
+    """A loaded reference dataset with its serialised body and strong ETag."""
+    __slots__ = ("data", "body", "etag", "loaded_at")
+
+    def __init__(self, data):
+        self.data = data
+        self.body = json_body(data)
+        self.etag = make_etag(self.body)
+        self.loaded_at = time.monotonic()
+
+
+class ReferenceDataCache:
+    """
+    Process-wide cache for rarely changing datasets such as admin lookups.
+
+    Each dataset is loaded once and reloaded on the first request after `refresh_interval`
+    seconds, or after `invalidate` is called by code that changes the underlying data.
+    """
+
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._datasets = {}
+        self._generations = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def _lock_for(self, name: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def _is_fresh(self, dataset: Optional[CachedDataset]) -> bool:
+        return dataset is not None and time.monotonic() - dataset.loaded_at < self.refresh_interval
+
+    def get(self, name: str, loader: Callable[[], object]) -> CachedDataset:
+        dataset = self._datasets.get(name)
+        if self._is_fresh(dataset):
+            return dataset
+
+        # One loader per dataset at a time; concurrent callers reuse its result.
+        with self._lock_for(name):
+            dataset = self._datasets.get(name)
+            if self._is_fresh(dataset):
+                return dataset
+            generation = self._generations.get(name, 0)
+            dataset = CachedDataset(loader())
+            REFERENCE_LOADS.inc(dataset=name)
+            with self._guard:
+                # Don't keep a load that raced with an invalidation; it may predate the write.
+                if self._generations.get(name, 0) == generation:
+                    self._datasets[name] = dataset
+            logger.info(f"Loaded reference dataset '{name}' (etag {dataset.etag})")
+            return dataset
+
+    def invalidate(self, name: Optional[str] = None):
+        with self._guard:
+            names = set(self._datasets) | set(self._locks) if name is None else [name]
+            for key in names:
+                self._datasets.pop(key, None)
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+
+reference_data = ReferenceDataCache(refresh_interval=settings.REFERENCE_DATA_REFRESH_INTERVAL)
@@ -0,0 +1,212 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from config import settings, logger
+from exceptions import RenderQueueFullError, RenderTimeoutError
+from metrics import PPTX_RENDER_LATENCY, CallbackMetric, Counter
+
+
+RENDER_JOBS = Counter("bu_render_jobs_total", "PowerPoint render jobs by outcome.", ("result",))
+
+
+def _warm_up():
+    # Pay the python-pptx / lxml import cost when the worker starts, not on its first job.
+    import helpers  # noqa: F401
+
+def _render_xml(xml_string: str) -> bytes:
+    from helpers import _build_presentation
+    fragment_cache = None
+    if settings.SLIDE_FRAGMENT_CACHE_ENABLED:
+        from deck_cache import fragment_cache
+    return _build_presentation(xml_string, fragment_cache=fragment_cache).getvalue()
+
+def _render_part(xml_string: str) -> bytes:
+    from helpers import render_report_fragment
+    fragment_cache = None
+    if settings.SLIDE_FRAGMENT_CACHE_ENABLED:
+        from deck_cache import fragment_cache
+    return render_report_fragment(xml_string, fragment_cache=fragment_cache)
+
+def _merge_parts(fragments: list) -> bytes:
+    from helpers import assemble_presentation
+    return assemble_presentation(fragments).getvalue()
+
+
+class RenderPool:
+    """
+    Renders PowerPoint decks in worker processes so python-pptx never holds the API's GIL.
+
+    At most `workers` decks render at once and `max_pending` more may wait for a worker; anything
+    beyond that is rejected straight away with RenderQueueFullError. A caller waits `timeout`
+    seconds for its deck before getting RenderTimeoutError. The worker keeps going until that
+    deck is finished, and its slot stays taken meanwhile, so the bound holds even for runaway jobs.
+
+    A report with at least `split_min_units` business units per worker is split across the workers:
+    each renders a run of consecutive <Result>s to slides and one of them merges the parts into the
+    deck in report order. A split deck still takes a single slot.
+
+    With `workers=0` decks are rendered in the calling thread (local development and tests).
+    """
+
+    def __init__(self, workers: int, max_pending: int, timeout: float, split_min_units: int = 0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.split_min_units = split_min_units
+        self._slots = threading.BoundedSemaphore(max(1, workers + max_pending))
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a threaded server (pool reaper, open DB sockets) isn't safe.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_warm_up,
+                )
+                logger.info(f"Started PowerPoint render pool with {self.workers} worker(s).")
+            return self._executor
+
+    def start(self):
+        if self.workers > 0:
+            self._get_executor()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+            logger.info("PowerPoint render pool shut down.")
+
+    def _restart(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _release_slot(self, _future=None):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def _slot_releaser(self, uses: int):
+        """Done-callback that gives the slot back after it has been called `uses` times."""
+        remaining = [uses]
+        lock = threading.Lock()
+        def done(_future=None):
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self._release_slot()
+        return done
+
+    def _split(self, xml_string: str) -> list:
+        if self.workers < 2 or self.split_min_units <= 0:
+            return [xml_string]
+        from helpers import split_report_xml
+        try:
+            return split_report_xml(xml_string, self.workers, min_results=self.split_min_units)
+        except Exception:
+            # Malformed XML: render it whole so the worker reports the error as usual.
+            return [xml_string]
+
+    def _submit(self, executor: ProcessPoolExecutor, fn, arg, release):
+        try:
+            future = executor.submit(fn, arg)
+        except BrokenProcessPool:
+            self._restart(executor)
+            raise
+        future.add_done_callback(release)
+        return future
+
+    def _wait(self, executor: ProcessPoolExecutor, futures: list, deadline: float) -> list:
+        try:
+            return [future.result(timeout=max(0.0, deadline - time.monotonic())) for future in futures]
+        except FutureTimeoutError:
+            for future in futures:
+                future.cancel()
+            raise RenderTimeoutError(f"Presentation was not rendered within {self.timeout:.0f}s.")
+        except BrokenProcessPool:
+            logger.error("PowerPoint render worker died; restarting the render pool.")
+            self._restart(executor)
+            raise
+
+    def _render_in_workers(self, xml_string: str) -> bytes:
+        deadline = time.monotonic() + self.timeout
+        parts = self._split(xml_string)
+        executor = self._get_executor()
+        if len(parts) == 1:
+            release = self._slot_releaser(1)
+            try:
+                future = self._submit(executor, _render_xml, xml_string, release)
+            except BaseException:
+                release()
+                raise
+            return self._wait(executor, [future], deadline)[0]
+
+        # One use per part plus one for the merge; uses never submitted are given back here.
+        release = self._slot_releaser(len(parts) + 1)
+        futures = []
+        try:
+            for part in parts:
+                futures.append(self._submit(executor, _render_part, part, release))
+            fragments = self._wait(executor, futures, deadline)
+            futures.append(self._submit(executor, _merge_parts, fragments, release))
+        except BaseException:
+            for _ in range(len(parts) + 1 - len(futures)):
+                release()
+            for future in futures:
+                future.cancel()
+            raise
+        return self._wait(executor, futures[-1:], deadline)[0]
+
+    def render(self, xml_string: str) -> bytes:
+        if not self._slots.acquire(blocking=False):
+            RENDER_JOBS.inc(result="rejected")
+            raise RenderQueueFullError(f"{self.workers + self.max_pending} presentations are already rendering or queued.")
+        with self._lock:
+            self._pending += 1
+
+        with PPTX_RENDER_LATENCY.time():
+            if self.workers <= 0:
+                try:
+                    deck = _render_xml(xml_string)
+                except Exception:
+                    RENDER_JOBS.inc(result="error")
+                    raise
+                finally:
+                    self._release_slot()
+                RENDER_JOBS.inc(result="ok")
+                return deck
+
+            try:
+                deck = self._render_in_workers(xml_string)
+            except RenderTimeoutError:
+                RENDER_JOBS.inc(result="timeout")
+                raise
+            except Exception:
+                RENDER_JOBS.inc(result="error")
+                raise
+            RENDER_JOBS.inc(result="ok")
+            return deck
+
+render_pool = RenderPool(
+    workers=settings.RENDER_WORKERS,
+    max_pending=settings.RENDER_MAX_PENDING,
+    timeout=settings.RENDER_TIMEOUT,
+    split_min_units=settings.RENDER_SPLIT_MIN_UNITS,
+)
+
+CallbackMetric("bu_render_pending", "Presentations rendering or waiting for a render worker.", lambda: render_pool.pending)
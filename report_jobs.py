@@ -0,0 +1,217 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from config import settings, logger
+from database import get_db_connection
+from exceptions import RenderQueueFullError
+from metrics import CallbackMetric, Counter
+from deck_cache import render_presentation
+from temp_files import temp_files
+
+
+REPORT_JOBS = Counter("bu_report_jobs_total", "Report jobs by outcome (deduplicated = joined an identical in-flight job).", ("result",))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class ReportJob:
+    """State of one monthly presentation job. Mutated only by the manager under its lock."""
+    __slots__ = ("job_id", "user_id", "business_unit", "status", "stage", "progress",
+                 "created_at", "finished_at", "error", "path", "size")
+
+    def __init__(self, user_id: int, business_unit: Optional[str]):
+        self.job_id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.business_unit = business_unit
+        self.status = QUEUED
+        self.stage = "Waiting for a worker"
+        self.progress = 0
+        self.created_at = time.time()
+        self.finished_at = None
+        self.error = None
+        self.path = None
+        self.size = None
+
+    def to_dict(self, ttl: float) -> dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "business_unit": self.business_unit,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "expires_at": self.finished_at + ttl if self.finished_at else None,
+            "error": self.error,
+            "size": self.size,
+        }
+
+
+class ReportJobManager:
+    """
+    Runs monthly presentation requests in the background and keeps the finished decks on local disk.
+
+    A request identical to one that is still queued or running (same user and business unit) joins
+    that job instead of starting another render. Finished jobs and their files are removed
+    `ttl` seconds after they complete; until then the files count against temp_files.
+
+    Jobs live in this process only; a restart forgets them and clears the store. Polls and
+    downloads must therefore reach the instance that created the job. With more than one
+    instance (app.yaml scales to several) that needs session affinity in front of the service;
+    without it a poll routed elsewhere gets 404 and the client should fall back to the
+    synchronous /reports/monthly-presentation download.
+    """
+
+    def __init__(self, store_dir: str, ttl: float, workers: int):
+        self.store_dir = store_dir
+        self.ttl = ttl
+        self.workers = workers
+        self._jobs: Dict[str, ReportJob] = {}
+        self._in_flight: Dict[Tuple[int, Optional[str]], ReportJob] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def start(self):
+        os.makedirs(self.store_dir, exist_ok=True)
+        for name in os.listdir(self.store_dir):
+            if name.endswith((".pptx", ".tmp")):
+                self._remove_file(os.path.join(self.store_dir, name))
+        temp_files.set("report_jobs", 0)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="report-job")
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, user_id: int, business_unit: Optional[str] = None) -> Tuple[ReportJob, bool]:
+        """Return (job, created). `created` is False when an identical in-flight job was reused."""
+        self.purge_expired()
+        if self._executor is None:
+            self.start()
+        key = (user_id, business_unit)
+        with self._lock:
+            job = self._in_flight.get(key)
+            if job is not None:
+                REPORT_JOBS.inc(result="deduplicated")
+                return job, False
+            job = ReportJob(user_id=user_id, business_unit=business_unit)
+            self._jobs[job.job_id] = job
+            self._in_flight[key] = job
+        self._executor.submit(self._run, job)
+        logger.info(f"Queued report job {job.job_id} for user {user_id}" + (f", business_unit={business_unit}" if business_unit else ""))
+        return job, True
+
+    def get(self, job_id: str, user_id: int) -> Optional[ReportJob]:
+        """The caller's job, or None if it doesn't exist, has expired or belongs to someone else."""
+        self.purge_expired()
+        job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    def _set_stage(self, job: ReportJob, stage: str, progress: int, status: str = RUNNING):
+        with self._lock:
+            job.status = status
+            job.stage = stage
+            job.progress = progress
+
+    def _render(self, job: ReportJob) -> bytes:
+        # Imported here: services.bu_service pulls in the whole reporting stack.
+        from services.bu_service import ReportingService
+
+        with get_db_connection() as db:
+            xml_data = ReportingService(db=db).fetch_monthly_report_xml(user_id=job.user_id, business_unit=job.business_unit)
+
+        deadline = time.monotonic() + settings.REPORT_JOB_TIMEOUT
+        while True:
+            try:
+                self._set_stage(job, "Rendering presentation", 30)
+                return render_presentation(xml_data)
+            except RenderQueueFullError:
+                # Interactive requests have the render pool busy; a background job can afford to wait.
+                if time.monotonic() > deadline:
+                    raise
+                self._set_stage(job, "Waiting for a render worker", 20)
+                time.sleep(2)
+
+    def _run(self, job: ReportJob):
+        try:
+            self._set_stage(job, "Fetching report data", 5)
+            deck = self._render(job)
+            self._set_stage(job, "Saving presentation", 90)
+            path = os.path.join(self.store_dir, f"{job.job_id}.pptx")
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(deck)
+            os.replace(tmp_path, path)
+            temp_files.add("report_jobs", len(deck))
+            with self._lock:
+                job.path = path
+                job.size = len(deck)
+                job.status = SUCCEEDED
+                job.stage = "Done"
+                job.progress = 100
+            REPORT_JOBS.inc(result="succeeded")
+            logger.info(f"Report job {job.job_id} finished ({len(deck)} bytes)")
+        except Exception as ex:
+            logger.error(f"Report job {job.job_id} failed: {ex}", exc_info=True)
+            with self._lock:
+                job.status = FAILED
+                job.stage = "Failed"
+                job.error = str(ex)
+            REPORT_JOBS.inc(result="failed")
+        finally:
+            with self._lock:
+                job.finished_at = time.time()
+                self._in_flight.pop((job.user_id, job.business_unit), None)
+
+    def purge_expired(self) -> int:
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [job for job in self._jobs.values() if job.finished_at is not None and job.finished_at < cutoff]
+            for job in expired:
+                del self._jobs[job.job_id]
+        for job in expired:
+            if job.path:
+                self._remove_file(job.path)
+                temp_files.add("report_jobs", -job.size)
+        return len(expired)
+
+    def describe(self, job: ReportJob) -> dict:
+        with self._lock:
+            return job.to_dict(self.ttl)
+
+    def _remove_file(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as ex:
+            logger.warning(f"Could not remove report file {path}: {ex}")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "jobs": len(self._jobs),
+                "in_flight": len(self._in_flight),
+            }
+
+
+report_jobs = ReportJobManager(
+    store_dir=settings.REPORT_JOB_DIR,
+    ttl=settings.REPORT_JOB_TTL,
+    workers=settings.REPORT_JOB_WORKERS,
+)
+
+CallbackMetric("bu_report_jobs_in_flight", "Report jobs queued or running.", lambda: report_jobs.get_stats()["in_flight"])
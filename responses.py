@@ -0,0 +1,189 @@
+import hashlib
+import json
+import tempfile
+from itertools import chain
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional, Tuple
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from starlette.background import BackgroundTask
+from starlette.responses import Response, StreamingResponse
+
+from config import settings, logger
+from database import get_db_connection, hold_connection
+from http_cache import etag_matches
+from temp_files import temp_files
+
+
+STREAM_FORMATS = ("json", "ndjson")
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _dumps(row) -> str:
+    # jsonable_encoder only runs for values json can't encode natively (datetime, Decimal, ...),
+    # so rows serialise exactly as they do through the regular response path.
+    return json.dumps(row, default=jsonable_encoder, ensure_ascii=False, separators=(",", ":"))
+
+def _encode_rows(open_rows: Callable[[object], Iterable[dict]], fmt: str, chunk_size: int, db=None) -> Iterator[str]:
+    ndjson = fmt == "ndjson"
+    parts = [] if ndjson else ["["]
+    size = 0
+    with (hold_connection(db) if db is not None else get_db_connection()) as db:
+        for index, row in enumerate(open_rows(db)):
+            encoded = _dumps(row)
+            if ndjson:
+                parts.append(encoded)
+                parts.append("\n")
+            else:
+                if index:
+                    parts.append(",")
+                parts.append(encoded)
+            size += len(encoded)
+            if size >= chunk_size:
+                yield "".join(parts)
+                parts = []
+                size = 0
+    # The cursor is exhausted and the connection is back in the pool before the tail is sent.
+    if not ndjson:
+        parts.append("]")
+    yield "".join(parts)
+
+def stream_rows_response(open_rows: Callable[[object], Iterable[dict]], fmt: str = "json",
+                         chunk_size: int = STREAM_CHUNK_SIZE, db=None) -> StreamingResponse:
+    """
+    Stream rows as a JSON array or NDJSON straight from the cursor.
+
+    `open_rows` receives a connection held for the lifetime of the stream and returns the row
+    iterator: the request's own `db` when given (kept past the request's dependencies, see
+    database.hold_connection), otherwise one checked out from the pool. The first chunk is
+    produced before the response starts, so procedure errors still surface as a normal error
+    status instead of a truncated body.
+    """
+    body = _encode_rows(open_rows, fmt, chunk_size, db)
+    try:
+        first = next(body)
+    except Exception as ex:
+        logger.error(f"Failed to start streamed response: {ex}")
+        raise
+    return StreamingResponse(chain([first], body), media_type=_MEDIA_TYPES[fmt])
+
+
+class _Spool(tempfile.SpooledTemporaryFile):
+    """Counts its bytes against temp_files once it has moved to disk, until it is closed."""
+    _counted = 0
+
+    def write(self, s):
+        written = super().write(s)
+        if self._rolled:
+            size = self.tell()
+            if size > self._counted:
+                temp_files.add("spools", size - self._counted)
+                self._counted = size
+        return written
+
+    def close(self):
+        if self._counted:
+            temp_files.add("spools", -self._counted)
+            self._counted = 0
+        super().close()
+
+def new_spool() -> tempfile.SpooledTemporaryFile:
+    """A temporary file kept in memory up to SPOOL_MAX_BYTES and moved to disk beyond that."""
+    return _Spool(max_size=settings.SPOOL_MAX_BYTES)
+
+def spool_bytes(data: bytes) -> tempfile.SpooledTemporaryFile:
+    """A rewound spooled file (see new_spool) holding `data`."""
+    spool = new_spool()
+    spool.write(data)
+    spool.seek(0)
+    return spool
+
+def _file_etag(fileobj: BinaryIO, chunk_size: int) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+        digest.update(chunk)
+    return '"' + digest.hexdigest() + '"'
+
+def _byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    (first, last) byte positions of a single `bytes=` range, or None when the header should be
+    ignored (malformed, another unit, or several ranges: those get the whole file). The result
+    may be unsatisfiable (first >= size); the caller answers that with 416.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    if not (first or last) or any(part and not part.isdigit() for part in (first, last)):
+        return None
+    if not first:
+        # Suffix range: the last N bytes.
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    return start, min(int(last), size - 1) if last else size - 1
+
+def _iter_file(fileobj: BinaryIO, start: int, length: int, chunk_size: int) -> Iterator[bytes]:
+    try:
+        fileobj.seek(start)
+        while length > 0:
+            chunk = fileobj.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        fileobj.close()
+
+def file_response(request: Request, fileobj: BinaryIO, media_type: str, filename: str,
+                  chunk_size: Optional[int] = None) -> Response:
+    """
+    Send a local file object (a spooled deck, a finished job's file) and close it afterwards.
+
+    The body goes out in `chunk_size` pieces with Content-Length and a strong ETag over the
+    content. A single `Range: bytes=` request is answered with 206 and just that slice, so
+    interrupted downloads can resume; If-Range makes sure they only resume the same file.
+    """
+    chunk_size = chunk_size or settings.FILE_RESPONSE_CHUNK_SIZE
+    size = fileobj.seek(0, 2)
+    etag = _file_etag(fileobj, chunk_size)
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+    if etag_matches(request, etag):
+        fileobj.close()
+        return Response(status_code=304, headers=headers)
+
+    status_code, start, length = 200, 0, size
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        byte_range = _byte_range(range_header, size)
+        if byte_range is not None:
+            first, last = byte_range
+            if first >= size:
+                fileobj.close()
+                headers["Content-Range"] = f"bytes */{size}"
+                return Response(status_code=416, headers=headers)
+            status_code, start, length = 206, first, last - first + 1
+            headers["Content-Range"] = f"bytes {first}-{last}/{size}"
+
+    headers["Content-Length"] = str(length)
+    return StreamingResponse(
+        _iter_file(fileobj, start, length, chunk_size),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers,
+        # Closes the file even if the client goes away before the body is started.
+        background=BackgroundTask(fileobj.close),
+    )
@@ -1,10 +1,12 @@
 from typing import Optional
 import pymssql
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Request
 from services.admin_service import AdminService
 from database import get_db
-from security import require_admin
+from security import get_current_user_id, require_admin, revocations
 from schemas import ClosePeriodRequest, OkrMasterItem, SetPeriodRequest
+from http_cache import etag_response
+from config import logger
 
 
 router = APIRouter()
@@ -16,7 +18,7 @@ def get_admin_service(db: pymssql.Connection = Depends(get_db)) -> AdminService:
 @router.post("/submission-period/set")
 def set_submission_period(
     request: SetPeriodRequest,
-    x_user_id: Optional[int] = Header(None),
+    x_user_id: Optional[int] = Depends(get_current_user_id),
     service: AdminService = Depends(get_admin_service)
 ):
     if x_user_id is None:
@@ -104,6 +106,7 @@ def get_okr_master_list(
 
 @router.get("/lookup-data")
 def get_all_lookup_data(
+    request: Request,
     x_user_id: int = Depends(require_admin),
     service: AdminService = Depends(get_admin_service)
 ):
@@ -111,12 +114,36 @@ def get_all_lookup_data(
         raise HTTPException(status_code=401, detail="Unauthorized: User ID is missing.")
 
     try:
-        return service.fetch_all_lookup_data()
+        dataset = service.fetch_lookup_dataset()
+        return etag_response(request, body=dataset.body, etag=dataset.etag)
     except pymssql.Error as db_error:
         raise HTTPException(status_code=400, detail=str(db_error))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
+@router.post("/lookup-data/refresh")
+def refresh_lookup_data(
+    x_user_id: int = Depends(require_admin),
+    service: AdminService = Depends(get_admin_service)
+):
+    if x_user_id is None:
+        raise HTTPException(status_code=401, detail="Unauthorized: User ID is missing.")
+
+    service.refresh_lookup_data()
+    return {"status": "success", "message": "Reference data will be reloaded on the next request."}
+
+@router.post("/users/{user_id}/revoke-sessions")
+def revoke_user_sessions(
+    user_id: int,
+    x_user_id: int = Depends(require_admin)
+):
+    if x_user_id is None:
+        raise HTTPException(status_code=401, detail="Unauthorized: User ID is missing.")
+
+    revocations.revoke_user(user_id)
+    logger.info(f"Admin {x_user_id} revoked all session tokens of user {user_id}")
+    return {"status": "success", "message": f"Sessions of user {user_id} have been revoked."}
+
 @router.get("/okrs/{okr_master_id}")
 def get_okr_master_by_id(
     okr_master_id: int,
@@ -4,7 +4,8 @@ import pymssql
 from services.auth_service import AuthService
 from exceptions import EmailNotFoundError, InvalidLoginCodeError, UserNotActiveError
 from database import get_db
-from typing import Union
+from typing import Optional, Union
+from security import SessionClaims, get_session, revocations
 from schemas import LoginRequest, VerifyRequest, LoginSuccessResponse, LoginFailedResponse
 
 router = APIRouter()
@@ -48,4 +49,12 @@ def verify_code(
     except pymssql.Error as e:
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
+
+@router.post("/logout")
+def logout(session: Optional[SessionClaims] = Depends(get_session)):
+    if session is None:
+        raise HTTPException(status_code=401, detail="Unauthorized: Bearer token expected.")
+
+    revocations.revoke_token(session)
+    return {"status": "success", "message": "Logged out."}
\ No newline at end of file
@@ -1,10 +1,23 @@
 import pymssql
-from fastapi import APIRouter, Request, Header, Depends, HTTPException
-from typing import Optional
+from fastapi import APIRouter, Request, Response, Depends, HTTPException, Query
+from typing import Dict, List, Optional
 from services.bu_service import ReportingService
 from database import get_db
 from datetime import datetime
-from starlette.responses import StreamingResponse
+from responses import file_response, stream_rows_response
+from http_cache import etag_response
+from dependencies import bulk_update_body, submission_body
+from bulk_xml import BulkPayload, OKR_DETAILS, COMMENTARY_DETAILS, PRIORITIES, OPS_TRACKER_STATUSES, OPS_OVERDUES
+from security import get_current_user_id
+from exceptions import BulkUpdateError, CoalesceConflictError, RenderQueueFullError, RenderTimeoutError
+from report_jobs import report_jobs, FAILED, SUCCEEDED
+from xlsx_export import XLSX_MEDIA_TYPE
+
+
+STREAM_PATTERN = "^(json|ndjson)$"
+COMMIT_PATTERN = "^(all|batch)$"
+# Jobs are held by the instance that created them (see report_jobs.ReportJobManager).
+REPORT_JOB_NOT_FOUND = "Report job not found, expired, or created on another instance."
 
 
 router = APIRouter()
@@ -12,110 +25,155 @@ router = APIRouter()
 def get_reporting_service(db: pymssql.Connection = Depends(get_db)) -> ReportingService:
     return ReportingService(db=db)
 
+def bulk_update_failed(e: BulkUpdateError) -> HTTPException:
+    return HTTPException(status_code=500, detail={
+        "message": f"An unexpected error occurred: {e}",
+        "failed_batch": e.failed_batch,
+        "committed_batches": e.committed,
+    })
+
 
 @router.get("/okrs")
 def get_okrs(
-    x_user_id: Optional[int] = Header(None),
+    request: Request,
+    x_user_id: Optional[int] = Depends(get_current_user_id),
+    stream: Optional[str] = Query(None, pattern=STREAM_PATTERN),
     service: ReportingService = Depends(get_reporting_service)
 ):
     if x_user_id is None:
         raise HTTPException(status_code=400, detail="X-User-ID header is missing or invalid.")
     
     try:
-        return service.fetch_okrs(user_id=x_user_id)
+        if stream:
+            return stream_rows_response(lambda db: ReportingService(db=db).iter_okrs(user_id=x_user_id), fmt=stream, db=service.db)
+        return etag_response(request, service.fetch_okrs(user_id=x_user_id))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
     
 @router.get("/okrs/tracker")
 def get_okr_tracker(
-    x_user_id: Optional[int] = Header(None),
+    request: Request,
+    x_user_id: Optional[int] = Depends(get_current_user_id),
+    stream: Optional[str] = Query(None, pattern=STREAM_PATTERN),
     service: ReportingService = Depends(get_reporting_service)
 ):
     if x_user_id is None:
         raise HTTPException(status_code=400, detail="X-User-ID header is missing or invalid.")
     
     try:
-        return service.fetch_okr_tracker_by_user(user_id=x_user_id)
+        if stream:
+            return stream_rows_response(lambda db: ReportingService(db=db).iter_okr_tracker_by_user(user_id=x_user_id), fmt=stream, db=service.db)
+        return etag_response(request, service.fetch_okr_tracker_by_user(user_id=x_user_id))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
 @router.get("/kjops")
 def get_kjops(
-    x_user_id: Optional[int] = Header(None),
+    request: Request,
+    x_user_id: Optional[int] = Depends(get_current_user_id),
+    stream: Optional[str] = Query(None, pattern=STREAM_PATTERN),
     service: ReportingService = Depends(get_reporting_service)
 ):
     if x_user_id is None:
         raise HTTPException(status_code=400, detail="X-User-ID header is missing or invalid.")
     
     try:
-        return service.fetch_kjops_by_user(user_id=x_user_id)
+        if stream:
+            return stream_rows_response(lambda db: ReportingService(db=db).iter_kjops_by_user(user_id=x_user_id), fmt=stream, db=service.db)
+        return etag_response(request, service.fetch_kjops_by_user(user_id=x_user_id))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
 @router.get("/commentaries")
 def get_commentaries(
-    x_user_id: Optional[int] = Header(None),
+    request: Request,
+    x_user_id: Optional[int] = Depends(get_current_user_id),
     service: ReportingService = Depends(get_reporting_service)
 ):
     if x_user_id is None:
         raise HTTPException(status_code=400, detail="X-User-ID header is missing or invalid.")
     
     try:
-        return service.fetch_commentaries(user_id=x_user_id)
+        return etag_response(request, service.fetch_commentaries(user_id=x_user_id))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
 @router.get("/priorities")
 def get_priorities(
-    x_user_id: Optional[int] = Header(None),
+    request: Request,
+    x_user_id: Optional[int] = Depends(get_current_user_id),
     service: ReportingService = Depends(get_reporting_service)
 ):
     if x_user_id is None:
         raise HTTPException(status_code=400, detail="X-User-ID header is missing or invalid.")
     
     try:
-        return service.fetch_priorities(user_id=x_user_id)
+        return etag_response(request, service.fetch_priorities(user_id=x_user_id))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
 @router.get("/priority-statuses")
 def get_priority_statuses(
+    request: Request,
     service: ReportingService = Depends(get_reporting_service)
 ):
     try:
-        return service.fetch_priority_statuses()
+        dataset = service.fetch_priority_status_dataset()
+        return etag_response(request, body=dataset.body, etag=dataset.etag)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
 @router.get("/tracker-statuses")
 def get_tracker_statuses(
-    x_user_id: Optional[int] = Header(None),
+    request: Request,
+    x_user_id: Optional[int] = Depends(get_current_user_id),
     service: ReportingService = Depends(get_reporting_service)
 ):
     if x_user_id is None:
         raise HTTPException(status_code=400, detail="X-User-ID header is missing or invalid.")
     
     try:
-        return service.fetch_tracker_statuses(user_id=x_user_id)
+        return etag_response(request, service.fetch_tracker_statuses(user_id=x_user_id))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
 @router.get("/overdues")
 def get_overdues(
-    x_user_id: Optional[int] = Header(None),
+    request: Request,
+    x_user_id: Optional[int] = Depends(get_current_user_id),
     service: ReportingService = Depends(get_reporting_service)
 ):
     if x_user_id is None:
         raise HTTPException(status_code=400, detail="X-User-ID header is missing or invalid.")
     
     try:
-        return service.fetch_overdues(user_id=x_user_id)
+        return etag_response(request, service.fetch_overdues(user_id=x_user_id))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
     
+PPTX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+@router.get("/bootstrap")
+def get_bootstrap(
+    request: Request,
+    x_user_id: Optional[int] = Depends(get_current_user_id),
+    service: ReportingService = Depends(get_reporting_service)
+):
+    if x_user_id is None:
+        raise HTTPException(status_code=400, detail="X-User-ID header is missing or invalid.")
+
+    try:
+        payload = service.fetch_bootstrap(user_id=x_user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
+    if not payload["data"]:
+        raise HTTPException(status_code=500, detail={"message": "Every bootstrap section failed.", "errors": payload["errors"]})
+    return etag_response(request, payload)
+
 @router.get("/reports/monthly-presentation")
 def get_monthly_presentation(
-    x_user_id: Optional[int] = Header(None),
+    request: Request,
+    x_user_id: Optional[int] = Depends(get_current_user_id),
     business_unit: Optional[str] = None,
     service: ReportingService = Depends(get_reporting_service)
 ):
@@ -123,103 +181,213 @@ def get_monthly_presentation(
         raise HTTPException(status_code=400, detail="X-User-ID header is missing or invalid.")
     
     try:
-        ppt_stream = service.fetch_monthly_presentation(user_id=x_user_id, business_unit=business_unit)
+        ppt_file = service.fetch_monthly_presentation(user_id=x_user_id, business_unit=business_unit)
         filename = f"Monthly_Report_{datetime.now().strftime('%Y%m%d%H%M%S')}.pptx"
-        return StreamingResponse(
-            ppt_stream,
-            media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
-        )
+        return file_response(request, ppt_file, media_type=PPTX_MEDIA_TYPE, filename=filename)
+    except RenderQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except RenderTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/reports/monthly-presentation/jobs", status_code=202)
+def create_monthly_presentation_job(
+    request: Request,
+    response: Response,
+    x_user_id: Optional[int] = Depends(get_current_user_id),
+    business_unit: Optional[str] = None
+):
+    if x_user_id is None:
+        raise HTTPException(status_code=400, detail="X-User-ID header is missing or invalid.")
+
+    job, created = report_jobs.submit(user_id=x_user_id, business_unit=business_unit)
+    if not created:
+        response.status_code = 200
+    response.headers["Location"] = str(request.url_for("get_monthly_presentation_job", job_id=job.job_id))
+    return report_jobs.describe(job)
 
-@router.put("/okrs/bulk-update")
-async def bulk_update_okrs(
+@router.get("/reports/monthly-presentation/jobs/{job_id}")
+def get_monthly_presentation_job(
+    job_id: str,
+    x_user_id: Optional[int] = Depends(get_current_user_id)
+):
+    if x_user_id is None:
+        raise HTTPException(status_code=400, detail="X-User-ID header is missing or invalid.")
+
+    job = report_jobs.get(job_id=job_id, user_id=x_user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=REPORT_JOB_NOT_FOUND)
+    return report_jobs.describe(job)
+
+@router.get("/reports/monthly-presentation/jobs/{job_id}/download")
+def download_monthly_presentation_job(
+    request: Request,
+    job_id: str,
+    x_user_id: Optional[int] = Depends(get_current_user_id)
+):
+    if x_user_id is None:
+        raise HTTPException(status_code=400, detail="X-User-ID header is missing or invalid.")
+
+    job = report_jobs.get(job_id=job_id, user_id=x_user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=REPORT_JOB_NOT_FOUND)
+    if job.status == FAILED:
+        raise HTTPException(status_code=409, detail=f"Report job failed: {job.error}")
+    if job.status != SUCCEEDED:
+        raise HTTPException(status_code=409, detail="Report is not ready yet.", headers={"Retry-After": "2"})
+
+    try:
+        ppt_file = open(job.path, "rb")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=REPORT_JOB_NOT_FOUND)
+    filename = f"Monthly_Report_{datetime.fromtimestamp(job.finished_at).strftime('%Y%m%d%H%M%S')}.pptx"
+    return file_response(request, ppt_file, media_type=PPTX_MEDIA_TYPE, filename=filename)
+
+
+@router.get("/export.xlsx")
+def export_xlsx(
     request: Request,
-    x_user_id: Optional[int] = Header(None),
+    x_user_id: Optional[int] = Depends(get_current_user_id),
+    datasets: Optional[List[str]] = Query(None, description="Datasets to export (repeat or comma-separate); all when omitted."),
     service: ReportingService = Depends(get_reporting_service)
 ):
     if x_user_id is None:
         raise HTTPException(status_code=400, detail="X-User-ID header is missing or invalid.")
 
+    names = list(dict.fromkeys(name.strip() for value in datasets or [] for name in value.split(",") if name.strip()))
+    names = names or list(ReportingService.EXPORT_DATASETS)
+    unknown = [name for name in names if name not in ReportingService.EXPORT_DATASETS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown dataset(s): {', '.join(unknown)}. Available: {', '.join(ReportingService.EXPORT_DATASETS)}."
+        )
+
     try:
-        xml_data_bytes = await request.body()
-        xml_string = xml_data_bytes.decode('utf-8')
-        
-        return service.bulk_update_okrs(xml_string=xml_string, user_id=x_user_id)
+        xlsx_file = service.export_xlsx(user_id=x_user_id, datasets=names)
+        filename = f"Reporting_Export_{datetime.now().strftime('%Y%m%d%H%M%S')}.xlsx"
+        return file_response(request, xlsx_file, media_type=XLSX_MEDIA_TYPE, filename=filename)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
+
 
+@router.put("/okrs/bulk-update")
+def bulk_update_okrs(
+    x_user_id: Optional[int] = Depends(get_current_user_id),
+    payload: BulkPayload = Depends(bulk_update_body(OKR_DETAILS)),
+    batch_size: Optional[int] = Query(None, ge=1),
+    commit: str = Query("all", pattern=COMMIT_PATTERN),
+    service: ReportingService = Depends(get_reporting_service)
+):
+    if x_user_id is None:
+        raise HTTPException(status_code=400, detail="X-User-ID header is missing or invalid.")
+
+    try:
+        return service.bulk_update_okrs(payload=payload, user_id=x_user_id, batch_size=batch_size, atomic=commit == "all")
+
+    except BulkUpdateError as e:
+        raise bulk_update_failed(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
 @router.put("/commentaries/bulk-update")
-async def bulk_update_commentaries(
-    request: Request,
-    x_user_id: Optional[int] = Header(None),
+def bulk_update_commentaries(
+    x_user_id: Optional[int] = Depends(get_current_user_id),
+    payload: BulkPayload = Depends(bulk_update_body(COMMENTARY_DETAILS)),
+    batch_size: Optional[int] = Query(None, ge=1),
+    commit: str = Query("all", pattern=COMMIT_PATTERN),
     service: ReportingService = Depends(get_reporting_service)
 ):
     if x_user_id is None:
         raise HTTPException(status_code=400, detail="X-User-ID header is missing or invalid.")
 
     try:
-        xml_data_bytes = await request.body()
-        xml_string = xml_data_bytes.decode('utf-8')
-        
-        return service.bulk_update_commentaries(xml_string=xml_string, user_id=x_user_id)
+        return service.bulk_update_commentaries(payload=payload, user_id=x_user_id, batch_size=batch_size, atomic=commit == "all")
 
+    except BulkUpdateError as e:
+        raise bulk_update_failed(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
 @router.put("/priorities/bulk-update")
-async def bulk_update_priorities(
-    request: Request,
-    x_user_id: Optional[int] = Header(None),
+def bulk_update_priorities(
+    x_user_id: Optional[int] = Depends(get_current_user_id),
+    payload: BulkPayload = Depends(bulk_update_body(PRIORITIES)),
+    batch_size: Optional[int] = Query(None, ge=1),
+    commit: str = Query("all", pattern=COMMIT_PATTERN),
+    coalesce: bool = Query(False),
     service: ReportingService = Depends(get_reporting_service)
 ):
     if x_user_id is None:
         raise HTTPException(status_code=400, detail="X-User-ID header is missing or invalid.")
 
     try:
-        xml_data_bytes = await request.body()
-        xml_string = xml_data_bytes.decode('utf-8')
-        
-        return service.bulk_update_priorities(xml_string=xml_string, user_id=x_user_id)
+        return service.bulk_update_priorities(
+            payload=payload, user_id=x_user_id, batch_size=batch_size, atomic=commit == "all", coalesce=coalesce
+        )
 
+    except BulkUpdateError as e:
+        raise bulk_update_failed(e)
+    except CoalesceConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
 @router.put("/tracker-statuses/bulk-update")
-async def bulk_update_tracker_statuses(
-    request: Request,
-    x_user_id: Optional[int] = Header(None),
+def bulk_update_tracker_statuses(
+    x_user_id: Optional[int] = Depends(get_current_user_id),
+    payload: BulkPayload = Depends(bulk_update_body(OPS_TRACKER_STATUSES)),
+    batch_size: Optional[int] = Query(None, ge=1),
+    commit: str = Query("all", pattern=COMMIT_PATTERN),
+    coalesce: bool = Query(False),
     service: ReportingService = Depends(get_reporting_service)
 ):
     if x_user_id is None:
         raise HTTPException(status_code=400, detail="X-User-ID header is missing or invalid.")
 
     try:
-        xml_data_bytes = await request.body()
-        xml_string = xml_data_bytes.decode('utf-8')
-        
-        return service.bulk_update_tracker_statuses(xml_string=xml_string, user_id=x_user_id)
+        return service.bulk_update_tracker_statuses(
+            payload=payload, user_id=x_user_id, batch_size=batch_size, atomic=commit == "all", coalesce=coalesce
+        )
 
+    except BulkUpdateError as e:
+        raise bulk_update_failed(e)
+    except CoalesceConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
 @router.put("/overdues/bulk-update")
-async def bulk_update_overdues(
-    request: Request,
-    x_user_id: Optional[int] = Header(None),
+def bulk_update_overdues(
+    x_user_id: Optional[int] = Depends(get_current_user_id),
+    payload: BulkPayload = Depends(bulk_update_body(OPS_OVERDUES)),
+    batch_size: Optional[int] = Query(None, ge=1),
+    commit: str = Query("all", pattern=COMMIT_PATTERN),
+    service: ReportingService = Depends(get_reporting_service)
+):
+    if x_user_id is None:
+        raise HTTPException(status_code=400, detail="X-User-ID header is missing or invalid.")
+
+    try:
+        return service.bulk_update_overdues(payload=payload, user_id=x_user_id, batch_size=batch_size, atomic=commit == "all")
+
+    except BulkUpdateError as e:
+        raise bulk_update_failed(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
+
+@router.put("/submission")
+def save_submission(
+    x_user_id: Optional[int] = Depends(get_current_user_id),
+    sections: Dict[str, BulkPayload] = Depends(submission_body),
     service: ReportingService = Depends(get_reporting_service)
 ):
     if x_user_id is None:
         raise HTTPException(status_code=400, detail="X-User-ID header is missing or invalid.")
 
     try:
-        xml_data_bytes = await request.body()
-        xml_string = xml_data_bytes.decode('utf-8')
-        
-        return service.bulk_update_overdues(xml_string=xml_string, user_id=x_user_id)
+        return service.save_submission(sections=sections, user_id=x_user_id)
 
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, Header, Request
+from fastapi import APIRouter, Depends, Request
 from typing import Optional
 from services.log_service import LogService
 from database import get_db
 from schemas import LogRequest
 from dependencies import get_client_ip
+from security import get_current_user_id
 import pymssql
 
 
@@ -16,7 +17,7 @@ def get_log_service(db: pymssql.Connection = Depends(get_db)) -> LogService:
 def add_log_entry(
     request_data: LogRequest,
     client_ip: str = Depends(get_client_ip),
-    x_user_id: Optional[int] = Header(None),
+    x_user_id: Optional[int] = Depends(get_current_user_id),
     service: LogService = Depends(get_log_service)
 ):
     if x_user_id is None:
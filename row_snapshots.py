@@ -0,0 +1,138 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from bulk_xml import BulkPayload, BulkRow
+from config import settings, logger
+from metrics import CallbackMetric, Counter
+
+
+DELTA_ROWS = Counter("bu_bulk_delta_rows_total", "Bulk-update rows sent to the database or skipped as unchanged.", ("table_name", "result"))
+
+
+def row_fingerprint(row: BulkRow, by_columns: bool = True) -> bytes:
+    """
+    Digest of a row's field values, the same for attribute and element forms of the same row.
+    Rows without a declared column layout (by_columns False) are digested as sent.
+    """
+    canonical = repr(sorted(row.fields.items())).encode("utf-8") if by_columns else row.xml.encode("utf-8")
+    return hashlib.blake2b(canonical, digest_size=16).digest()
+
+
+class Delta(NamedTuple):
+    changed: BulkPayload    # rows to send; the whole payload when there was no snapshot
+    skipped: int            # rows left out as unchanged
+    generation: int         # pass back to record() once the write has committed
+
+
+class _Snapshot(NamedTuple):
+    fingerprints: frozenset
+    expires_at: float
+
+
+class RowSnapshots:
+    """
+    Per-process record of the rows each user last saved to a table through a bulk update, kept as
+    row fingerprints keyed by (table_name, user_id), so a resubmitted grid can be cut down to the
+    rows that actually changed.
+
+    A snapshot only describes the table while nothing else has written to it. Any other write to
+    the table, a failed write or a submission-period change drops it, and it expires after `ttl`
+    seconds. Writes made by other processes can't be seen from here at all, which is why
+    BULK_DELTA_ENABLED is off unless a single process serves every bulk update. Bounded by the
+    total number of rows held; least recently used snapshots go first.
+    """
+
+    def __init__(self, max_rows: int, ttl: float):
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._snapshots = OrderedDict()   # (table_name, user_id) -> _Snapshot
+        self._generations = {}            # table_name -> writes seen so far
+        self._rows = 0
+
+    def changes(self, table_name: str, user_id: int, payload: BulkPayload) -> Delta:
+        key = (table_name, user_id)
+        with self._lock:
+            generation = self._generations.get(table_name, 0)
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None and snapshot.expires_at <= time.monotonic():
+                self._drop(key)
+                snapshot = None
+            if snapshot is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._snapshots.move_to_end(key)
+
+        if snapshot is None:
+            DELTA_ROWS.inc(len(payload), table_name=table_name, result="sent")
+            return Delta(payload, 0, generation)
+        by_columns = payload.schema.checks_columns
+        changed = [row for row in payload.rows if row_fingerprint(row, by_columns) not in snapshot.fingerprints]
+        skipped = len(payload) - len(changed)
+        DELTA_ROWS.inc(len(changed), table_name=table_name, result="sent")
+        DELTA_ROWS.inc(skipped, table_name=table_name, result="skipped")
+        return Delta(payload.with_rows(changed), skipped, generation)
+
+    def record(self, table_name: str, user_id: int, payload: BulkPayload, generation: int):
+        """
+        Note a committed write of `payload` (the rows as submitted, not just the changed ones).
+        Every other snapshot of the table is dropped; the writer's own is replaced, unless another
+        write to the table began after `generation` was read, in which case it is dropped too.
+        """
+        fingerprints = frozenset(row_fingerprint(row, payload.schema.checks_columns) for row in payload.rows)
+        with self._lock:
+            current = self._bump(table_name)
+            if current != generation or not fingerprints or len(fingerprints) > self.max_rows:
+                return
+            key = (table_name, user_id)
+            self._snapshots[key] = _Snapshot(fingerprints, time.monotonic() + self.ttl)
+            self._rows += len(fingerprints)
+            while self._rows > self.max_rows:
+                self._drop(next(iter(self._snapshots)))
+
+    def invalidate(self, table_name: str):
+        """Drop every snapshot of `table_name` after a write whose outcome isn't known row by row."""
+        with self._lock:
+            self._bump(table_name)
+
+    def clear(self):
+        with self._lock:
+            for table_name in list(self._generations):
+                self._generations[table_name] += 1
+            self._snapshots.clear()
+            self._rows = 0
+        logger.info("Cleared bulk-update row snapshots")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._snapshots),
+                "rows": self._rows,
+                "max_rows": self.max_rows,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _bump(self, table_name: str) -> int:
+        """Start a new generation of `table_name`, dropping its snapshots; returns the previous one."""
+        previous = self._generations.get(table_name, 0)
+        self._generations[table_name] = previous + 1
+        for key in [key for key in self._snapshots if key[0] == table_name]:
+            self._drop(key)
+        return previous
+
+    def _drop(self, key):
+        snapshot = self._snapshots.pop(key, None)
+        if snapshot is not None:
+            self._rows -= len(snapshot.fingerprints)
+
+
+row_snapshots = RowSnapshots(max_rows=settings.BULK_DELTA_MAX_ROWS, ttl=settings.BULK_DELTA_TTL)
+
+CallbackMetric("bu_bulk_delta_snapshot_rows", "Row fingerprints held in bulk-update snapshots.", lambda: row_snapshots.get_stats()["rows"])
@@ -45,6 +45,8 @@ class LoginSuccessResponse(BaseModel):
     status: str = "success"
     message: str
     data: UserData
+    token: Optional[str] = None               # send back as "Authorization: Bearer <token>"
+    token_expires_at: Optional[float] = None  # Unix timestamp
 
     class Config:
         from_attributes = True
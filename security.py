@@ -1,15 +1,187 @@
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+import uuid
 from fastapi import Depends, HTTPException, Header
-from typing import Optional
+from typing import Iterable, Optional, Tuple
 from database import get_db
 import pymssql
-from config import logger
+from config import settings, logger
+from exceptions import InvalidTokenError
+
+
+# -------------------------------------------------------------------
+# Signed session tokens
+# -------------------------------------------------------------------
+# Every instance must share the key, so without SESSION_TOKEN_SECRET no tokens are issued at all
+# (a per-process key would make tokens fail on other instances and after every restart).
+if settings.SESSION_TOKEN_SECRET:
+    _SIGNING_KEY = settings.SESSION_TOKEN_SECRET.encode("utf-8")
+elif settings.ALLOW_LEGACY_USER_HEADER:
+    _SIGNING_KEY = None
+    logger.warning("SESSION_TOKEN_SECRET is not set; session tokens are disabled and clients must use X-User-ID.")
+else:
+    raise RuntimeError("SESSION_TOKEN_SECRET must be set when ALLOW_LEGACY_USER_HEADER is off.")
+
+
+class SessionClaims:
+    """Verified contents of a session token."""
+    __slots__ = ("user_id", "is_admin", "permissions_digest", "issued_at", "expires_at", "token_id")
+
+    def __init__(self, payload: dict):
+        self.user_id = int(payload["uid"])
+        self.is_admin = bool(payload["adm"])
+        self.permissions_digest = payload["prm"]
+        self.issued_at = float(payload["iat"])
+        self.expires_at = float(payload["exp"])
+        self.token_id = payload["jti"]
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(_SIGNING_KEY, payload.encode("ascii"), hashlib.sha256).digest())
+
+def permissions_digest(permissions: Iterable[dict]) -> str:
+    """Short, order-independent fingerprint of a user's permission rows."""
+    entries = sorted(
+        (str(p.get("module_name")), str(p.get("bu_name")), str(p.get("access_type")))
+        for p in permissions or []
+    )
+    return hashlib.sha256(json.dumps(entries).encode("utf-8")).hexdigest()[:16]
+
+def tokens_enabled() -> bool:
+    return _SIGNING_KEY is not None
+
+def issue_session_token(user_id: int, is_admin: bool, permissions: Iterable[dict], ttl: Optional[float] = None) -> Tuple[Optional[str], Optional[float]]:
+    """Return a signed token for the user and its expiry as a Unix timestamp; (None, None) while tokens are disabled."""
+    if not tokens_enabled():
+        return None, None
+    issued_at = time.time()
+    expires_at = issued_at + (ttl if ttl is not None else settings.SESSION_TOKEN_TTL)
+    payload = {
+        "uid": int(user_id),
+        "adm": bool(is_admin),
+        "prm": permissions_digest(permissions),
+        "iat": issued_at,
+        "exp": round(expires_at, 3),
+        "jti": uuid.uuid4().hex,
+    }
+    encoded = _b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    return f"{encoded}.{_sign(encoded)}", payload["exp"]
+
+def verify_session_token(token: str) -> SessionClaims:
+    """Check signature, expiry and revocation without touching the database."""
+    if not tokens_enabled():
+        raise InvalidTokenError("Session tokens are not enabled on this server.")
+    encoded, _, signature = token.partition(".")
+    if not encoded or not signature or not hmac.compare_digest(signature, _sign(encoded)):
+        raise InvalidTokenError("Invalid session token.")
+    try:
+        claims = SessionClaims(json.loads(_b64decode(encoded)))
+    except (ValueError, KeyError, TypeError):
+        raise InvalidTokenError("Malformed session token.")
+    if claims.expires_at <= time.time():
+        raise InvalidTokenError("Session token has expired.")
+    if revocations.is_revoked(claims):
+        raise InvalidTokenError("Session token has been revoked.")
+    return claims
+
+
+class RevocationList:
+    """
+    Tokens and users logged out before their tokens expire.
+
+    Revoking a user rejects every token issued to them up to that moment, which is how a forced
+    logout (or a change to their admin flag or permissions) takes effect immediately. Entries are
+    dropped once the tokens they cover have expired anyway.
+    """
+
+    def __init__(self):
+        self._tokens = {}
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float):
+        self._tokens = {jti: exp for jti, exp in self._tokens.items() if exp > now}
+        horizon = now - settings.SESSION_TOKEN_TTL
+        self._users = {uid: at for uid, at in self._users.items() if at > horizon}
+
+    def revoke_token(self, claims: SessionClaims):
+        with self._lock:
+            self._prune(time.time())
+            self._tokens[claims.token_id] = claims.expires_at
+
+    def revoke_user(self, user_id: int):
+        with self._lock:
+            now = time.time()
+            self._prune(now)
+            self._users[int(user_id)] = now
+
+    def is_revoked(self, claims: SessionClaims) -> bool:
+        if claims.token_id in self._tokens:
+            return True
+        revoked_at = self._users.get(claims.user_id)
+        return revoked_at is not None and claims.issued_at <= revoked_at
+
+    def clear(self):
+        with self._lock:
+            self._tokens.clear()
+            self._users.clear()
+
+
+revocations = RevocationList()
+
+
+# -------------------------------------------------------------------
+# Dependencies
+# -------------------------------------------------------------------
+def get_session(authorization: Optional[str] = Header(None)) -> Optional[SessionClaims]:
+    """Claims from an `Authorization: Bearer` token, or None when the request doesn't carry one."""
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        raise HTTPException(status_code=401, detail="Unauthorized: Bearer token expected.", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return verify_session_token(token.strip())
+    except InvalidTokenError as ex:
+        raise HTTPException(status_code=401, detail=f"Unauthorized: {ex}", headers={"WWW-Authenticate": "Bearer"})
+
+
+def get_current_user_id(
+        session: Optional[SessionClaims] = Depends(get_session),
+        x_user_id: Optional[int] = Header(None)
+) -> Optional[int]:
+    """
+    User id from the session token. Falls back to the X-User-ID header while
+    ALLOW_LEGACY_USER_HEADER is on; a token always wins over the header.
+    """
+    if session is not None:
+        return session.user_id
+    if settings.ALLOW_LEGACY_USER_HEADER:
+        return x_user_id
+    return None
 
 
 def require_admin(
+        session: Optional[SessionClaims] = Depends(get_session),
         x_user_id: Optional[int] = Header(None),
         db: pymssql.Connection = Depends(get_db)
 ) -> int:
-    if x_user_id is None:
+    if session is not None:
+        if not session.is_admin:
+            raise HTTPException(status_code=403, detail="Forbidden: Administrator privileges required.")
+        return session.user_id
+
+    if x_user_id is None or not settings.ALLOW_LEGACY_USER_HEADER:
         raise HTTPException(status_code=401, detail="Unauthorized: User ID is missing.")
 
     try:
@@ -24,4 +196,4 @@ def require_admin(
         logger.error(f"Database error during admin permission check for user {x_user_id}: {ex}")
         raise HTTPException(status_code=500, detail="Database error during permission check.")
 
-    return x_user_id
\ No newline at end of file
+    return x_user_id
@@ -6,6 +6,9 @@ from config import logger
 from helpers import fetch_data
 from exceptions import SubmissionPeriodError
 from schemas import OkrMasterItem
+from reference_data import reference_data, CachedDataset, ADMIN_LOOKUP_DATA
+from row_snapshots import row_snapshots
+from cache import TABLE_READERS, response_cache
 
 
 class AdminService:
@@ -19,6 +22,9 @@ class AdminService:
                 cursor.callproc('usp_close_submission_period', (user_id, closed_at))
                 result = cursor.fetchone()
             self.db.commit()
+            # Bulk-update snapshots and cached reads describe the previous period's rows.
+            row_snapshots.clear()
+            response_cache.clear()
             if not result or "status" not in result:
                 logger.error(f"No status returned from usp_close_submission_period for user {user_id}")
                 raise SubmissionPeriodError("No status returned from stored procedure.")
@@ -41,6 +47,8 @@ class AdminService:
                 cursor.callproc('usp_set_submission_period', (year, month, user_id))
                 result = cursor.fetchone()
             self.db.commit()
+            row_snapshots.clear()
+            response_cache.clear()
             if not result or "status" not in result:
                 logger.error(f"No status returned from usp_set_submission_period for user {user_id}")
                 raise SubmissionPeriodError("No status returned from stored procedure.")
@@ -61,6 +69,8 @@ class AdminService:
                 cursor.callproc('usp_open_submission_period', (user_id,))
                 result = cursor.fetchone()
             self.db.commit()
+            row_snapshots.clear()
+            response_cache.clear()
             if not result or "status" not in result:
                 logger.error(f"No status returned from usp_open_submission_period for user {user_id}")
                 raise SubmissionPeriodError("No status returned from stored procedure.")
@@ -83,6 +93,16 @@ class AdminService:
         return fetch_data(db=self.db, proc_name="usp_get_okr_master_by_id", params=(okr_master_id,))
     
     def fetch_all_lookup_data(self):
+        return self.fetch_lookup_dataset().data
+
+    def fetch_lookup_dataset(self) -> CachedDataset:
+        return reference_data.get(ADMIN_LOOKUP_DATA, self._query_all_lookup_data)
+
+    def refresh_lookup_data(self):
+        logger.info("Refreshing cached reference data")
+        reference_data.invalidate()
+
+    def _query_all_lookup_data(self):
         logger.info(f"Fetching all lookup data")
         try:
             with self.db.cursor(as_dict=True) as cursor:
@@ -137,6 +157,9 @@ class AdminService:
                 cursor.callproc('usp_upsert_okr_master', params)
                 result = cursor.fetchone()
             self.db.commit()
+            reference_data.invalidate(ADMIN_LOOKUP_DATA)
+            # OKR reads carry master item names and ordering.
+            response_cache.invalidate(TABLE_READERS["okr_details"])
             return result
         except pymssql.Error as ex:
             logger.error(f"Database error while saving OKR item: {ex}")
@@ -2,6 +2,7 @@ import pymssql
 import re
 from typing import Dict, Any
 from helpers import send_email
+from security import issue_session_token
 from config import logger
 from exceptions import EmailNotFoundError, InvalidLoginCodeError, UserNotActiveError
 
@@ -102,12 +103,19 @@ class AuthService:
                     "is_priorities_month": user_data.get('is_priorities_month', False),
                     "permissions": permissions
                 }
+                token, token_expires_at = issue_session_token(
+                    user_id=user_id,
+                    is_admin=user_session_data["is_admin"],
+                    permissions=permissions
+                )
                 logger.info(f"User {user_id} ({email}) successfully logged in. Session data: {user_session_data}")
                 return {
                     "user_id": user_id,
                     "status": "success",
                     "message": f"Welcome, {first_name}!",
-                    "data": user_session_data
+                    "data": user_session_data,
+                    "token": token,
+                    "token_expires_at": token_expires_at
                 }
         except pymssql.Error as ex:
             logger.error(f"Database error in verify_login_and_get_user: {ex}")
@@ -1,8 +1,44 @@
 import pymssql
-from config import logger
-from helpers import fetch_data, update_items_from_xml, execute_proc_for_xml, create_custom_presentation_from_xml
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+from config import settings, logger
+from database import available_connections, get_db_connection, release_connection
+from deck_cache import render_presentation
+from responses import new_spool, spool_bytes
+from xlsx_export import write_xlsx
+from bulk_xml import BulkPayload, BulkUpdateSchema, OKR_DETAILS, COMMENTARY_DETAILS, PRIORITIES, OPS_TRACKER_STATUSES, OPS_OVERDUES
+from cache import fetch_cached, response_cache
+from row_snapshots import row_snapshots
+from write_coalescer import write_coalescer
+from reference_data import reference_data, CachedDataset, PRIORITY_STATUSES
+from helpers import fetch_data, iter_data, update_items_from_xml, update_items_in_batches, execute_proc_for_xml
 
 class ReportingService:
+    # Datasets offered by /export.xlsx: key -> (worksheet title, procedure taking the user id)
+    EXPORT_DATASETS = {
+        "okrs": ("OKRs", "usp_get_okr_details"),
+        "okr_tracker": ("OKR Tracker", "usp_get_okr_tracker_by_user"),
+        "kjops": ("KJ OPS", "usp_get_kjops_by_user"),
+        "commentaries": ("Commentaries", "usp_get_commentary_details"),
+        "priorities": ("Priorities", "usp_get_priorities"),
+        "tracker_statuses": ("Tracker Statuses", "usp_get_ops_tracker_statuses"),
+        "overdues": ("Overdues", "usp_get_ops_overdues"),
+    }
+
+    # Datasets returned together by /bootstrap: key -> fetch(service, user_id)
+    BOOTSTRAP_SECTIONS = {
+        "okrs": lambda service, user_id: service.fetch_okrs(user_id=user_id),
+        "okr_tracker": lambda service, user_id: service.fetch_okr_tracker_by_user(user_id=user_id),
+        "kjops": lambda service, user_id: service.fetch_kjops_by_user(user_id=user_id),
+        "commentaries": lambda service, user_id: service.fetch_commentaries(user_id=user_id),
+        "priorities": lambda service, user_id: service.fetch_priorities(user_id=user_id),
+        "priority_statuses": lambda service, user_id: service.fetch_priority_statuses(),
+        "tracker_statuses": lambda service, user_id: service.fetch_tracker_statuses(user_id=user_id),
+        "overdues": lambda service, user_id: service.fetch_overdues(user_id=user_id),
+    }
+
     def __init__(self, db: pymssql.Connection):
         self.db = db
 
@@ -12,7 +48,7 @@ class ReportingService:
 
     def fetch_okrs(self, user_id: int):
         logger.info(f"Fetching OKRs for user {user_id}")
-        return fetch_data(db=self.db, proc_name="usp_get_okr_details", params=(user_id,))
+        return fetch_cached(db=self.db, proc_name="usp_get_okr_details", params=(user_id,), user_id=user_id)
 
     def fetch_okr_tracker_by_user(self, user_id: int):
         logger.info(f"Fetching OKR tracker for user {user_id}")
@@ -22,56 +58,251 @@ class ReportingService:
         logger.info(f"Fetching KJ OPS for user {user_id}")
         return fetch_data(db=self.db, proc_name="usp_get_kjops_by_user", params=(user_id,))
 
+    def iter_okrs(self, user_id: int):
+        logger.info(f"Streaming OKRs for user {user_id}")
+        return iter_data(db=self.db, proc_name="usp_get_okr_details", params=(user_id,))
+
+    def iter_okr_tracker_by_user(self, user_id: int):
+        logger.info(f"Streaming OKR tracker for user {user_id}")
+        return iter_data(db=self.db, proc_name="usp_get_okr_tracker_by_user", params=(user_id,))
+
+    def iter_kjops_by_user(self, user_id: int):
+        logger.info(f"Streaming KJ OPS for user {user_id}")
+        return iter_data(db=self.db, proc_name="usp_get_kjops_by_user", params=(user_id,))
+
     def fetch_commentaries(self, user_id: int):
         logger.info(f"Fetching commentaries for user {user_id}")
-        return fetch_data(db=self.db, proc_name="usp_get_commentary_details", params=(user_id,))
+        return fetch_cached(db=self.db, proc_name="usp_get_commentary_details", params=(user_id,), user_id=user_id)
 
     def fetch_priorities(self, user_id: int):
         logger.info(f"Fetching priorities for user {user_id}")
-        return fetch_data(db=self.db, proc_name="usp_get_priorities", params=(user_id,))
+        return fetch_cached(db=self.db, proc_name="usp_get_priorities", params=(user_id,), user_id=user_id)
 
     def fetch_priority_statuses(self):
+        return self.fetch_priority_status_dataset().data
+
+    def fetch_priority_status_dataset(self) -> CachedDataset:
+        return reference_data.get(PRIORITY_STATUSES, self._query_priority_statuses)
+
+    def _query_priority_statuses(self):
         logger.info("Fetching priority statuses")
         return fetch_data(db=self.db, proc_name="usp_get_priority_statuses", params=())
 
     def fetch_tracker_statuses(self, user_id: int):
         logger.info(f"Fetching tracker statuses for user {user_id}")
-        return fetch_data(db=self.db, proc_name="usp_get_ops_tracker_statuses", params=(user_id,))
+        return fetch_cached(db=self.db, proc_name="usp_get_ops_tracker_statuses", params=(user_id,), user_id=user_id)
 
     def fetch_overdues(self, user_id: int):
         logger.info(f"Fetching overdues for user {user_id}")
-        return fetch_data(db=self.db, proc_name="usp_get_ops_overdues", params=(user_id,))
+        return fetch_cached(db=self.db, proc_name="usp_get_ops_overdues", params=(user_id,), user_id=user_id)
 
-    def fetch_monthly_presentation(self, user_id: int, business_unit: str = None):
-        logger.info(f"Initiating custom PowerPoint report for user {user_id}" + (f", business_unit={business_unit}" if business_unit else ""))
+    def fetch_bootstrap(self, user_id: int, max_parallel: Optional[int] = None) -> dict:
+        """
+        Every BOOTSTRAP_SECTIONS dataset for the user as {"data": {...}, "errors": {...}}.
+
+        Up to `max_parallel` sections are fetched at a time: one worker uses this service's
+        connection and each of the others takes its own from the pool, working through the
+        remaining sections in turn. Extra workers only use connections that are free right now
+        (at most half of them) and never wait for one, so a busy pool just means fewer workers.
+        A section that fails is reported under "errors" with the rest still returned.
+        """
+        max_parallel = max(1, max_parallel or settings.BOOTSTRAP_MAX_PARALLEL)
+        pending = deque(self.BOOTSTRAP_SECTIONS)
+        lock = threading.Lock()
+        data, errors = {}, {}
+        extra_workers = min(max_parallel, len(pending)) - 1
+        if extra_workers > 0:
+            extra_workers = min(extra_workers, available_connections() // 2)
+        logger.info(f"Fetching bootstrap data for user {user_id} ({extra_workers + 1} parallel)")
+
+        def drain(service: "ReportingService"):
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    name = pending.popleft()
+                try:
+                    rows = self.BOOTSTRAP_SECTIONS[name](service, user_id)
+                except Exception as ex:
+                    logger.error(f"Bootstrap section '{name}' failed for user {user_id}: {ex}")
+                    with lock:
+                        errors[name] = str(ex)
+                else:
+                    with lock:
+                        data[name] = rows
+
+        def drain_pooled():
+            with lock:
+                if not pending:
+                    return
+            try:
+                with get_db_connection(timeout=0) as db:
+                    drain(ReportingService(db=db))
+            except Exception as ex:
+                # Sections this worker didn't start are left for the others.
+                logger.warning(f"Bootstrap worker for user {user_id} stopped: {ex}")
+
+        if extra_workers > 0:
+            executor = ThreadPoolExecutor(max_workers=extra_workers, thread_name_prefix="bootstrap")
+            try:
+                for _ in range(extra_workers):
+                    executor.submit(drain_pooled)
+                drain(self)
+            finally:
+                # Workers that haven't started yet have nothing left to do.
+                executor.shutdown(wait=True, cancel_futures=True)
+        else:
+            drain(self)
+
+        return {
+            "data": {name: data[name] for name in self.BOOTSTRAP_SECTIONS if name in data},
+            "errors": {name: errors[name] for name in self.BOOTSTRAP_SECTIONS if name in errors},
+        }
+
+    def fetch_monthly_report_xml(self, user_id: int, business_unit: str = None) -> str:
         params = (user_id,) if business_unit is None else (user_id, business_unit)
         xml_data = execute_proc_for_xml(
             db=self.db,
             proc_name='usp_generate_monthly_report_xml',
             params=params
         )
-        if not xml_data:
-            xml_data = "<root></root>"
-        return create_custom_presentation_from_xml(xml_string=xml_data)
+        return xml_data or "<root></root>"
+
+    def fetch_monthly_presentation(self, user_id: int, business_unit: str = None):
+        logger.info(f"Initiating custom PowerPoint report for user {user_id}" + (f", business_unit={business_unit}" if business_unit else ""))
+        xml_data = self.fetch_monthly_report_xml(user_id=user_id, business_unit=business_unit)
+        # Rendering only needs the XML: hand the connection back before the (long) render starts.
+        # self.db must not be used after this point.
+        release_connection(self.db)
+        return spool_bytes(render_presentation(xml_data))
     
 
-    def bulk_update_okrs(self, xml_string: str, user_id: int):
+    def export_xlsx(self, user_id: int, datasets: List[str]):
+        """
+        Workbook with one worksheet per dataset, as a rewound spooled file. Rows go straight from
+        the cursor into the sheet, one dataset after the other (pymssql allows one open result).
+        """
+        logger.info(f"Exporting {', '.join(datasets)} to XLSX for user {user_id}")
+        sheets = (
+            (title, iter_data(db=self.db, proc_name=proc_name, params=(user_id,)))
+            for title, proc_name in (self.EXPORT_DATASETS[name] for name in datasets)
+        )
+        xlsx_file = new_spool()
+        try:
+            write_xlsx(xlsx_file, sheets)
+        except Exception:
+            xlsx_file.close()
+            raise
+        # Only the file is needed from here on; self.db must not be used after this point.
+        release_connection(self.db)
+        xlsx_file.seek(0)
+        return xlsx_file
+
+    def _bulk_update(self, schema: BulkUpdateSchema, payload: Union[str, BulkPayload], user_id: int,
+                     batch_size: Optional[int], atomic: bool, delta: bool = False, coalesce: bool = False):
+        if isinstance(payload, str):
+            payload = schema.parse(payload)
+        if coalesce and settings.BULK_COALESCE_ENABLED:
+            return write_coalescer.submit(
+                (user_id, schema.table_name), payload,
+                flush=lambda merged: self._bulk_update(schema, merged, user_id, batch_size, atomic, delta),
+                release=lambda: release_connection(self.db),
+                options=(batch_size, atomic),
+            )
+        submitted = payload
+        delta = delta and settings.BULK_DELTA_ENABLED
+        if delta:
+            payload, skipped, generation = row_snapshots.changes(schema.table_name, user_id, submitted)
+            if skipped and not payload.rows:
+                logger.info(f"Bulk update of '{schema.table_name}': all {skipped} row(s) unchanged, nothing sent")
+                return {
+                    "status": "success",
+                    "message": "Operation successful, but no changes were made to the data.",
+                    "affected_rows": 0,
+                    "commit": "all" if atomic else "batch",
+                    "batches": [],
+                    "changed_rows": 0,
+                    "skipped_rows": skipped
+                }
+
+        batches = payload.batches(batch_size or settings.BULK_UPDATE_BATCH_SIZE)
+        logger.info(f"Bulk update of '{schema.table_name}': {len(payload)} row(s) in {len(batches)} batch(es), commit {'all' if atomic else 'batch'}")
+        try:
+            result = update_items_in_batches(
+                db=self.db, table_name=schema.table_name, batches=batches, user_id=user_id,
+                item_name=schema.item_name, atomic=atomic
+            )
+        except Exception:
+            row_snapshots.invalidate(schema.table_name)
+            raise
+        finally:
+            response_cache.invalidate_table(schema.table_name)
+
+        if not delta:
+            row_snapshots.invalidate(schema.table_name)
+            return result
+        row_snapshots.record(schema.table_name, user_id, submitted, generation)
+        result["changed_rows"] = len(payload)
+        result["skipped_rows"] = skipped
+        return result
+
+    def bulk_update_okrs(self, payload: Union[str, BulkPayload], user_id: int, batch_size: Optional[int] = None, atomic: bool = True):
         logger.info(f"Bulk updating OKRs for user {user_id}")
-        return update_items_from_xml(db=self.db, table_name="okr_details", xml_string=xml_string, user_id=user_id, item_name="OKRs")
+        return self._bulk_update(OKR_DETAILS, payload, user_id, batch_size, atomic, delta=True)
 
-    def bulk_update_commentaries(self, xml_string: str, user_id: int):
+    def bulk_update_commentaries(self, payload: Union[str, BulkPayload], user_id: int, batch_size: Optional[int] = None, atomic: bool = True):
         logger.info(f"Bulk updating commentaries for user {user_id}")
-        return update_items_from_xml(db=self.db, table_name="commentary_details", xml_string=xml_string, user_id=user_id, item_name="KJ OPS")
+        return self._bulk_update(COMMENTARY_DETAILS, payload, user_id, batch_size, atomic, delta=True)
 
-    def bulk_update_priorities(self, xml_string: str, user_id: int):
+    def bulk_update_priorities(self, payload: Union[str, BulkPayload], user_id: int, batch_size: Optional[int] = None, atomic: bool = True, coalesce: bool = False):
         logger.info(f"Bulk updating priorities for user {user_id}")
-        return update_items_from_xml(db=self.db, table_name="priorities", xml_string=xml_string, user_id=user_id, item_name="Priorities")
+        return self._bulk_update(PRIORITIES, payload, user_id, batch_size, atomic, coalesce=coalesce)
 
-    def bulk_update_tracker_statuses(self, xml_string: str, user_id: int):
+    def bulk_update_tracker_statuses(self, payload: Union[str, BulkPayload], user_id: int, batch_size: Optional[int] = None, atomic: bool = True, coalesce: bool = False):
         logger.info(f"Bulk updating tracker statuses for user {user_id}")
-        return update_items_from_xml(db=self.db, table_name="ops_tracker_statuses", xml_string=xml_string, user_id=user_id, item_name="Tracker Statuses")
+        return self._bulk_update(OPS_TRACKER_STATUSES, payload, user_id, batch_size, atomic, coalesce=coalesce)
 
-    def bulk_update_overdues(self, xml_string: str, user_id: int):
+    def bulk_update_overdues(self, payload: Union[str, BulkPayload], user_id: int, batch_size: Optional[int] = None, atomic: bool = True):
         logger.info(f"Bulk updating overdues for user {user_id}")
+        return self._bulk_update(OPS_OVERDUES, payload, user_id, batch_size, atomic)
+
+    def save_submission(self, sections: Dict[str, BulkPayload], user_id: int):
+        """
+        Apply several bulk-update sections (see bulk_xml.SUBMISSION_SECTIONS) in one transaction
+        on this service's connection: every section is written, or none is.
+        """
+        logger.info(f"Saving submission for user {user_id}: {', '.join(sections)}")
+        affected = {}
+        section = None
+        try:
+            for section, payload in sections.items():
+                schema = payload.schema
+                result = update_items_from_xml(
+                    db=self.db, table_name=schema.table_name, xml_string=payload.to_xml(), user_id=user_id,
+                    item_name=schema.item_name, commit=False
+                )
+                affected[section] = result["affected_rows"]
+            self.db.commit()
+        except Exception:
+            logger.error(f"Submission for user {user_id} failed in section '{section}'; rolling back")
+            try:
+                self.db.rollback()
+            except Exception as rollback_error:
+                logger.error(f"Rollback of submission for user {user_id} failed: {rollback_error}")
+            raise
+        finally:
+            for payload in sections.values():
+                response_cache.invalidate_table(payload.schema.table_name)
+                row_snapshots.invalidate(payload.schema.table_name)
 
-        return update_items_from_xml(db=self.db, table_name="ops_overdues", xml_string=xml_string, user_id=user_id, item_name="Overdues")
+        affected_rows = sum(affected.values())
+        if affected_rows > 0:
+            message = f"Submission saved. {affected_rows} row(s) were updated."
+        else:
+            message = "Operation successful, but no changes were made to the data."
+        return {
+            "status": "success",
+            "message": message,
+            "affected_rows": affected_rows,
+            "sections": affected
+        }
@@ -0,0 +1,52 @@
+import threading
+from typing import Callable, List
+
+from config import settings
+from metrics import CallbackMetric
+
+
+class TempFileBudget:
+    """
+    Bytes this process keeps in local temporary files, by owner ("deck", "spools", "report_jobs").
+
+    On App Engine the temp directory is an in-memory filesystem, so these files count against the
+    instance's memory. Owners that can drop files (the deck cache) register a `reclaim` callback
+    and evict down to room_for(); the others just report what they hold and trigger a reclaim
+    when the total goes over `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._held = {}
+        self._reclaimers: List[Callable[[], object]] = []
+
+    def on_pressure(self, reclaim: Callable[[], object]):
+        with self._lock:
+            self._reclaimers.append(reclaim)
+
+    def set(self, owner: str, nbytes: int):
+        with self._lock:
+            self._held[owner] = nbytes
+
+    def add(self, owner: str, nbytes: int):
+        with self._lock:
+            self._held[owner] = self._held.get(owner, 0) + nbytes
+            over = nbytes > 0 and sum(self._held.values()) > self.max_bytes
+            reclaimers = list(self._reclaimers) if over else []
+        for reclaim in reclaimers:
+            reclaim()
+
+    def room_for(self, owner: str) -> int:
+        """Bytes `owner` may hold given what everyone else holds right now."""
+        with self._lock:
+            return self.max_bytes - sum(nbytes for name, nbytes in self._held.items() if name != owner)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self._held, total=sum(self._held.values()), max_bytes=self.max_bytes)
+
+
+temp_files = TempFileBudget(max_bytes=settings.TEMP_FILES_MAX_BYTES)
+
+CallbackMetric("bu_temp_file_bytes", "Bytes held in local temporary files (deck cache, spooled downloads, report jobs).", lambda: temp_files.get_stats()["total"])
@@ -62,4 +62,40 @@ def test_close_submission_period_service():
 
 def test_get_okr_submissions():
     response = client.get(f"{settings.API_V1_PREFIX}/admin/okrs-submissions", headers={"X-User-ID": "1"})
-    assert response.status_code in [200, 400, 500]
\ No newline at end of file
+    assert response.status_code in [200, 400, 500]
+
+def test_lookup_data_is_cached_and_revalidated_with_etag(monkeypatch):
+    from services.admin_service import AdminService
+    from reference_data import reference_data
+    reference_data.invalidate()
+    loads = []
+    def fake_query(self):
+        loads.append(1)
+        return {"business_units": [{"id": 1, "name": "BU"}]}
+    monkeypatch.setattr(AdminService, "_query_all_lookup_data", fake_query)
+
+    first = client.get(f"{settings.API_V1_PREFIX}/admin/lookup-data", headers={"X-User-ID": "1"})
+    assert first.status_code == 200
+    assert first.json() == {"business_units": [{"id": 1, "name": "BU"}]}
+    etag = first.headers["ETag"]
+
+    second = client.get(f"{settings.API_V1_PREFIX}/admin/lookup-data", headers={"X-User-ID": "1", "If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+    assert len(loads) == 1
+
+def test_upsert_okr_master_item_invalidates_lookup_data(monkeypatch):
+    from datetime import datetime
+    from services.admin_service import AdminService
+    from schemas import OkrMasterItem
+    from reference_data import reference_data
+    reference_data.invalidate()
+    loads = []
+    monkeypatch.setattr(AdminService, "_query_all_lookup_data", lambda self: loads.append(1) or {"n": len(loads)})
+    service = AdminService(db=MagicMock())
+
+    assert service.fetch_all_lookup_data() == {"n": 1}
+    assert service.fetch_all_lookup_data() == {"n": 1}
+    item = OkrMasterItem(bu_id=1, value_driver_id=1, sub_value_driver_id=1, name="Revenue", start_date=datetime(2025, 1, 1))
+    service.upsert_okr_master_item(item=item, user_id=1)
+    assert service.fetch_all_lookup_data() == {"n": 2}
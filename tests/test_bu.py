@@ -78,3 +78,152 @@ def test_get_commentaries_missing_header():
     response = client.get(f"{settings.API_V1_PREFIX}/commentaries")
     assert response.status_code == 400
     assert "X-User-ID" in response.json()["detail"]
+
+class StreamingCursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+    def __enter__(self):
+        return self
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+    def callproc(self, proc, args):
+        pass
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+def fake_connection_with_rows(monkeypatch, rows, released):
+    import responses
+
+    conn = MagicMock()
+    conn.cursor.side_effect = lambda as_dict=False: StreamingCursor(rows)
+
+    def fake_get_db():
+        yield conn
+        released.append(conn)
+
+    def second_connection():
+        raise AssertionError("streamed responses must use the request's own connection")
+
+    monkeypatch.setitem(app.dependency_overrides, get_db, fake_get_db)
+    monkeypatch.setattr(responses, "get_db_connection", second_connection)
+
+def test_get_okrs_streamed_as_json_array(monkeypatch):
+    from datetime import datetime
+    from decimal import Decimal
+    released = []
+    rows = [{"id": i, "value": Decimal("1.5"), "updated": datetime(2025, 9, 1)} for i in range(1200)]
+    fake_connection_with_rows(monkeypatch, rows, released)
+
+    response = client.get(f"{settings.API_V1_PREFIX}/okrs?stream=json", headers={"X-User-ID": "1"})
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body) == 1200
+    assert body[0] == {"id": 0, "value": 1.5, "updated": "2025-09-01T00:00:00"}
+    assert len(released) == 1
+
+def test_get_kjops_streamed_as_ndjson(monkeypatch):
+    import json
+    released = []
+    fake_connection_with_rows(monkeypatch, [{"id": 1}, {"id": 2}], released)
+
+    response = client.get(f"{settings.API_V1_PREFIX}/kjops?stream=ndjson", headers={"X-User-ID": "1"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in response.text.splitlines()] == [{"id": 1}, {"id": 2}]
+
+def test_get_okrs_streamed_empty_result(monkeypatch):
+    fake_connection_with_rows(monkeypatch, [], [])
+    response = client.get(f"{settings.API_V1_PREFIX}/okrs/tracker?stream=json", headers={"X-User-ID": "1"})
+    assert response.status_code == 200
+    assert response.json() == []
+
+def test_get_okrs_invalid_stream_format():
+    response = client.get(f"{settings.API_V1_PREFIX}/okrs?stream=csv", headers={"X-User-ID": "1"})
+    assert response.status_code == 422
+
+def test_get_overdues_returns_304_when_etag_matches(monkeypatch):
+    from services.bu_service import ReportingService
+    rows = [{"id": 1, "action": "Follow up"}]
+    monkeypatch.setattr(ReportingService, "fetch_overdues", lambda self, user_id: rows)
+
+    first = client.get(f"{settings.API_V1_PREFIX}/overdues", headers={"X-User-ID": "1"})
+    assert first.status_code == 200
+    assert first.json() == rows
+    etag = first.headers["ETag"]
+
+    second = client.get(f"{settings.API_V1_PREFIX}/overdues", headers={"X-User-ID": "1", "If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+
+    rows.append({"id": 2, "action": "Escalate"})
+    third = client.get(f"{settings.API_V1_PREFIX}/overdues", headers={"X-User-ID": "1", "If-None-Match": etag})
+    assert third.status_code == 200
+    assert third.headers["ETag"] != etag
+
+def fake_bootstrap_sections(monkeypatch, failing=(), free_connections=10):
+    import threading
+    import time
+    from contextlib import contextmanager
+    import services.bu_service as bu_service
+    from services.bu_service import ReportingService
+
+    state = {"active": 0, "peak": 0, "checkouts": 0, "connections": set()}
+    lock = threading.Lock()
+
+    @contextmanager
+    def fake_get_db_connection(timeout=None):
+        assert timeout == 0
+        with lock:
+            state["checkouts"] += 1
+        yield MagicMock()
+
+    def fetch(name):
+        def method(self, user_id=None):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+                state["connections"].add(id(self.db))
+            time.sleep(0.05)
+            with lock:
+                state["active"] -= 1
+            if name in failing:
+                raise RuntimeError(f"{name} timed out")
+            return [{"section": name, "user_id": user_id}]
+        return method
+
+    monkeypatch.setattr(bu_service, "get_db_connection", fake_get_db_connection)
+    monkeypatch.setattr(bu_service, "available_connections", lambda: free_connections)
+    for name in ("fetch_okrs", "fetch_okr_tracker_by_user", "fetch_kjops_by_user", "fetch_commentaries", "fetch_priorities",
+                 "fetch_priority_statuses", "fetch_tracker_statuses", "fetch_overdues"):
+        monkeypatch.setattr(ReportingService, name, fetch(name))
+    return state
+
+def test_bootstrap_fetches_sections_concurrently_within_the_cap(monkeypatch):
+    from services.bu_service import ReportingService
+    state = fake_bootstrap_sections(monkeypatch)
+
+    payload = ReportingService(db=MagicMock()).fetch_bootstrap(user_id=3, max_parallel=3)
+    assert list(payload["data"]) == list(ReportingService.BOOTSTRAP_SECTIONS) and payload["errors"] == {}
+    assert payload["data"]["okrs"] == [{"section": "fetch_okrs", "user_id": 3}]
+    assert state["peak"] == 3 and state["checkouts"] == 2 and len(state["connections"]) == 3
+
+def test_bootstrap_returns_partial_results_with_section_errors(monkeypatch):
+    state = fake_bootstrap_sections(monkeypatch, failing=("fetch_kjops_by_user",))
+
+    response = client.get(f"{settings.API_V1_PREFIX}/bootstrap", headers={"X-User-ID": "1"})
+    assert response.status_code == 200 and response.headers["ETag"]
+    body = response.json()
+    assert body["errors"] == {"kjops": "fetch_kjops_by_user timed out"}
+    assert "kjops" not in body["data"] and len(body["data"]) == 7
+    assert state["peak"] <= settings.BOOTSTRAP_MAX_PARALLEL
+
+def test_bootstrap_uses_only_free_connections(monkeypatch):
+    from services.bu_service import ReportingService
+    state = fake_bootstrap_sections(monkeypatch, free_connections=3)
+    ReportingService(db=MagicMock()).fetch_bootstrap(user_id=3, max_parallel=8)
+    assert state["checkouts"] == 1 and state["peak"] == 2
+
+    state = fake_bootstrap_sections(monkeypatch, free_connections=0)
+    payload = ReportingService(db=MagicMock()).fetch_bootstrap(user_id=3, max_parallel=8)
+    assert state["checkouts"] == 0 and len(payload["data"]) == 8
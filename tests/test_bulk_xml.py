@@ -0,0 +1,238 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from unittest.mock import MagicMock
+from fastapi.testclient import TestClient
+
+from bulk_xml import PRIORITIES, BulkUpdateSchema, SubmissionValidator
+from config import settings
+from database import get_db
+from exceptions import BulkUpdateError, BulkXmlError
+from main import app
+from helpers import update_items_in_batches
+from services.bu_service import ReportingService
+
+checkouts = []
+
+def override_get_db():
+    checkouts.append(1)
+    yield MagicMock()
+
+app.dependency_overrides[get_db] = override_get_db
+client = TestClient(app)
+
+
+# A table whose usp_bulk_update contract has been declared in full.
+DECLARED = BulkUpdateSchema("priorities", "Priorities", key_fields=("id",), root="root", row="row")
+
+def validate(xml: str, chunk_size: int = 7, schema: BulkUpdateSchema = PRIORITIES) -> int:
+    validator = schema.validator()
+    data = xml.encode()
+    for start in range(0, len(data), chunk_size):
+        validator.feed(data[start:start + chunk_size])
+    return validator.close()
+
+def rejected(xml: str, schema: BulkUpdateSchema = PRIORITIES) -> BulkXmlError:
+    with pytest.raises(BulkXmlError) as info:
+        validate(xml, schema=schema)
+    return info.value
+
+
+def test_attribute_and_element_rows_are_accepted():
+    xml = ("<?xml version='1.0' encoding='utf-8'?>\n<root>\n"
+           "  <row id='1' status='On track'/>\n"
+           "  <row><id>2</id><comment>Ünïcode &amp; escapes</comment><due/></row>\n</root>")
+    assert validate(xml, chunk_size=1, schema=DECLARED) == 2
+    assert validate("<root></root>", schema=DECLARED) == 0
+
+def test_undeclared_layout_is_only_checked_for_well_formedness_and_size():
+    xml = "<rows xmlns:x='urn:x' v='1'><item><a><b>bold</b> text</a></item><item x:id='2'/></rows>"
+    assert validate(xml, chunk_size=3) == 2
+    payload = PRIORITIES.parse(xml)
+    # Rows are re-serialised on their own, so each repeats the namespaces in scope.
+    assert payload.batches(1) == [
+        ('<rows xmlns:x="urn:x" v="1"><item xmlns:x="urn:x"><a><b>bold</b> text</a></item></rows>', 1),
+        ('<rows xmlns:x="urn:x" v="1"><item xmlns:x="urn:x" x:id="2"/></rows>', 1),
+    ]
+    assert PRIORITIES.parse("<rows/>").to_xml() == "<rows/>"
+
+@pytest.mark.parametrize("xml, status, message", [
+    ("<root><row id='1'></root>", 400, "Malformed"),
+    ("<!DOCTYPE root [<!ENTITY x 'y'>]><root><row id='&x;'/></root>", 400, "DOCTYPE"),
+    ("<root>text<row id='1'/></root>", 422, "Unexpected text"),
+])
+def test_every_payload_must_be_well_formed(xml, status, message):
+    error = rejected(xml)
+    assert error.status_code == status
+    assert message in str(error)
+
+@pytest.mark.parametrize("xml, status, message", [
+    ("<rows><row id='1'/></rows>", 422, "Root element"),
+    ("<root><item id='1'/></root>", 422, "expected <row>"),
+    ("<root>text<row id='1'/></root>", 422, "Unexpected text"),
+    ("<root><row/></root>", 422, "Empty <row>"),
+    ("<root><row id='1'><id>1</id></row></root>", 422, "more than once"),
+    ("<root><row><comment><b>bold</b></comment></row></root>", 422, "text only"),
+    ("<root><row><x-y>1</x-y></row></root>", 422, "not a valid field name"),
+    ("<root><row status='Open'/></root>", 422, "missing its key field 'id'"),
+])
+def test_declared_layout_errors_are_precise(xml, status, message):
+    error = rejected(xml, schema=DECLARED)
+    assert error.status_code == status
+    assert message in str(error)
+
+def test_limits(monkeypatch):
+    monkeypatch.setattr(settings, "BULK_UPDATE_MAX_ROWS", 2)
+    monkeypatch.setattr(settings, "BULK_UPDATE_MAX_VALUE_LENGTH", 5)
+    assert rejected("<root><row id='1'/><row id='2'/><row id='3'/></root>").status_code == 413
+    assert "longer than 5" in str(rejected("<root><row id='123456'/></root>"))
+    assert "longer than 5" in str(rejected("<root><row><a><b>123456</b></a></row></root>"))
+    assert "longer than 5" in str(rejected("<root><row id='123456'/></root>", schema=DECLARED))
+
+def test_configured_fields_are_enforced(monkeypatch):
+    monkeypatch.setattr(settings, "BULK_UPDATE_FIELDS", {"priorities": ["id", "status"]})
+    assert validate("<root><row id='1' status='Open'/></root>") == 1
+    assert "Unknown field 'owner'" in str(rejected("<root><row id='1' owner='me'/></root>"))
+    # A declared key column stays allowed even when the override leaves it out.
+    monkeypatch.setattr(settings, "BULK_UPDATE_FIELDS", {"priorities": ["status"]})
+    assert validate("<root><row id='1' status='Open'/></root>", schema=DECLARED) == 1
+    assert "Unknown field 'id'" in str(rejected("<root><row id='1' status='Open'/></root>"))
+
+def test_invalid_payload_is_rejected_before_a_connection_is_taken(monkeypatch):
+    called = []
+    monkeypatch.setattr(ReportingService, "bulk_update_priorities", lambda self, payload, user_id, **kwargs: called.append(payload.to_xml()) or {})
+    monkeypatch.setitem(app.dependency_overrides, get_db, override_get_db)
+    monkeypatch.setattr(settings, "BULK_UPDATE_FIELDS", {"priorities": ["id", "status"]})
+    checkouts.clear()
+
+    response = client.put(f"{settings.API_V1_PREFIX}/priorities/bulk-update", content="<root><item/></root>", headers={"X-User-ID": "1"})
+    assert response.status_code == 422
+    assert "Invalid Priorities payload" in response.json()["detail"]
+    monkeypatch.setattr(settings, "BULK_UPDATE_MAX_BYTES", 100)
+    response = client.put(f"{settings.API_V1_PREFIX}/priorities/bulk-update", content="<root>" + "<row id='1'/>" * 20 + "</root>", headers={"X-User-ID": "1"})
+    assert response.status_code == 413
+    assert checkouts == [] and called == []
+
+    response = client.put(f"{settings.API_V1_PREFIX}/priorities/bulk-update", content="<root><row id='1'/></root>", headers={"X-User-ID": "1"})
+    assert response.status_code == 200
+    assert called == ['<root><row id="1"/></root>'] and len(checkouts) == 1
+
+def test_payload_keeps_rows_and_splits_into_batches():
+    validator = PRIORITIES.validator()
+    validator.feed(b"<root>\n  <row id='1' status='a &amp; b'/>\n  <row><id>2</id><note/></row>\n  <row id='3'/>\n</root>")
+    validator.close()
+    payload = validator.payload()
+
+    assert [row.fields for row in payload.rows] == [{"id": "1", "status": "a & b"}, {"id": "2", "note": None}, {"id": "3"}]
+    assert payload.batches(2) == [
+        ('<root><row id="1" status="a &amp; b"/><row><id>2</id><note/></row></root>', 2),
+        ('<root><row id="3"/></root>', 1),
+    ]
+    assert payload.batches() == payload.batches(3) == [(payload.to_xml(), 3)]
+    assert PRIORITIES.parse("<root/>").batches(10) == [("<root/>", 0)]
+
+def batch_db(affected, fail_at=None):
+    db = MagicMock()
+    cursor = db.cursor.return_value.__enter__.return_value
+    calls = []
+    def execute(sql, params):
+        calls.append(params[1])
+        if len(calls) == fail_at:
+            raise RuntimeError("deadlock victim")
+    cursor.execute.side_effect = execute
+    cursor.fetchone.side_effect = [(count,) for count in affected]
+    return db, calls
+
+def test_batches_commit_together_or_one_by_one():
+    batches = [("<root><row a='1'/></root>", 1), ("<root><row a='2'/><row a='3'/></root>", 2)]
+
+    db, calls = batch_db([1, 2])
+    result = update_items_in_batches(db, "priorities", batches, 1, "Priorities", atomic=True)
+    assert calls == [xml for xml, _ in batches] and db.commit.call_count == 1
+    assert result["affected_rows"] == 3 and result["commit"] == "all"
+    assert result["batches"] == [{"batch": 1, "rows": 1, "affected_rows": 1}, {"batch": 2, "rows": 2, "affected_rows": 2}]
+
+    db, calls = batch_db([1, 2])
+    assert update_items_in_batches(db, "priorities", batches, 1, "Priorities", atomic=False)["commit"] == "batch"
+    assert db.commit.call_count == 2
+
+def test_failed_batch_reports_what_stays_committed():
+    batches = [("<root><row a='1'/></root>", 1), ("<root><row a='2'/></root>", 1), ("<root><row a='3'/></root>", 1)]
+
+    db, _ = batch_db([1, 1], fail_at=2)
+    with pytest.raises(BulkUpdateError) as info:
+        update_items_in_batches(db, "priorities", batches, 1, "Priorities", atomic=True)
+    assert info.value.failed_batch == 2 and info.value.committed == []
+    assert db.commit.call_count == 0 and db.rollback.call_count == 1
+
+    db, _ = batch_db([1, 1], fail_at=2)
+    with pytest.raises(BulkUpdateError) as info:
+        update_items_in_batches(db, "priorities", batches, 1, "Priorities", atomic=False)
+    assert info.value.committed == [{"batch": 1, "rows": 1, "affected_rows": 1}]
+    assert db.commit.call_count == 1 and db.rollback.call_count == 1
+
+def test_bulk_update_route_runs_batches_on_one_connection(monkeypatch):
+    db, calls = batch_db([1, 1, 1])
+    monkeypatch.setitem(app.dependency_overrides, get_db, lambda: db)
+    xml = "<root>" + "".join(f"<row id='{i}'/>" for i in range(5)) + "</root>"
+
+    response = client.put(f"{settings.API_V1_PREFIX}/priorities/bulk-update?batch_size=2&commit=batch", content=xml, headers={"X-User-ID": "1"})
+    assert response.status_code == 200
+    body = response.json()
+    assert [batch["rows"] for batch in body["batches"]] == [2, 2, 1] and body["affected_rows"] == 3
+    assert len(calls) == 3 and db.commit.call_count == 3
+
+    db, calls = batch_db([1], fail_at=1)
+    monkeypatch.setitem(app.dependency_overrides, get_db, lambda: db)
+    response = client.put(f"{settings.API_V1_PREFIX}/priorities/bulk-update", content=xml, headers={"X-User-ID": "1"})
+    assert response.status_code == 500
+    assert response.json()["detail"]["failed_batch"] == 1
+
+def validate_submission(xml: str, chunk_size: int = 7):
+    validator = SubmissionValidator()
+    data = xml.encode()
+    for start in range(0, len(data), chunk_size):
+        validator.feed(data[start:start + chunk_size])
+    validator.close()
+    return validator.payloads()
+
+def test_submission_sections_are_parsed_in_apply_order():
+    payloads = validate_submission(
+        "<submission>\n <overdues><row id='9' note='late'/></overdues>\n"
+        " <okrs><row id='1' status='On track'/><row><id>2</id><status>Done</status></row></okrs>\n</submission>"
+    )
+    assert list(payloads) == ["okrs", "overdues"]
+    assert payloads["okrs"].schema.table_name == "okr_details" and len(payloads["okrs"]) == 2
+    assert payloads["overdues"].to_xml() == '<root><row id="9" note="late"/></root>'
+
+@pytest.mark.parametrize("xml, message", [
+    ("<submission/>", "needs at least one of"),
+    ("<submission><budgets><row id='1'/></budgets></submission>", "Unknown section <budgets>"),
+    ("<submission><okrs><row id='1'/></okrs><okrs><row id='2'/></okrs></submission>", "appears more than once"),
+    ("<submission><okrs id='1'/></submission>", "takes no attributes"),
+    ("<submission>text<okrs><row id='1'/></okrs></submission>", "Unexpected text in <submission>"),
+    ("<root><okrs><row id='1'/></okrs></root>", "Root element must be <submission>"),
+])
+def test_submission_structure_errors(xml, message):
+    with pytest.raises(BulkXmlError) as info:
+        validate_submission(xml)
+    assert info.value.status_code == 422 and message in str(info.value)
+
+def test_submission_is_saved_in_one_transaction(monkeypatch):
+    db, calls = batch_db([2, 1])
+    monkeypatch.setitem(app.dependency_overrides, get_db, lambda: db)
+    xml = "<submission><priorities><row id='3'/></priorities><okrs><row id='1'/><row id='2'/></okrs></submission>"
+
+    response = client.put(f"{settings.API_V1_PREFIX}/submission", content=xml, headers={"X-User-ID": "1"})
+    assert response.status_code == 200
+    assert response.json()["sections"] == {"okrs": 2, "priorities": 1} and response.json()["affected_rows"] == 3
+    assert calls == ['<root><row id="1"/><row id="2"/></root>', '<root><row id="3"/></root>']
+    assert db.commit.call_count == 1
+
+    db, calls = batch_db([2], fail_at=2)
+    monkeypatch.setitem(app.dependency_overrides, get_db, lambda: db)
+    response = client.put(f"{settings.API_V1_PREFIX}/submission", content=xml, headers={"X-User-ID": "1"})
+    assert response.status_code == 500
+    assert db.commit.call_count == 0 and db.rollback.call_count == 1
@@ -0,0 +1,101 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+from unittest.mock import MagicMock
+import pytest
+from cache import ResponseCache, response_cache
+from services.bu_service import ReportingService
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    response_cache.clear()
+    yield
+    response_cache.clear()
+
+
+def test_get_or_load_caches_until_ttl_expires():
+    cache = ResponseCache(max_rows=100, ttls={"usp_a": 0.05}, default_ttl=30)
+    load = MagicMock(return_value=[{"id": 1}])
+    assert cache.get_or_load("usp_a", 1, (1,), load) == [{"id": 1}]
+    assert cache.get_or_load("usp_a", 1, (1,), load) == [{"id": 1}]
+    assert load.call_count == 1
+    time.sleep(0.06)
+    cache.get_or_load("usp_a", 1, (1,), load)
+    assert load.call_count == 2
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["misses"] == 2
+
+def test_cache_is_bounded_by_rows_and_evicts_least_recently_used():
+    cache = ResponseCache(max_rows=10, ttls={}, default_ttl=30)
+    cache.get_or_load("usp_a", 1, (1,), lambda: [{}] * 4)
+    cache.get_or_load("usp_a", 2, (2,), lambda: [{}] * 4)
+    cache.get_or_load("usp_a", 1, (1,), lambda: pytest.fail("should be cached"))
+    cache.get_or_load("usp_a", 3, (3,), lambda: [{}] * 4)
+    stats = cache.get_stats()
+    assert stats["rows"] == 8
+    assert stats["entries"] == 2
+    reloaded = MagicMock(return_value=[])
+    cache.get_or_load("usp_a", 2, (2,), reloaded)
+    assert reloaded.called
+
+def test_invalidate_table_only_drops_readers_of_that_table():
+    cache = ResponseCache(max_rows=100, ttls={}, default_ttl=30)
+    cache.get_or_load("usp_get_priorities", 1, (1,), lambda: [{}])
+    cache.get_or_load("usp_get_priorities", 2, (2,), lambda: [{}])
+    cache.get_or_load("usp_get_ops_overdues", 1, (1,), lambda: [{}])
+    assert cache.invalidate_table("priorities") == 2
+    assert cache.get_stats()["entries"] == 1
+
+def test_load_overlapping_an_invalidation_is_not_stored():
+    cache = ResponseCache(max_rows=100, ttls={}, default_ttl=30)
+
+    def load_during_write():
+        cache.invalidate_table("priorities")
+        return [{"status": "before the write"}]
+
+    assert cache.get_or_load("usp_get_priorities", 1, (1,), load_during_write) == [{"status": "before the write"}]
+    assert cache.get_or_load("usp_get_priorities", 1, (1,), lambda: [{"status": "after"}]) == [{"status": "after"}]
+    assert cache.get_or_load("usp_get_priorities", 1, (1,), lambda: pytest.fail("should be cached")) == [{"status": "after"}]
+
+def test_bulk_update_invalidates_cached_reads():
+    db = MagicMock()
+    db.cursor.return_value.__enter__.return_value.fetchall.return_value = [{"id": 1}]
+    db.cursor.return_value.__enter__.return_value.fetchone.return_value = (1,)
+    service = ReportingService(db=db)
+
+    service.fetch_commentaries(user_id=7)
+    service.fetch_commentaries(user_id=7)
+    assert db.cursor.return_value.__enter__.return_value.callproc.call_count == 1
+
+    service.bulk_update_commentaries(payload="<root/>", user_id=7)
+    service.fetch_commentaries(user_id=7)
+    assert db.cursor.return_value.__enter__.return_value.callproc.call_count == 2
+
+def test_admin_writes_reach_cached_reads_at_once():
+    from datetime import datetime
+    from schemas import OkrMasterItem
+    from services.admin_service import AdminService
+    db = MagicMock()
+    cursor = db.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = [{"id": 1}]
+    cursor.fetchone.return_value = {"status": "ok"}
+    service, admin = ReportingService(db=db), AdminService(db=db)
+
+    service.fetch_priorities(user_id=7)
+    service.fetch_okrs(user_id=7)
+    calls = cursor.callproc.call_count
+    admin.set_submission_period(year=2025, month=6, user_id=1)
+    service.fetch_priorities(user_id=7)
+    assert cursor.callproc.call_count == calls + 2
+
+    service.fetch_priorities(user_id=7)
+    service.fetch_okrs(user_id=7)
+    calls = cursor.callproc.call_count
+    item = OkrMasterItem(bu_id=1, value_driver_id=1, sub_value_driver_id=1, name="Revenue", start_date=datetime(2025, 1, 1))
+    admin.upsert_okr_master_item(item=item, user_id=1)
+    service.fetch_okrs(user_id=7)
+    service.fetch_priorities(user_id=7)
+    assert cursor.callproc.call_count == calls + 2
@@ -0,0 +1,125 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import gzip
+import pytest
+from unittest.mock import MagicMock
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+from starlette.responses import StreamingResponse
+
+from compression import BoundedGunzip, CompressionMiddleware
+from config import settings
+from database import get_db
+from main import app
+from services.bu_service import ReportingService
+
+
+def override_get_db():
+    yield MagicMock()
+
+app.dependency_overrides[get_db] = override_get_db
+client = TestClient(app)
+
+
+def make_app():
+    small_app = FastAPI()
+    small_app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @small_app.get("/large")
+    def large():
+        return PlainTextResponse("x" * 5000, headers={"ETag": '"abc"'})
+
+    @small_app.get("/small")
+    def small():
+        return PlainTextResponse("tiny")
+
+    @small_app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b"a" * 1000, b"b" * 1000]), media_type="application/x-ndjson")
+
+    @small_app.get("/deck")
+    def deck():
+        return PlainTextResponse("x" * 5000, media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation")
+
+    return TestClient(small_app)
+
+
+def test_large_response_is_gzipped_with_weak_etag():
+    response = make_app().get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == 'W/"abc"'
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.text == "x" * 5000
+
+def test_brotli_is_preferred_when_accepted():
+    pytest.importorskip("brotli")
+    response = make_app().get("/large", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.text == "x" * 5000
+
+def test_small_and_precompressed_responses_are_untouched():
+    client_ = make_app()
+    assert "content-encoding" not in client_.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client_.get("/deck", headers={"Accept-Encoding": "gzip"}).headers
+
+def test_streamed_response_is_compressed_incrementally():
+    response = make_app().get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == "a" * 1000 + "b" * 1000
+
+def test_bounded_gunzip_rejects_oversized_output():
+    decoder = BoundedGunzip(max_size=1000)
+    with pytest.raises(OverflowError):
+        decoder.feed(gzip.compress(b"0" * 100_000))
+
+def test_bounded_gunzip_rejects_truncated_stream():
+    decoder = BoundedGunzip(max_size=1000)
+    data = gzip.compress(b"hello world")
+    decoder.feed(data[:-6])
+    with pytest.raises(ValueError):
+        decoder.finish()
+
+def test_bulk_update_accepts_gzip_body(monkeypatch):
+    received = {}
+    def fake_bulk_update(self, payload, user_id, **kwargs):
+        received["xml"] = payload.to_xml()
+        return {"status": "success", "affected_rows": 1}
+    monkeypatch.setattr(ReportingService, "bulk_update_priorities", fake_bulk_update)
+
+    xml = "<root>" + "<row id=\"1\" status=\"On track\"/>" * 200 + "</root>"
+    response = client.put(
+        f"{settings.API_V1_PREFIX}/priorities/bulk-update",
+        content=gzip.compress(xml.encode()),
+        headers={"X-User-ID": "1", "Content-Encoding": "gzip"},
+    )
+    assert response.status_code == 200
+    assert received["xml"] == xml
+
+def test_bulk_update_rejects_decompression_bomb(monkeypatch):
+    monkeypatch.setattr(settings, "REQUEST_MAX_BODY_BYTES", 10_000)
+    response = client.put(
+        f"{settings.API_V1_PREFIX}/priorities/bulk-update",
+        content=gzip.compress(b" " * 1_000_000),
+        headers={"X-User-ID": "1", "Content-Encoding": "gzip"},
+    )
+    assert response.status_code == 413
+
+def test_bulk_update_rejects_corrupt_gzip():
+    response = client.put(
+        f"{settings.API_V1_PREFIX}/priorities/bulk-update",
+        content=b"definitely not gzip",
+        headers={"X-User-ID": "1", "Content-Encoding": "gzip"},
+    )
+    assert response.status_code == 400
+
+def test_bulk_update_rejects_unknown_encoding():
+    response = client.put(
+        f"{settings.API_V1_PREFIX}/priorities/bulk-update",
+        content=b"<root/>",
+        headers={"X-User-ID": "1", "Content-Encoding": "zstd"},
+    )
+    assert response.status_code == 415
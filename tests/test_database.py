@@ -0,0 +1,244 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import threading
+import time
+import pymssql
+import pytest
+import database
+from config import settings
+from exceptions import PoolTimeoutError
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+    def __enter__(self):
+        return self
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+    def execute(self, sql, params=None):
+        self.conn.probes += 1
+        if self.conn.broken:
+            raise pymssql.OperationalError("connection lost")
+    def fetchone(self):
+        return (1,)
+
+class FakeConnection:
+    def __init__(self):
+        self.probes = 0
+        self.broken = False
+        self.closed = False
+    def cursor(self, as_dict=False):
+        return FakeCursor(self)
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**overrides):
+    options = dict(min_size=2, max_size=3, max_overflow=1, timeout=0.2, idle_timeout=300)
+    options.update(overrides)
+    pool = database.ConnectionPool(**options)
+    pool.open()
+    return pool
+
+
+@pytest.fixture(autouse=True)
+def fake_connections(monkeypatch):
+    monkeypatch.setattr(database, "_create_connection", FakeConnection)
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    pool = make_pool()
+    monkeypatch.setattr(database, "db_pool", pool)
+    yield pool
+    pool.close()
+
+
+def test_recently_used_connection_is_not_probed(fake_pool):
+    with database.get_db_connection() as conn:
+        pass
+    with database.get_db_connection() as conn:
+        assert conn.probes == 0
+    assert database.get_pool_stats()["probes_skipped"] == 2
+    assert database.get_pool_stats()["probes_run"] == 0
+
+def test_idle_connection_is_probed(fake_pool, monkeypatch):
+    monkeypatch.setattr(settings, "DB_VALIDATION_INTERVAL", -1)
+    with database.get_db_connection() as conn:
+        assert conn.probes == 1
+    assert database.get_pool_stats()["probes_run"] == 1
+
+def test_stale_connection_is_replaced(fake_pool, monkeypatch):
+    monkeypatch.setattr(settings, "DB_VALIDATION_INTERVAL", -1)
+    for pooled in fake_pool._idle:
+        pooled.conn.broken = True
+    with database.get_db_connection() as conn:
+        assert not conn.broken
+    assert database.get_pool_stats()["stale_replaced"] == 1
+
+def test_connection_past_max_lifetime_is_recycled(fake_pool, monkeypatch):
+    monkeypatch.setattr(settings, "DB_MAX_LIFETIME", 0)
+    old = fake_pool._idle[-1].conn
+    time.sleep(0.001)
+    with database.get_db_connection() as conn:
+        assert conn is not old
+    assert old.closed
+    assert database.get_pool_stats()["recycled"] == 1
+
+def test_connection_is_probed_after_database_error(fake_pool):
+    with pytest.raises(pymssql.OperationalError):
+        with database.get_db_connection() as conn:
+            raise pymssql.OperationalError("boom")
+    with database.get_db_connection() as again:
+        assert again is conn
+        assert conn.probes == 1
+
+def test_reaper_validates_idle_connections(fake_pool, monkeypatch):
+    monkeypatch.setattr(settings, "DB_VALIDATION_INTERVAL", -1)
+    fake_pool._idle[0].conn.broken = True
+    fake_pool.reap()
+    stats = fake_pool.get_stats()
+    assert stats["probes_run"] == 2
+    assert stats["stale_replaced"] == 1
+    assert stats["idle"] == 2
+
+def test_pool_grows_to_max_plus_overflow_then_shrinks_back():
+    pool = make_pool()
+    held = [pool.acquire() for _ in range(4)]
+    assert pool.get_stats()["size"] == 4
+    for pooled in held:
+        pool.release(pooled)
+    stats = pool.get_stats()
+    assert stats["size"] == 3
+    assert stats["overflow_closed"] == 1
+
+    pool.close()
+
+def test_reaper_shrinks_to_min_size_despite_probing_idle_connections(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("database.time.monotonic", lambda: clock[0])
+    pool = make_pool(idle_timeout=settings.DB_POOL_IDLE_TIMEOUT)
+    monkeypatch.setattr(database, "db_pool", pool)
+    held = [database.get_db_connection() for _ in range(3)]
+    for checkout in held:
+        checkout.__enter__()
+    for checkout in held:
+        checkout.__exit__(None, None, None)
+    assert pool.get_stats()["size"] == 3
+
+    # One request every few seconds keeps a single connection busy while the reaper runs.
+    for tick in range(int(2 * settings.DB_POOL_IDLE_TIMEOUT / settings.DB_REAPER_INTERVAL)):
+        clock[0] += settings.DB_REAPER_INTERVAL
+        with database.get_db_connection():
+            pass
+        pool.reap()
+
+    stats = pool.get_stats()
+    assert (stats["size"], stats["shrunk"]) == (2, 1)
+    assert stats["probes_run"] > 0
+    pool.close()
+
+def test_failed_fill_gives_back_only_unopened_slots(monkeypatch):
+    pool = database.ConnectionPool(min_size=3, max_size=3, max_overflow=0, timeout=0.2, idle_timeout=300)
+    opened = []
+    def flaky_connection():
+        if len(opened) == 1:
+            opened.append(None)
+            raise pymssql.OperationalError("server unavailable")
+        opened.append(FakeConnection())
+        return opened[-1]
+    monkeypatch.setattr(database, "_create_connection", flaky_connection)
+
+    with pytest.raises(pymssql.Error):
+        pool.open()
+    assert pool.get_stats()["size"] == 1 and pool.get_stats()["idle"] == 1
+    pool.reap()
+    assert pool.get_stats()["size"] == 3 and pool.get_stats()["idle"] == 3
+    pool.close()
+
+def test_available_counts_checkouts_served_without_waiting():
+    pool = make_pool(min_size=1, max_size=2, max_overflow=1)
+    assert pool.available() == 3
+    held = [pool.acquire() for _ in range(3)]
+    assert pool.available() == 0
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire(timeout=0)
+    for pooled in held:
+        pool.release(pooled)
+    pool.close()
+
+def test_acquire_times_out_when_exhausted():
+    pool = make_pool(max_size=1, min_size=1, max_overflow=0, timeout=0.05)
+    held = pool.acquire()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    assert pool.get_stats()["timeouts"] == 1
+    assert pool.get_stats()["waiting"] == 0
+    pool.release(held)
+    pool.close()
+
+def test_waiters_are_served_in_arrival_order():
+    pool = make_pool(max_size=1, min_size=1, max_overflow=0, timeout=2)
+    held = pool.acquire()
+    order = []
+
+    def worker(name):
+        pooled = pool.acquire()
+        order.append(name)
+        time.sleep(0.01)
+        pool.release(pooled)
+
+    threads = []
+    for name in range(3):
+        thread = threading.Thread(target=worker, args=(name,))
+        thread.start()
+        threads.append(thread)
+        while pool.get_stats()["waiting"] <= name:
+            time.sleep(0.001)
+
+    pool.release(held)
+    for thread in threads:
+        thread.join()
+    assert order == [0, 1, 2]
+    assert pool.get_stats()["in_use"] == 0
+    pool.close()
+
+def test_release_connection_returns_it_before_context_exit(fake_pool):
+    with database.get_db_connection() as conn:
+        assert fake_pool.get_stats()["in_use"] == 1
+        assert database.release_connection(conn) is True
+        assert fake_pool.get_stats()["in_use"] == 0
+        assert database.release_connection(conn) is False
+    assert fake_pool.get_stats()["in_use"] == 0
+    assert fake_pool.get_stats()["idle"] == 2
+
+def test_early_release_does_not_return_a_reused_connection_twice(monkeypatch):
+    pool = make_pool(min_size=1, max_size=1, max_overflow=0)
+    monkeypatch.setattr(database, "db_pool", pool)
+    with database.get_db_connection() as first:
+        database.release_connection(first)
+        second_context = database.get_db_connection()
+        second = second_context.__enter__()
+        assert second is first
+    # The first checkout ended; the second still holds the connection.
+    assert pool.get_stats()["in_use"] == 1 and pool.get_stats()["idle"] == 0
+    with pytest.raises(PoolTimeoutError):
+        with database.get_db_connection():
+            pass
+    second_context.__exit__(None, None, None)
+    assert pool.get_stats()["in_use"] == 0 and pool.get_stats()["idle"] == 1
+    pool.close()
+
+def test_held_connection_outlives_its_checkout(fake_pool):
+    with database.get_db_connection() as conn:
+        held = database.hold_connection(conn)
+        held.__enter__()
+    assert fake_pool.get_stats()["in_use"] == 1
+    held.__exit__(None, None, None)
+    assert fake_pool.get_stats()["in_use"] == 0 and fake_pool.get_stats()["idle"] == 2
+
+def test_release_connection_ignores_unpooled_connections(fake_pool):
+    assert database.release_connection(FakeConnection()) is False
@@ -0,0 +1,85 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+
+import deck_cache as deck_cache_module
+from config import settings
+from deck_cache import DeckCache, deck_key, render_presentation
+from rendering import render_pool
+from temp_files import TempFileBudget
+
+
+def test_key_depends_on_xml_and_renderer_version(monkeypatch):
+    key = deck_key("<root/>")
+    assert key == deck_key("<root/>")
+    assert key != deck_key("<root></root>")
+    monkeypatch.setattr(deck_cache_module, "RENDERER_VERSION", "next")
+    assert deck_key("<root/>") != key
+
+def test_hit_returns_stored_bytes(tmp_path):
+    cache = DeckCache(directory=str(tmp_path), max_bytes=1000)
+    assert cache.get("a") is None
+    cache.put("a", b"deck-a")
+    assert cache.get("a") == b"deck-a"
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+def test_least_recently_used_deck_is_evicted(tmp_path):
+    cache = DeckCache(directory=str(tmp_path), max_bytes=25)
+    cache.put("a", b"x" * 10)
+    time.sleep(0.01)
+    cache.put("b", b"y" * 10)
+    time.sleep(0.01)
+    assert cache.get("a") is not None
+    cache.put("c", b"z" * 10)
+    assert cache.get("b") is None
+    assert cache.get("a") == b"x" * 10
+    assert cache.get_stats()["bytes"] == 20
+    assert sorted(os.listdir(tmp_path)) == ["a.pptx", "c.pptx"]
+
+def test_index_is_rebuilt_from_disk(tmp_path):
+    DeckCache(directory=str(tmp_path), max_bytes=1000).put("a", b"deck-a")
+    assert DeckCache(directory=str(tmp_path), max_bytes=1000).get("a") == b"deck-a"
+
+def test_render_presentation_renders_once_per_xml(tmp_path, monkeypatch):
+    monkeypatch.setattr(deck_cache_module, "deck_cache", DeckCache(directory=str(tmp_path), max_bytes=10_000))
+    monkeypatch.setattr(settings, "DECK_CACHE_ENABLED", True)
+    rendered = []
+    monkeypatch.setattr(render_pool, "render", lambda xml: rendered.append(xml) or b"PK" + xml.encode())
+
+    assert render_presentation("<root a='1'/>") == render_presentation("<root a='1'/>")
+    render_presentation("<root a='2'/>")
+    assert rendered == ["<root a='1'/>", "<root a='2'/>"]
+
+def test_other_temp_files_shrink_the_cache(tmp_path):
+    budget = TempFileBudget(max_bytes=30)
+    cache = DeckCache(directory=str(tmp_path), max_bytes=1000, budget=budget)
+    cache.put("a", b"x" * 10)
+    time.sleep(0.01)
+    cache.put("b", b"y" * 10)
+    assert budget.get_stats()["total"] == 20
+
+    budget.add("spools", 15)
+    assert cache.get("a") is None and cache.get("b") == b"y" * 10
+    assert budget.get_stats() == {"deck": 10, "spools": 15, "total": 25, "max_bytes": 30}
+
+    budget.add("spools", -15)
+    cache.put("c", b"z" * 20)
+    assert cache.get_stats()["bytes"] == 30
+
+def test_processes_sharing_a_directory_see_each_others_files(tmp_path):
+    writer = DeckCache(directory=str(tmp_path), max_bytes=25, rescan_interval=0)
+    reader = DeckCache(directory=str(tmp_path), max_bytes=25, rescan_interval=0)
+    assert reader.get("a") is None
+    writer.put("a", b"x" * 10)
+    assert reader.get("a") == b"x" * 10
+    assert reader.get_stats()["bytes"] == 10
+
+    # The cap covers what both wrote, not just each one's own files.
+    time.sleep(0.01)
+    reader.put("b", b"y" * 10)
+    time.sleep(0.01)
+    writer.put("c", b"z" * 10)
+    assert sorted(os.listdir(tmp_path)) == ["b.pptx", "c.pptx"]
@@ -33,3 +33,10 @@ def test_root():
 def test_nonexistent_route():
     response = client.get("/does-not-exist")
     assert response.status_code == 404
+
+def test_metrics_endpoint():
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "bu_db_pool_in_use" in response.text
+    assert "# TYPE bu_db_pool_wait_seconds histogram" in response.text
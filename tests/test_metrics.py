@@ -0,0 +1,61 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from unittest.mock import MagicMock
+import pytest
+import metrics
+from metrics import Counter, Histogram, PROC_CALLS, PROC_LATENCY, PROC_ROWS
+from helpers import fetch_data
+
+
+@pytest.fixture(autouse=True)
+def isolated_registry(monkeypatch):
+    # Metrics created by a test go into a copy of the registry, so /metrics never shows them.
+    monkeypatch.setattr(metrics, "_registry", list(metrics._registry))
+
+def test_counter_renders_labelled_samples():
+    counter = Counter("test_counter_total", "A test counter.", ("proc_name",))
+    counter.inc(proc_name="usp_a")
+    counter.inc(2, proc_name="usp_a")
+    lines = counter.render()
+    assert "# TYPE test_counter_total counter" in lines
+    assert 'test_counter_total{proc_name="usp_a"} 3' in lines
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "A test histogram.", buckets=(0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+    lines = histogram.render()
+    assert 'test_seconds_bucket{le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{le="1"} 2' in lines
+    assert 'test_seconds_bucket{le="+Inf"} 3' in lines
+    assert "test_seconds_count 3" in lines
+
+def test_fetch_data_records_calls_latency_and_rows():
+    db = MagicMock()
+    db.cursor.return_value.__enter__.return_value.fetchall.return_value = [{"id": 1}, {"id": 2}]
+    before_rows = PROC_ROWS.value(proc_name="usp_test_metrics")
+    before_calls = PROC_LATENCY.count(proc_name="usp_test_metrics")
+
+    fetch_data(db, "usp_test_metrics", (1,))
+
+    assert PROC_ROWS.value(proc_name="usp_test_metrics") == before_rows + 2
+    assert PROC_LATENCY.count(proc_name="usp_test_metrics") == before_calls + 1
+    assert PROC_CALLS.value(proc_name="usp_test_metrics", status="ok") >= 1
+
+def test_fetch_data_counts_failures():
+    db = MagicMock()
+    db.cursor.return_value.__enter__.return_value.callproc.side_effect = RuntimeError("boom")
+    with pytest.raises(RuntimeError):
+        fetch_data(db, "usp_test_metrics_error")
+    assert PROC_CALLS.value(proc_name="usp_test_metrics_error", status="error") == 1
+
+def test_metrics_created_by_tests_are_not_kept(monkeypatch):
+    registry = metrics._registry
+    Counter("test_scoped_total", "Registered for this test only.")
+    assert "test_scoped_total" in metrics.render_metrics()
+    monkeypatch.undo()
+    assert metrics._registry is not registry
+    assert "test_scoped_total" not in metrics.render_metrics()
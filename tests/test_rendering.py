@@ -0,0 +1,203 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import io
+import threading
+import pytest
+from unittest.mock import MagicMock
+from fastapi.testclient import TestClient
+
+import rendering
+from config import settings
+from database import get_db
+from exceptions import RenderQueueFullError, RenderTimeoutError
+from main import app
+from rendering import RenderPool
+
+def override_get_db():
+    yield MagicMock()
+
+app.dependency_overrides[get_db] = override_get_db
+client = TestClient(app)
+
+XML = "<root><Result name='Retail'><Page number='1'><Title>Retail</Title></Page></Result></root>"
+
+
+def test_inline_render_returns_pptx_bytes():
+    deck = RenderPool(workers=0, max_pending=1, timeout=5).render(XML)
+    assert deck[:2] == b"PK"
+
+def test_process_pool_renders_and_times_out():
+    pool = RenderPool(workers=1, max_pending=1, timeout=60)
+    try:
+        assert pool.render(XML)[:2] == b"PK"
+        pool.timeout = 0.0001
+        with pytest.raises(RenderTimeoutError):
+            pool.render(XML)
+    finally:
+        pool.shutdown()
+    assert pool.pending == 0
+
+def test_full_queue_is_rejected(monkeypatch):
+    started, finish = threading.Event(), threading.Event()
+    def slow_render(xml_string):
+        started.set()
+        finish.wait(5)
+        return b"PK"
+    monkeypatch.setattr(rendering, "_render_xml", slow_render)
+
+    pool = RenderPool(workers=0, max_pending=1, timeout=5)
+    worker = threading.Thread(target=pool.render, args=(XML,))
+    worker.start()
+    started.wait(5)
+    with pytest.raises(RenderQueueFullError):
+        pool.render(XML)
+    finish.set()
+    worker.join()
+    assert pool.render(XML) == b"PK"
+
+def test_connection_is_released_before_rendering(monkeypatch):
+    import services.bu_service as bu_service
+    events = []
+    monkeypatch.setattr(bu_service, "execute_proc_for_xml", lambda db, proc_name, params: XML)
+    monkeypatch.setattr(bu_service, "release_connection", lambda db: events.append("released"))
+    monkeypatch.setattr(settings, "DECK_CACHE_ENABLED", False)
+    monkeypatch.setattr(rendering.render_pool, "render", lambda xml: events.append("rendered") or b"PK")
+
+    response = client.get(f"{settings.API_V1_PREFIX}/reports/monthly-presentation", headers={"X-User-ID": "1"})
+    assert response.status_code == 200
+    assert response.content == b"PK"
+    assert events == ["released", "rendered"]
+
+def test_busy_render_pool_returns_503(monkeypatch):
+    import services.bu_service as bu_service
+    monkeypatch.setattr(bu_service, "execute_proc_for_xml", lambda db, proc_name, params: XML)
+    def reject(xml):
+        raise RenderQueueFullError("busy")
+    monkeypatch.setattr(settings, "DECK_CACHE_ENABLED", False)
+    monkeypatch.setattr(rendering.render_pool, "render", reject)
+
+    response = client.get(f"{settings.API_V1_PREFIX}/reports/monthly-presentation", headers={"X-User-ID": "1"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "5"
+
+def unit_xml(name, comment):
+    return (
+        f"<Result name='{name}'><Page number='1'><Title>{name}</Title>"
+        f"<Performance><Table><Header><Column>KPI</Column><Column>Actual</Column></Header>"
+        f"<Row><Cell>Revenue</Cell><Cell>{comment}</Cell></Row></Table></Performance>"
+        f"<Highlights><KeyPoint>{comment}</KeyPoint></Highlights></Page>"
+        f"<Page number='2'><Priorities><Table><Header><Column>Priority</Column></Header>"
+        f"<Row><Cell>{comment}</Cell></Row></Table></Priorities></Page></Result>"
+    )
+
+def slide_xml(deck: bytes):
+    from pptx import Presentation
+    from lxml import etree
+    return [etree.tostring(slide.shapes._spTree) for slide in Presentation(io.BytesIO(deck)).slides]
+
+def test_assembled_deck_matches_full_render(tmp_path):
+    from deck_cache import DeckCache
+    from helpers import _build_presentation
+
+    cache = DeckCache(directory=str(tmp_path), max_bytes=10_000_000, name="fragment", suffix=".xml")
+    before = "<root>" + unit_xml("Retail", "steady") + unit_xml("Fleet", "slow") + "</root>"
+    after = "<root>" + unit_xml("Retail", "steady") + unit_xml("Fleet", "recovering") + "</root>"
+
+    _build_presentation(before, fragment_cache=cache)
+    assert cache.get_stats()["entries"] == 2
+    assembled = _build_presentation(after, fragment_cache=cache).getvalue()
+    assert cache.get_stats()["entries"] == 3
+
+    assert slide_xml(assembled) == slide_xml(_build_presentation(after).getvalue())
+
+def test_style_templates_render_identically_to_property_styling(monkeypatch):
+    import helpers
+    from helpers import _build_presentation
+
+    xml = (
+        "<root><Result name='Retail &amp; Fleet'><Page number='1'><Title>Retail</Title>"
+        "<Performance><Table><Header><Column>KPI</Column><Column>Note</Column><Column>Extra</Column></Header>"
+        "<Row><Cell>Revenue &lt;net&gt;</Cell><Cell>line one\nline two</Cell><Cell/></Row>"
+        "<Row><Cell>Margin</Cell><Cell>tab\there</Cell><Cell>Ünïcode — ✓</Cell></Row></Table></Performance>"
+        "<Highlights><KeyPoint>Won the tender</KeyPoint><KeyPoint>two\nlines</KeyPoint></Highlights>"
+        "<ExecutionTracker><Table><Header><Column>Initiative</Column></Header><Row><Cell>Rollout</Cell></Row></Table></ExecutionTracker>"
+        "</Page><Page number='2'><Title>Line\nbreak title</Title><Priorities><Table><Header><Column>P</Column></Header>"
+        "<Row><Cell>Expand</Cell></Row></Table></Priorities></Page></Result></root>"
+    )
+    templated = slide_xml(_build_presentation(xml).getvalue())
+    monkeypatch.setattr(helpers._StyleTemplate, "clone", lambda self, text: None)
+    assert templated == slide_xml(_build_presentation(xml).getvalue())
+
+def test_results_are_parsed_incrementally_and_freed():
+    from helpers import iter_report_results
+
+    xml = "<root>" + unit_xml("Retail", "a") + unit_xml("Fleet", "b") + unit_xml("Parts", "c") + "</root>"
+    chunks = (xml[i:i + 7] for i in range(0, len(xml), 7))
+    seen = []
+    for result in iter_report_results(chunks):
+        # Nested <Result> elements never surface, and earlier business units are already gone.
+        seen.append(result.get("name"))
+        assert len(result.getparent()) == 1
+    assert seen == ["Retail", "Fleet", "Parts"]
+
+def test_chunked_xml_renders_the_same_deck():
+    from helpers import create_custom_presentation_from_xml
+
+    xml = "<root>" + unit_xml("Retail", "steady") + unit_xml("Fleet", "slow") + "</root>"
+    chunks = [xml[i:i + 50] for i in range(0, len(xml), 50)]
+    assert slide_xml(create_custom_presentation_from_xml(iter(chunks)).getvalue()) == \
+        slide_xml(create_custom_presentation_from_xml(xml).getvalue())
+
+def test_multi_row_for_xml_output_is_joined():
+    from helpers import execute_proc_for_xml
+
+    db = MagicMock()
+    db.cursor.return_value.__enter__.return_value.__iter__.return_value = iter([("<root><Res",), ("ult/></root>",)])
+    assert execute_proc_for_xml(db, "usp_generate_monthly_report_xml") == "<root><Result/></root>"
+
+def test_split_report_keeps_order_and_minimum_size():
+    from helpers import iter_report_results, split_report_xml
+
+    xml = "<root>" + "".join(unit_xml(f"BU {i}", "x" * (i * 10)) for i in range(7)) + "</root>"
+    parts = split_report_xml(xml, 3, min_results=2)
+    assert len(parts) == 3
+    names = [[r.get("name") for r in iter_report_results(part)] for part in parts]
+    assert [name for part in names for name in part] == [f"BU {i}" for i in range(7)]
+    assert all(len(part) >= 2 for part in names)
+    whole = split_report_xml(xml, 4, min_results=4)
+    assert len(whole) == 1 and len(list(iter_report_results(whole[0]))) == 7
+
+def test_split_render_matches_single_render(monkeypatch):
+    monkeypatch.setattr(settings, "SLIDE_FRAGMENT_CACHE_ENABLED", False)
+    xml = "<root>" + "".join(unit_xml(f"BU {i}", f"comment {i}") for i in range(5)) + "</root>"
+    pool = RenderPool(workers=2, max_pending=1, timeout=60, split_min_units=2)
+    try:
+        split = pool.render(xml)
+        with pytest.raises(Exception):
+            pool.render("<root><Result name='a'/><Result name='b'/><Result name='c'/><Result name='d'>")
+    finally:
+        pool.shutdown()
+    assert pool.pending == 0
+    assert slide_xml(split) == slide_xml(RenderPool(workers=0, max_pending=1, timeout=5).render(xml))
+
+def test_tall_tables_continue_on_slides_repeating_the_header():
+    from pptx import Presentation
+    from helpers import BOTTOM_MARGIN, CONTINUATION_SUFFIX, SLIDE_HEIGHT, _build_presentation
+
+    rows = "".join(f"<Row><Cell>P{i}</Cell><Cell>Expand distribution in region {i} with partner onboarding</Cell></Row>" for i in range(60))
+    xml = (f"<root><Result name='Retail'><Page number='2'><Title>Priorities</Title><Priorities><Table>"
+           f"<Header><Column>Priority</Column><Column>Description</Column></Header>{rows}</Table></Priorities></Page></Result></root>")
+    slides = list(Presentation(_build_presentation(xml)).slides)
+
+    assert len(slides) > 1
+    body_rows = []
+    for index, slide in enumerate(slides):
+        title, table_shape = slide.shapes[0], slide.shapes[1]
+        assert title.text_frame.text == "Priorities" + (CONTINUATION_SUFFIX if index else "")
+        assert table_shape.top + table_shape.height <= SLIDE_HEIGHT - BOTTOM_MARGIN
+        table_rows = list(table_shape.table.rows)
+        assert [cell.text for cell in table_rows[0].cells] == ["Priority", "Description"]
+        body_rows += [row.cells[0].text for row in table_rows[1:]]
+    assert body_rows == [f"P{i}" for i in range(60)]
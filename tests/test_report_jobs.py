@@ -0,0 +1,128 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import threading
+import time
+from contextlib import contextmanager
+import pytest
+from unittest.mock import MagicMock
+from fastapi.testclient import TestClient
+
+import report_jobs as report_jobs_module
+from config import settings
+from database import get_db
+from main import app
+from report_jobs import FAILED, SUCCEEDED, ReportJobManager
+from rendering import render_pool
+from services.bu_service import ReportingService
+
+def override_get_db():
+    yield MagicMock()
+
+app.dependency_overrides[get_db] = override_get_db
+client = TestClient(app)
+
+
+@pytest.fixture
+def render_gate(monkeypatch):
+    """Fake data access and rendering; renders block until the returned event is set."""
+    gate = threading.Event()
+    calls = []
+
+    @contextmanager
+    def fake_get_db_connection():
+        yield MagicMock()
+
+    def fake_render(xml_string):
+        calls.append(xml_string)
+        gate.wait(5)
+        return b"PK-deck"
+
+    monkeypatch.setattr(report_jobs_module, "get_db_connection", fake_get_db_connection)
+    monkeypatch.setattr(ReportingService, "fetch_monthly_report_xml", lambda self, user_id, business_unit=None: "<root/>")
+    monkeypatch.setattr(settings, "DECK_CACHE_ENABLED", False)
+    monkeypatch.setattr(render_pool, "render", fake_render)
+    gate.calls = calls
+    return gate
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    manager = ReportJobManager(store_dir=str(tmp_path), ttl=60, workers=2)
+    manager.start()
+    monkeypatch.setattr(report_jobs_module, "report_jobs", manager)
+    yield manager
+    manager.shutdown()
+
+def wait_for(job, status, timeout=5):
+    deadline = time.monotonic() + timeout
+    while job.status != status and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert job.status == status
+
+
+def test_identical_in_flight_requests_share_a_job(manager, render_gate):
+    first, created = manager.submit(user_id=1, business_unit="Retail")
+    second, created_again = manager.submit(user_id=1, business_unit="Retail")
+    other, _ = manager.submit(user_id=1, business_unit="Fleet")
+    assert created and not created_again
+    assert second is first
+    assert other is not first
+
+    render_gate.set()
+    wait_for(first, SUCCEEDED)
+    wait_for(other, SUCCEEDED)
+    assert len(render_gate.calls) == 2
+    with open(first.path, "rb") as f:
+        assert f.read() == b"PK-deck"
+
+    # Once finished, the same request starts a fresh job.
+    third, created = manager.submit(user_id=1, business_unit="Retail")
+    assert created and third is not first
+
+def test_jobs_are_private_and_expire(manager, render_gate):
+    render_gate.set()
+    job, _ = manager.submit(user_id=1)
+    wait_for(job, SUCCEEDED)
+    assert manager.get(job.job_id, user_id=2) is None
+    assert manager.get(job.job_id, user_id=1) is job
+
+    job.finished_at -= 120
+    assert manager.purge_expired() == 1
+    assert manager.get(job.job_id, user_id=1) is None
+    assert not os.path.exists(job.path)
+
+def test_failed_job_reports_error(manager, monkeypatch):
+    @contextmanager
+    def failing_connection():
+        raise RuntimeError("database unavailable")
+        yield
+
+    monkeypatch.setattr(report_jobs_module, "get_db_connection", failing_connection)
+    job, _ = manager.submit(user_id=1)
+    wait_for(job, FAILED)
+    assert "database unavailable" in manager.describe(job)["error"]
+
+def test_job_endpoints(manager, render_gate, monkeypatch):
+    import routers.bu_router as bu_router
+    monkeypatch.setattr(bu_router, "report_jobs", manager)
+    base = f"{settings.API_V1_PREFIX}/reports/monthly-presentation/jobs"
+
+    created = client.post(base, headers={"X-User-ID": "1"})
+    assert created.status_code == 202
+    job_id = created.json()["job_id"]
+    assert created.headers["location"].endswith(f"{base}/{job_id}")
+    assert client.post(base, headers={"X-User-ID": "1"}).json()["job_id"] == job_id
+    assert client.get(f"{base}/{job_id}/download", headers={"X-User-ID": "1"}).status_code == 409
+
+    render_gate.set()
+    wait_for(manager.get(job_id, user_id=1), SUCCEEDED)
+    status = client.get(f"{base}/{job_id}", headers={"X-User-ID": "1"}).json()
+    assert status["progress"] == 100 and status["expires_at"] is not None
+
+    download = client.get(f"{base}/{job_id}/download", headers={"X-User-ID": "1"})
+    assert download.status_code == 200
+    assert download.content == b"PK-deck"
+    resumed = client.get(f"{base}/{job_id}/download", headers={"X-User-ID": "1", "Range": "bytes=3-"})
+    assert resumed.status_code == 206 and resumed.content == b"deck"
+    assert client.get(f"{base}/{job_id}", headers={"X-User-ID": "2"}).status_code == 404
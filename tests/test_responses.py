@@ -0,0 +1,78 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from unittest.mock import MagicMock
+from fastapi.testclient import TestClient
+
+import rendering
+from config import settings
+from database import get_db
+from main import app
+from responses import _byte_range, spool_bytes
+from temp_files import temp_files
+
+def override_get_db():
+    yield MagicMock()
+
+app.dependency_overrides[get_db] = override_get_db
+client = TestClient(app)
+
+URL = f"{settings.API_V1_PREFIX}/reports/monthly-presentation"
+DECK = bytes(range(256)) * 40
+
+
+@pytest.fixture(autouse=True)
+def fake_deck(monkeypatch):
+    monkeypatch.setattr(settings, "DECK_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "FILE_RESPONSE_CHUNK_SIZE", 1000)
+    monkeypatch.setattr(rendering.render_pool, "render", lambda xml: DECK)
+
+
+def test_full_download_has_length_and_accepts_ranges():
+    response = client.get(URL, headers={"X-User-ID": "1"})
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(len(DECK))
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.content == DECK
+
+def test_range_requests_resume_the_download():
+    etag = client.get(URL, headers={"X-User-ID": "1"}).headers["etag"]
+
+    part = client.get(URL, headers={"X-User-ID": "1", "Range": "bytes=1000-2499", "If-Range": etag})
+    assert part.status_code == 206
+    assert part.headers["content-range"] == f"bytes 1000-2499/{len(DECK)}"
+    assert part.headers["content-length"] == "1500"
+    assert part.content == DECK[1000:2500]
+
+    tail = client.get(URL, headers={"X-User-ID": "1", "Range": "bytes=-10"})
+    assert tail.status_code == 206 and tail.content == DECK[-10:]
+
+def test_stale_if_range_gets_the_whole_file():
+    response = client.get(URL, headers={"X-User-ID": "1", "Range": "bytes=0-9", "If-Range": '"old"'})
+    assert response.status_code == 200 and response.content == DECK
+
+def test_unsatisfiable_range_is_416():
+    response = client.get(URL, headers={"X-User-ID": "1", "Range": f"bytes={len(DECK)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(DECK)}"
+
+def test_byte_range_parsing():
+    assert _byte_range("bytes=0-99", 50) == (0, 49)
+    assert _byte_range("bytes=-100", 50) == (0, 49)
+    assert _byte_range("bytes=10-5", 50) is None
+    assert _byte_range("bytes=0-1,5-6", 50) is None
+    assert _byte_range("items=0-1", 50) is None
+    assert _byte_range("bytes=abc", 50) is None
+
+def test_large_files_spill_to_disk(monkeypatch):
+    monkeypatch.setattr(settings, "SPOOL_MAX_BYTES", 1024)
+    assert not spool_bytes(b"x" * 100)._rolled
+    before = temp_files.get_stats().get("spools", 0)
+    spooled = spool_bytes(DECK)
+    assert spooled._rolled and spooled.read() == DECK
+    # Spilled spools count against the temp file budget until they are closed.
+    assert temp_files.get_stats()["spools"] == before + len(DECK)
+    spooled.close()
+    assert temp_files.get_stats()["spools"] == before
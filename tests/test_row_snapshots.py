@@ -0,0 +1,122 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from unittest.mock import MagicMock
+
+from bulk_xml import OKR_DETAILS, BulkUpdateSchema
+from config import settings
+from row_snapshots import RowSnapshots, row_snapshots
+from services.bu_service import ReportingService
+
+
+def grid(*statuses) -> str:
+    return "<root>" + "".join(f"<row id='{i}' status='{status}'/>" for i, status in enumerate(statuses, 1)) + "</root>"
+
+def sent_rows(snapshots, user_id, xml, schema=OKR_DETAILS):
+    delta = snapshots.changes("okr_details", user_id, schema.parse(xml))
+    return [row.fields["id"] for row in delta.changed.rows], delta.skipped
+
+def save(snapshots, user_id, xml, schema=OKR_DETAILS):
+    delta = snapshots.changes("okr_details", user_id, schema.parse(xml))
+    snapshots.record("okr_details", user_id, schema.parse(xml), delta.generation)
+
+
+def test_only_rows_changed_since_the_last_save_are_sent():
+    snapshots = RowSnapshots(max_rows=100, ttl=60)
+    assert sent_rows(snapshots, 1, grid("a", "b", "c")) == (["1", "2", "3"], 0)
+
+    save(snapshots, 1, grid("a", "b", "c"))
+    assert sent_rows(snapshots, 1, grid("a", "x", "c")) == (["2"], 2)
+    # Without a declared column layout rows are compared as sent ...
+    assert sent_rows(snapshots, 1, "<root><row><id>1</id><status>a</status></row></root>") == (["1"], 0)
+    # ... with one, element-centric rows with the same values count as unchanged.
+    declared = BulkUpdateSchema("okr_details", "OKRs", key_fields=("id",))
+    save(snapshots, 3, grid("a", "b"), schema=declared)
+    assert sent_rows(snapshots, 3, "<root><row><id>1</id><status>a</status></row></root>", schema=declared) == ([], 1)
+
+    save(snapshots, 1, grid("a", "x", "c"))
+    assert sent_rows(snapshots, 1, grid("a", "b", "c")) == (["2"], 2)
+    assert sent_rows(snapshots, 2, grid("a", "x", "c")) == (["1", "2", "3"], 0)
+
+def test_other_writes_and_period_changes_drop_snapshots():
+    snapshots = RowSnapshots(max_rows=100, ttl=60)
+    save(snapshots, 1, grid("a", "b"))
+    save(snapshots, 2, grid("a", "b"))
+    assert snapshots.get_stats()["entries"] == 1
+    assert sent_rows(snapshots, 1, grid("a", "b")) == (["1", "2"], 0)
+
+    save(snapshots, 1, grid("a", "b"))
+    snapshots.invalidate("okr_details")
+    assert sent_rows(snapshots, 1, grid("a", "b")) == (["1", "2"], 0)
+
+    save(snapshots, 1, grid("a", "b"))
+    snapshots.clear()
+    assert sent_rows(snapshots, 1, grid("a", "b")) == (["1", "2"], 0)
+
+def test_concurrent_write_prevents_recording():
+    snapshots = RowSnapshots(max_rows=100, ttl=60)
+    delta = snapshots.changes("okr_details", 1, OKR_DETAILS.parse(grid("a")))
+    save(snapshots, 2, grid("z"))
+    snapshots.record("okr_details", 1, OKR_DETAILS.parse(grid("a")), delta.generation)
+    assert snapshots.get_stats()["entries"] == 0
+
+def test_snapshots_are_bounded_and_expire(monkeypatch):
+    snapshots = RowSnapshots(max_rows=5, ttl=60)
+    save(snapshots, 1, grid("a", "b", "c"))
+    snapshots.record("commentary_details", 2, OKR_DETAILS.parse(grid("a", "b", "c")), 0)
+    assert snapshots.get_stats()["rows"] == 3
+    assert sent_rows(snapshots, 1, grid("a")) == (["1"], 0)
+
+    clock = [1000.0]
+    monkeypatch.setattr("row_snapshots.time.monotonic", lambda: clock[0])
+    snapshots = RowSnapshots(max_rows=100, ttl=60)
+    save(snapshots, 1, grid("a"))
+    clock[0] += 61
+    assert sent_rows(snapshots, 1, grid("a")) == (["1"], 0)
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(settings, "BULK_DELTA_ENABLED", True)
+    row_snapshots.clear()
+    db = MagicMock()
+    cursor = db.cursor.return_value.__enter__.return_value
+    cursor.fetchone.return_value = (1,)
+    yield ReportingService(db=db), cursor
+    row_snapshots.clear()
+
+def test_service_sends_only_changed_okrs(service):
+    service, cursor = service
+    first = service.bulk_update_okrs(payload=grid("a", "b", "c"), user_id=5)
+    assert (first["changed_rows"], first["skipped_rows"]) == (3, 0)
+
+    second = service.bulk_update_okrs(payload=grid("a", "b", "x"), user_id=5)
+    assert (second["changed_rows"], second["skipped_rows"]) == (1, 2)
+    assert cursor.execute.call_args[0][1][1] == '<root><row id="3" status="x"/></root>'
+
+    calls = cursor.execute.call_count
+    third = service.bulk_update_okrs(payload=grid("a", "b", "x"), user_id=5)
+    assert (third["changed_rows"], third["skipped_rows"], third["batches"]) == (0, 3, [])
+    assert cursor.execute.call_count == calls
+
+def test_failed_write_falls_back_to_a_full_update(service):
+    service, cursor = service
+    service.bulk_update_commentaries(payload=grid("a", "b"), user_id=5)
+    cursor.execute.side_effect = RuntimeError("timeout")
+    with pytest.raises(Exception):
+        service.bulk_update_commentaries(payload=grid("a", "x"), user_id=5)
+
+    cursor.execute.side_effect = None
+    result = service.bulk_update_commentaries(payload=grid("a", "x"), user_id=5)
+    assert (result["changed_rows"], result["skipped_rows"]) == (2, 0)
+
+def test_delta_is_off_by_default():
+    row_snapshots.clear()
+    db = MagicMock()
+    db.cursor.return_value.__enter__.return_value.fetchone.return_value = (1,)
+    service = ReportingService(db=db)
+    service.bulk_update_okrs(payload=grid("a"), user_id=5)
+    result = service.bulk_update_okrs(payload=grid("a"), user_id=5)
+    assert "skipped_rows" not in result and result["affected_rows"] == 1
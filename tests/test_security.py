@@ -0,0 +1,103 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from unittest.mock import MagicMock
+from fastapi.testclient import TestClient
+
+from config import settings
+from database import get_db
+from exceptions import InvalidTokenError
+from main import app
+import security
+from security import issue_session_token, permissions_digest, revocations, verify_session_token
+from services.bu_service import ReportingService
+
+db = MagicMock()
+
+def override_get_db():
+    yield db
+
+app.dependency_overrides[get_db] = override_get_db
+client = TestClient(app)
+
+PERMISSIONS = [{"module_name": "okr", "bu_name": "Retail", "access_type": "write"}]
+
+
+@pytest.fixture(autouse=True)
+def reset_state(monkeypatch):
+    monkeypatch.setattr(security, "_SIGNING_KEY", b"test-signing-key")
+    db.reset_mock()
+    revocations.clear()
+    yield
+    revocations.clear()
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_token_round_trip():
+    token, expires_at = issue_session_token(user_id=7, is_admin=True, permissions=PERMISSIONS)
+    claims = verify_session_token(token)
+    assert claims.user_id == 7
+    assert claims.is_admin is True
+    assert claims.permissions_digest == permissions_digest(list(reversed(PERMISSIONS)))
+    assert claims.expires_at == expires_at
+
+def test_tampered_token_is_rejected():
+    token, _ = issue_session_token(user_id=7, is_admin=False, permissions=PERMISSIONS)
+    forged, _ = issue_session_token(user_id=7, is_admin=True, permissions=PERMISSIONS)
+    with pytest.raises(InvalidTokenError):
+        verify_session_token(forged.split(".")[0] + "." + token.split(".")[1])
+
+def test_expired_token_is_rejected():
+    token, _ = issue_session_token(user_id=7, is_admin=False, permissions=[], ttl=-1)
+    with pytest.raises(InvalidTokenError):
+        verify_session_token(token)
+
+def test_revoked_user_tokens_are_rejected():
+    token, _ = issue_session_token(user_id=7, is_admin=False, permissions=[])
+    revocations.revoke_user(7)
+    with pytest.raises(InvalidTokenError):
+        verify_session_token(token)
+    fresh, _ = issue_session_token(user_id=7, is_admin=False, permissions=[])
+    assert verify_session_token(fresh).user_id == 7
+
+def test_require_admin_trusts_token_without_database_call(monkeypatch):
+    monkeypatch.setattr("services.admin_service.AdminService.refresh_lookup_data", lambda self: None)
+    token, _ = issue_session_token(user_id=3, is_admin=True, permissions=[])
+    response = client.post(f"{settings.API_V1_PREFIX}/admin/lookup-data/refresh", headers=bearer(token))
+    assert response.status_code == 200
+    db.cursor.assert_not_called()
+
+def test_require_admin_rejects_non_admin_token():
+    token, _ = issue_session_token(user_id=3, is_admin=False, permissions=[])
+    response = client.post(f"{settings.API_V1_PREFIX}/admin/lookup-data/refresh", headers=bearer(token))
+    assert response.status_code == 403
+
+def test_reporting_route_uses_token_user(monkeypatch):
+    seen = {}
+    def fake_fetch_overdues(self, user_id):
+        seen["user_id"] = user_id
+        return []
+    monkeypatch.setattr(ReportingService, "fetch_overdues", fake_fetch_overdues)
+    token, _ = issue_session_token(user_id=11, is_admin=False, permissions=[])
+    response = client.get(f"{settings.API_V1_PREFIX}/overdues", headers={**bearer(token), "X-User-ID": "99"})
+    assert response.status_code == 200
+    assert seen["user_id"] == 11
+
+def test_invalid_token_is_401():
+    response = client.get(f"{settings.API_V1_PREFIX}/overdues", headers=bearer("not.a-token"))
+    assert response.status_code == 401
+
+def test_logout_revokes_token():
+    token, _ = issue_session_token(user_id=5, is_admin=False, permissions=[])
+    assert client.post(f"{settings.API_V1_PREFIX}/auth/logout", headers=bearer(token)).status_code == 200
+    assert client.post(f"{settings.API_V1_PREFIX}/auth/logout", headers=bearer(token)).status_code == 401
+
+def test_tokens_are_disabled_without_a_shared_secret(monkeypatch):
+    monkeypatch.setattr(security, "_SIGNING_KEY", None)
+    assert issue_session_token(user_id=7, is_admin=False, permissions=PERMISSIONS) == (None, None)
+    with pytest.raises(InvalidTokenError):
+        verify_session_token("abc.def")
@@ -0,0 +1,34 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pptx.util import Inches, Pt
+
+import text_metrics
+from text_metrics import GlyphWidthTable, count_lines
+
+
+def test_lines_follow_the_measured_width():
+    text = "Expand distribution in the southern region with partner onboarding"
+    assert count_lines("Open", Inches(2), Pt(12)) == 1
+    wide, narrow = count_lines(text, Inches(6), Pt(12)), count_lines(text, Inches(1.5), Pt(12))
+    assert wide == 1 and narrow > 2
+    assert count_lines(text, Inches(1.5), Pt(24)) > narrow
+
+def test_newlines_and_unbreakable_words():
+    assert count_lines("one\ntwo\n\nfour", Inches(3), Pt(12)) == 4
+    assert count_lines("x" * 200, Inches(1), Pt(12)) > 5
+
+def test_narrow_glyphs_fit_more_than_wide_ones():
+    assert count_lines("i" * 60, Inches(2), Pt(12)) < count_lines("W" * 60, Inches(2), Pt(12))
+
+def test_measurements_are_memoized():
+    count_lines.cache_clear()
+    count_lines("On track", Inches(2), Pt(12))
+    count_lines("On track", Inches(2), Pt(12))
+    assert count_lines.cache_info().hits == 1
+
+def test_table_without_a_font_uses_the_average_width():
+    table = GlyphWidthTable(None)
+    assert table.text_width("abc") == 3 * text_metrics.FALLBACK_WIDTH
+    assert table.char_width("✓") == text_metrics.FALLBACK_WIDTH
@@ -0,0 +1,128 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import pytest
+
+from bulk_xml import PRIORITIES
+from exceptions import CoalesceConflictError
+from services.bu_service import ReportingService
+from write_coalescer import WriteCoalescer, write_coalescer
+
+
+def rows(*pairs) -> str:
+    return "<root>" + "".join(f"<row id='{id}' status='{status}'/>" for id, status in pairs) + "</root>"
+
+class Recorder:
+    def __init__(self, fail: bool = False):
+        self.flushed = []
+        self.fail = fail
+
+    def __call__(self, payload):
+        self.flushed.append([(row.fields["id"], row.fields["status"]) for row in payload.rows])
+        if self.fail:
+            raise RuntimeError("deadlock victim")
+        return {"status": "success", "affected_rows": len(payload)}
+
+def submit_staggered(coalescer, payloads, flush, gap=0.02, key=(1, "priorities")):
+    released = []
+    def submit(index):
+        time.sleep(index * gap)
+        return coalescer.submit(key, PRIORITIES.parse(payloads[index]), flush, release=lambda: released.append(index))
+    with ThreadPoolExecutor(len(payloads)) as executor:
+        futures = [executor.submit(submit, index) for index in range(len(payloads))]
+    return futures, released
+
+
+def test_burst_is_written_once_with_later_rows_winning():
+    coalescer = WriteCoalescer(window=0.2, max_delay=5)
+    flush = Recorder()
+    futures, released = submit_staggered(coalescer, [rows((1, "a"), (2, "a")), rows((2, "b")), rows((3, "c"), (1, "c"))], flush)
+
+    assert flush.flushed == [[("2", "b"), ("3", "c"), ("1", "c")]]
+    assert [future.result() for future in futures] == [{"status": "success", "affected_rows": 3, "coalesced_requests": 3}] * 3
+    assert sorted(released) == [1, 2]
+
+def test_max_delay_caps_a_continuous_burst():
+    coalescer = WriteCoalescer(window=0.1, max_delay=0.25)
+    flush = Recorder()
+    submit_staggered(coalescer, [rows((i, "x")) for i in range(8)], flush, gap=0.06)
+    assert len(flush.flushed) >= 2
+
+def test_flush_error_reaches_every_request():
+    coalescer = WriteCoalescer(window=0.1, max_delay=5)
+    futures, _ = submit_staggered(coalescer, [rows((1, "a")), rows((2, "b"))], Recorder(fail=True))
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result()
+
+def test_shutdown_flushes_pending_writes_immediately():
+    coalescer = WriteCoalescer(window=30, max_delay=60)
+    flush = Recorder()
+    with ThreadPoolExecutor(1) as executor:
+        future = executor.submit(coalescer.submit, (1, "priorities"), PRIORITIES.parse(rows((1, "a"))), flush)
+        time.sleep(0.05)
+        started = time.monotonic()
+        coalescer.shutdown(timeout=5)
+        assert future.result(timeout=1)["coalesced_requests"] == 1
+        assert time.monotonic() - started < 1
+
+    assert coalescer.submit((1, "priorities"), PRIORITIES.parse(rows((2, "b"))), flush) == {"status": "success", "affected_rows": 1}
+    assert flush.flushed == [[("1", "a")], [("2", "b")]]
+
+def test_coalesced_service_calls_share_one_procedure_call(monkeypatch):
+    monkeypatch.setattr(write_coalescer, "window", 0.2)
+    db = MagicMock()
+    cursor = db.cursor.return_value.__enter__.return_value
+    cursor.fetchone.return_value = (2,)
+    barrier = threading.Barrier(2)
+
+    def autosave(xml):
+        barrier.wait()
+        return ReportingService(db=db).bulk_update_priorities(payload=xml, user_id=9, coalesce=True)
+
+    with ThreadPoolExecutor(2) as executor:
+        results = list(executor.map(autosave, [rows((1, "a")), rows((2, "b"))]))
+
+    assert cursor.execute.call_count == 1 and db.commit.call_count == 1
+    assert all(result["affected_rows"] == 2 and result["coalesced_requests"] == 2 for result in results)
+
+def test_next_burst_waits_for_the_previous_write():
+    coalescer = WriteCoalescer(window=0.05, max_delay=5)
+    first_started, first_may_finish = threading.Event(), threading.Event()
+    flushed = []
+
+    def flush(payload):
+        rows = [(row.fields["id"], row.fields["status"]) for row in payload.rows]
+        if rows == [("1", "old")]:
+            first_started.set()
+            first_may_finish.wait(5)
+        flushed.append(rows)
+        return {"status": "success", "affected_rows": len(payload)}
+
+    with ThreadPoolExecutor(2) as executor:
+        first = executor.submit(coalescer.submit, (1, "priorities"), PRIORITIES.parse(rows((1, "old"))), flush)
+        assert first_started.wait(5)
+        second = executor.submit(coalescer.submit, (1, "priorities"), PRIORITIES.parse(rows((1, "new"))), flush)
+        time.sleep(0.2)
+        assert flushed == []
+        first_may_finish.set()
+        first.result(timeout=5), second.result(timeout=5)
+
+    assert flushed == [[("1", "old")], [("1", "new")]]
+
+def test_requests_with_other_options_are_not_merged():
+    coalescer = WriteCoalescer(window=0.3, max_delay=5)
+    flush = Recorder()
+    with ThreadPoolExecutor(1) as executor:
+        leader = executor.submit(coalescer.submit, (1, "priorities"), PRIORITIES.parse(rows((1, "a"))), flush, None, (None, True))
+        time.sleep(0.05)
+        with pytest.raises(CoalesceConflictError):
+            coalescer.submit((1, "priorities"), PRIORITIES.parse(rows((2, "b"))), flush, options=(None, False))
+        assert leader.result(timeout=5)["coalesced_requests"] == 1
+    assert flush.flushed == [[("1", "a")]]
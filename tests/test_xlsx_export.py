@@ -0,0 +1,73 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import datetime
+import io
+import zipfile
+from decimal import Decimal
+from unittest.mock import MagicMock
+from fastapi.testclient import TestClient
+
+import services.bu_service as bu_service
+import xlsx_export
+from config import settings
+from database import get_db
+from main import app
+from xlsx_export import write_xlsx
+
+def override_get_db():
+    yield MagicMock()
+
+app.dependency_overrides[get_db] = override_get_db
+client = TestClient(app)
+
+
+def worksheets(data: bytes):
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        workbook = archive.read("xl/workbook.xml").decode()
+        names = sorted(name for name in archive.namelist() if name.startswith("xl/worksheets/sheet"))
+        return workbook, [archive.read(name).decode() for name in names]
+
+
+def test_rows_are_written_with_their_types():
+    out = io.BytesIO()
+    rows = [
+        {"name": "=HYPERLINK(\"x\")", "amount": Decimal("12.50"), "due": datetime.date(2025, 8, 31), "done": True, "note": None},
+        {"name": "Fleet", "amount": 3, "due": datetime.datetime(2025, 9, 1, 8, 30), "done": False, "note": "ok"},
+    ]
+    assert write_xlsx(out, [("OKR Tracker", rows), ("Empty", [])]) == 2
+
+    workbook, (tracker, empty) = worksheets(out.getvalue())
+    assert 'name="OKR Tracker"' in workbook and 'name="Empty"' in workbook
+    # Strings stay text, never formulas.
+    assert "<f>" not in tracker and "=HYPERLINK" in tracker
+    assert "<v>12.5</v>" in tracker and 't="b"' in tracker
+    assert "<sheetData/>" in empty
+
+def test_full_sheets_continue_on_a_new_worksheet(monkeypatch):
+    monkeypatch.setattr(xlsx_export, "MAX_SHEET_ROWS", 3)
+    out = io.BytesIO()
+    assert write_xlsx(out, [("KJ OPS", ({"n": i} for i in range(5)))]) == 5
+    workbook, sheets = worksheets(out.getvalue())
+    assert len(sheets) == 3
+    assert 'name="KJ OPS (2)"' in workbook and 'name="KJ OPS (3)"' in workbook
+
+def test_export_endpoint_streams_each_dataset(monkeypatch):
+    procs = []
+    def fake_iter_data(db, proc_name, params=()):
+        procs.append(proc_name)
+        yield {"proc": proc_name, "user": params[0]}
+    monkeypatch.setattr(bu_service, "iter_data", fake_iter_data)
+
+    response = client.get(f"{settings.API_V1_PREFIX}/export.xlsx?datasets=okr_tracker,kjops", headers={"X-User-ID": "7"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == xlsx_export.XLSX_MEDIA_TYPE
+    assert response.headers["content-length"] == str(len(response.content))
+    assert procs == ["usp_get_okr_tracker_by_user", "usp_get_kjops_by_user"]
+    assert len(worksheets(response.content)[1]) == 2
+
+def test_export_rejects_unknown_datasets():
+    response = client.get(f"{settings.API_V1_PREFIX}/export.xlsx?datasets=salaries", headers={"X-User-ID": "7"})
+    assert response.status_code == 400
+    assert "salaries" in response.json()["detail"]
@@ -0,0 +1,132 @@
+import functools
+import os
+from typing import Optional, Tuple
+
+from PIL import ImageFont
+
+from config import settings, logger
+
+
+# Calibri is the theme font of the default python-pptx template; Carlito is metric-compatible with it.
+FONT_CANDIDATES = {
+    False: ("calibri.ttf", "Carlito-Regular.ttf"),
+    True: ("calibrib.ttf", "Carlito-Bold.ttf"),
+}
+FONT_DIRS = (
+    "/usr/share/fonts/truetype/crosextra",
+    "/usr/share/fonts/truetype/msttcorefonts",
+    "/usr/share/fonts/truetype",
+    "C:\\Windows\\Fonts",
+    "/Library/Fonts",
+)
+UNITS_PER_EM = 1000             # glyph widths are kept in 1/1000 em and scaled to the point size
+TABLE_RANGE = range(0x20, 0x250)  # Basic Latin through Latin Extended-B
+FALLBACK_WIDTH = 500            # average width used when no font can be loaded at all
+SYNTHETIC_BOLD_FACTOR = 1.05    # bold estimated from the regular font when no bold face is found
+
+
+class GlyphWidthTable:
+    """
+    Advance widths of one font face in 1/1000 em, so text can be measured at any point size.
+
+    Latin glyphs are measured once when the table is built; anything else is measured through
+    Pillow on first use and remembered.
+    """
+
+    def __init__(self, font: Optional[ImageFont.FreeTypeFont], scale: float = 1.0):
+        self._font = font
+        self._scale = scale
+        self._widths = {chr(code): self._measure(chr(code)) for code in TABLE_RANGE}
+
+    def _measure(self, char: str) -> float:
+        if self._font is None:
+            return FALLBACK_WIDTH * self._scale
+        return self._font.getlength(char) * self._scale
+
+    def char_width(self, char: str) -> float:
+        width = self._widths.get(char)
+        if width is None:
+            width = self._widths[char] = self._measure(char)
+        return width
+
+    def text_width(self, text: str) -> float:
+        return sum(self.char_width(char) for char in text)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_font(bold: bool) -> Tuple[Optional[ImageFont.FreeTypeFont], float]:
+    configured = settings.TEXT_METRICS_BOLD_FONT_PATH if bold else settings.TEXT_METRICS_FONT_PATH
+    candidates = [configured] if configured else [
+        os.path.join(directory, name) for directory in FONT_DIRS for name in FONT_CANDIDATES[bold]
+    ]
+    for path in candidates:
+        if os.path.isfile(path):
+            try:
+                font = ImageFont.truetype(path, UNITS_PER_EM)
+                logger.info(f"Measuring slide text with {path}")
+                return font, 1.0
+            except OSError as ex:
+                logger.warning(f"Could not load font {path} for text measurement: {ex}")
+
+    if bold:
+        font, _ = _load_font(False)
+        return font, SYNTHETIC_BOLD_FACTOR
+    try:
+        # Pillow's bundled sans-serif; needs FreeType, otherwise it hands back an unscalable bitmap font.
+        font = ImageFont.load_default(size=UNITS_PER_EM)
+    except (OSError, TypeError):
+        font = None
+    if not isinstance(font, ImageFont.FreeTypeFont):
+        logger.warning("No scalable font available for text measurement; assuming an average glyph width.")
+        return None, 1.0
+    logger.warning("Calibri/Carlito not found; measuring slide text with Pillow's default font. "
+                   "Set TEXT_METRICS_FONT_PATH for exact row heights.")
+    return font, 1.0
+
+
+@functools.lru_cache(maxsize=None)
+def glyph_widths(bold: bool = False) -> GlyphWidthTable:
+    font, scale = _load_font(bold)
+    return GlyphWidthTable(font, scale)
+
+
+@functools.lru_cache(maxsize=16384)
+def word_width(word: str, bold: bool = False) -> float:
+    """Width of `word` in 1/1000 em."""
+    return glyph_widths(bold).text_width(word)
+
+
+@functools.lru_cache(maxsize=16384)
+def count_lines(text: str, width: int, font_size: int, bold: bool = False) -> int:
+    """
+    Lines `text` takes in a box `width` EMU wide at `font_size` (EMU), wrapping like PowerPoint:
+    greedily at spaces, and between characters for words wider than the box.
+    """
+    if width <= 0 or font_size <= 0:
+        return max(1, text.count("\n") + 1)
+    limit = width * UNITS_PER_EM / font_size
+    table = glyph_widths(bold)
+    space = table.char_width(" ")
+
+    lines = 0
+    for paragraph in text.split("\n"):
+        lines += 1
+        used = 0.0
+        for word in paragraph.split():
+            width_needed = word_width(word, bold)
+            if used and used + space + width_needed <= limit:
+                used += space + width_needed
+                continue
+            if used:
+                lines += 1
+                used = 0.0
+            if width_needed <= limit:
+                used = width_needed
+                continue
+            for char in word:
+                char_width = table.char_width(char)
+                if used and used + char_width > limit:
+                    lines += 1
+                    used = 0.0
+                used += char_width
+    return lines
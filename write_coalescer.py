@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, wait
+from typing import Callable, Hashable, Optional
+
+from bulk_xml import BulkPayload
+from config import settings, logger
+from exceptions import CoalesceConflictError
+from metrics import Counter
+
+
+COALESCED_REQUESTS = Counter("bu_bulk_coalesced_requests_total", "Bulk-update requests merged into another request's write.", ("table_name",))
+
+
+class _PendingWrite:
+    """Rows waiting to be written for one (user_id, table_name); later rows replace earlier ones with the same key."""
+
+    def __init__(self, payload: BulkPayload, key_fields, options: Hashable, now: float):
+        self.schema = payload.schema
+        self.template = payload
+        self.key_fields = key_fields
+        self.options = options
+        self.previous = None    # the burst before this one for the same key, written first
+        self.rows = OrderedDict()
+        self.requests = 0
+        self.started = now
+        self.last_write = now
+        self.future = Future()
+
+    def add(self, payload: BulkPayload, now: float):
+        for row in payload.rows:
+            fields = row.fields if self.key_fields else {}
+            if self.key_fields and all(field in fields for field in self.key_fields):
+                key = tuple(fields[field] for field in self.key_fields)
+                self.rows.pop(key, None)
+            else:
+                # Without its key fields a row can't be matched; it is always written.
+                key = object()
+            self.rows[key] = row
+        self.requests += 1
+        self.last_write = now
+
+    def payload(self) -> BulkPayload:
+        return self.template.with_rows(list(self.rows.values()))
+
+
+class WriteCoalescer:
+    """
+    Merges bursts of bulk updates to the same (user_id, table_name) into one write.
+
+    The first request of a burst becomes its leader: it waits until `window` seconds pass without
+    another write to the same key, but never more than `max_delay` seconds from its own arrival,
+    then writes the merged rows once. Requests arriving meanwhile add their rows, hand their
+    database connection back (`release`) and wait for the leader's result, which every request
+    in the burst receives. Rows are matched on the table's BULK_COALESCE_KEY_FIELDS, or else on
+    its schema's key fields.
+
+    Bursts for the same key are written one at a time, in order, so a later burst never races an
+    earlier one and older rows can't overwrite newer ones. Every request of a burst must pass the
+    same `options` (batch size and commit mode); a request with other options is rejected with
+    CoalesceConflictError rather than silently written with the leader's.
+    """
+
+    def __init__(self, window: float, max_delay: float):
+        self.window = window
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._pending = {}
+        self._latest = {}    # key -> most recent burst, until it has been written
+        self._closing = False
+
+    def start(self):
+        with self._lock:
+            self._closing = False
+
+    def submit(self, key: Hashable, payload: BulkPayload, flush: Callable[[BulkPayload], dict],
+               release: Optional[Callable[[], object]] = None, options: Hashable = None) -> dict:
+        table_name = payload.schema.table_name
+        now = time.monotonic()
+        with self._lock:
+            if self._closing:
+                pending = None
+            else:
+                pending = self._pending.get(key)
+                leader = pending is None
+                if leader:
+                    key_fields = settings.BULK_COALESCE_KEY_FIELDS.get(table_name) or payload.schema.key_fields
+                    pending = self._pending[key] = _PendingWrite(payload, key_fields, options, now)
+                    pending.previous = self._latest.get(key)
+                    self._latest[key] = pending
+                elif pending.options != options:
+                    raise CoalesceConflictError(
+                        f"A coalesced update of '{table_name}' with different options is pending; "
+                        f"retry with the same batch size and commit mode, or without coalescing."
+                    )
+                pending.add(payload, now)
+                self._changed.notify_all()
+
+        if pending is None:
+            return flush(payload)
+        if not leader:
+            COALESCED_REQUESTS.inc(table_name=table_name)
+            if release is not None:
+                release()
+            return dict(pending.future.result())
+
+        self._lead(key, pending, flush)
+        return dict(pending.future.result())
+
+    def _lead(self, key: Hashable, pending: _PendingWrite, flush: Callable[[BulkPayload], dict]):
+        with self._lock:
+            while not self._closing:
+                deadline = min(pending.last_write + self.window, pending.started + self.max_delay)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            # Writes from here on start a new burst.
+            if self._pending.get(key) is pending:
+                del self._pending[key]
+
+        try:
+            if pending.previous is not None:
+                # The earlier burst's outcome belongs to its own requests; only its order matters here.
+                wait([pending.previous.future])
+                pending.previous = None
+            merged = pending.payload()
+            if pending.requests > 1:
+                logger.info(f"Writing {pending.requests} coalesced update(s) of '{pending.schema.table_name}' as {len(merged)} row(s)")
+            try:
+                result = flush(merged)
+            except BaseException as ex:
+                pending.future.set_exception(ex)
+                return
+            pending.future.set_result(dict(result, coalesced_requests=pending.requests))
+        finally:
+            with self._lock:
+                if self._latest.get(key) is pending:
+                    del self._latest[key]
+
+    def shutdown(self, timeout: float = 30.0):
+        """Write every pending burst now and wait for them; later requests are written straight away."""
+        with self._lock:
+            self._closing = True
+            futures = [pending.future for pending in self._pending.values()]
+            self._changed.notify_all()
+        if futures:
+            logger.info(f"Flushing {len(futures)} coalesced bulk update(s) before shutdown")
+            done, not_done = wait(futures, timeout=timeout)
+            if not_done:
+                logger.error(f"{len(not_done)} coalesced bulk update(s) did not finish before shutdown")
+
+
+write_coalescer = WriteCoalescer(window=settings.BULK_COALESCE_WINDOW, max_delay=settings.BULK_COALESCE_MAX_DELAY)
@@ -0,0 +1,110 @@
+import datetime
+import re
+from decimal import Decimal
+from itertools import chain
+from typing import BinaryIO, Iterable, Tuple
+
+import xlsxwriter
+
+from config import logger
+
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+MAX_SHEET_ROWS = 1_048_576          # Excel's limit, header row included
+MAX_SHEET_NAME = 31
+MIN_COLUMN_WIDTH = 10
+MAX_COLUMN_WIDTH = 50
+_INVALID_SHEET_CHARS = re.compile(r"[\[\]:*?/\\]")
+
+
+def _sheet_name(title: str, part: int, used: set) -> str:
+    name = _INVALID_SHEET_CHARS.sub(" ", title).strip() or "Sheet"
+    suffix = f" ({part})" if part > 1 else ""
+    name = name[:MAX_SHEET_NAME - len(suffix)] + suffix
+    base, counter = name, 2
+    while name.lower() in used:
+        tag = f"~{counter}"
+        name = base[:MAX_SHEET_NAME - len(tag)] + tag
+        counter += 1
+    used.add(name.lower())
+    return name
+
+
+class _CellWriter:
+    """Writes one value with the matching xlsxwriter call, so strings never turn into formulas or numbers."""
+
+    def __init__(self, workbook):
+        self.header = workbook.add_format({"bold": True, "bg_color": "#003366", "font_color": "#FFFFFF"})
+        self.date = workbook.add_format({"num_format": "yyyy-mm-dd"})
+        self.datetime = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+
+    def write(self, sheet, row: int, col: int, value):
+        if value is None:
+            return
+        if isinstance(value, bool):
+            sheet.write_boolean(row, col, value)
+        elif isinstance(value, (int, float, Decimal)):
+            sheet.write_number(row, col, float(value))
+        elif isinstance(value, datetime.datetime):
+            sheet.write_datetime(row, col, value, self.datetime)
+        elif isinstance(value, datetime.date):
+            sheet.write_datetime(row, col, value, self.date)
+        elif isinstance(value, (bytes, bytearray)):
+            sheet.write_string(row, col, value.hex())
+        else:
+            sheet.write_string(row, col, str(value))
+
+
+def write_xlsx(fileobj: BinaryIO, sheets: Iterable[Tuple[str, Iterable[dict]]]) -> int:
+    """
+    Write an .xlsx workbook with one worksheet per (title, rows) pair and return the rows written.
+
+    Uses xlsxwriter's constant_memory mode: each row is flushed to a temporary file as soon as it
+    is written, so memory stays flat however many rows the iterables produce (they are consumed
+    one at a time, in order). Columns come from the keys of a sheet's first row. A sheet that
+    would pass Excel's row limit continues on "<title> (2)", and so on.
+    """
+    workbook = xlsxwriter.Workbook(fileobj, {
+        "constant_memory": True,
+        "strings_to_formulas": False,
+        "nan_inf_to_errors": True,
+        "remove_timezone": True,
+    })
+    cells = _CellWriter(workbook)
+    used_names = set()
+    total = 0
+
+    def new_sheet(title, part, columns):
+        sheet = workbook.add_worksheet(_sheet_name(title, part, used_names))
+        for col, column in enumerate(columns):
+            sheet.set_column(col, col, min(MAX_COLUMN_WIDTH, max(MIN_COLUMN_WIDTH, len(str(column)) + 2)))
+            sheet.write_string(0, col, str(column), cells.header)
+        sheet.freeze_panes(1, 0)
+        return sheet
+
+    try:
+        for title, rows in sheets:
+            rows = iter(rows)
+            first = next(rows, None)
+            columns = list(first.keys()) if first is not None else []
+            part, sheet, row_index = 1, new_sheet(title, 1, columns), 0
+            if first is None:
+                continue
+            for row in chain([first], rows):
+                if row_index == MAX_SHEET_ROWS - 1:
+                    part += 1
+                    sheet, row_index = new_sheet(title, part, columns), 0
+                row_index += 1
+                for col, column in enumerate(columns):
+                    cells.write(sheet, row_index, col, row.get(column))
+                total += 1
+    except Exception:
+        try:
+            # Still closes the worksheets' temporary files.
+            workbook.close()
+        except Exception:
+            pass
+        raise
+    workbook.close()
+    logger.info(f"Wrote XLSX export: {len(used_names)} worksheet(s), {total} row(s)")
+    return total